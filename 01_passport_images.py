@@ -6,13 +6,37 @@ import json
 import sys
 from datetime import datetime, timedelta
 from faker import Faker
+from faker.providers.address.en_US import Provider as AddressProvider
+from faker.providers.person.en_US import Provider as PersonProvider
 from PIL import Image, ImageDraw, ImageFont
-import pydenticon
+import numpy as np
 import hashlib
+import argparse
+import binascii
+import time
 from io import BytesIO
+from functools import lru_cache
+from multiprocessing import Pool
+from faker_pools import PooledFaker, ensure_pool
+from output_layout import document_id, layout_path, output_path, write_index, OUTPUT_LAYOUTS
 
 # --- CONFIGURATION ---
 NUMBER_OF_IMAGES = 100
+NUMBER_OF_WORKERS = 1 # Overridden by --workers; 1 renders in-process
+MASTER_SEED = None # Overridden by --seed; None picks a fresh seed per run
+RECORD_GENERATOR = "faker" # Overridden by --records; "faker" (per passport), "pooled" (per passport, names from faker_pools) or "columnar" (NumPy batch)
+JOURNAL_FILE = "groundtruth.journal.jsonl" # Checkpoint journal, compacted into groundtruth.json
+MAX_SHARD_SIZE = 256 # Upper bound on passports a worker renders before its results are journaled
+AVATAR_CACHE_SIZE = 0 # Overridden by --avatar-cache; LRU size for repeated avatar seeds, 0 disables it
+OUTPUT_FORMAT = "png" # Overridden by --output-format; one of OUTPUT_FORMATS
+OUTPUT_LAYOUT = "flat" # Overridden by --layout; "sharded" spreads the images over hash-prefixed subfolders (output_layout.py)
+TENSOR_FILE = "passports.npy" # npy output: (N, 600, 1000, 3) uint8 array, row = passport index
+TENSOR_INDEX_FILE = "passports_index.json" # npy output: passport name -> row
+TENSOR_GROUNDTRUTH_FILE = "passports_groundtruth.npz" # npy output: ground truth as one array per field
+COCO_FILE = "annotations_coco.json" # Written with --coco: bounding boxes as COCO detection annotations
+PNG_COMPRESS_LEVEL = 6 # Overridden by --compress-level; zlib level 0-9 (6 is Pillow's default)
+LOSSY_QUALITY = 90 # Overridden by --quality; quality 1-100 for jpeg and lossy webp
+WEBP_METHOD = 4 # Overridden by --webp-method; encoder effort 0-6 for webp (4 is Pillow's default)
 OUTPUT_FOLDER = "out/01_passports_realistic"
 RESOURCES_FOLDER = "./resources/"
 # --- START: MODIFIED SECTION ---
@@ -30,21 +54,148 @@ PASSPORT_FORMATS = {
     'AUS': 'LNNNNNNN'
 }
 
+# --- OUTPUT ENCODERS ---
+# Output format name: (file extension, Pillow format)
+OUTPUT_FORMATS = {
+    'png': ('png', 'PNG'),
+    'webp-lossless': ('webp', 'WEBP'),
+    'jpeg': ('jpg', 'JPEG'),
+    'webp': ('webp', 'WEBP'),
+    'npy': ('npy', None), # All passports as rows of one memory-mapped TENSOR_FILE, written in place by every worker
+}
+
+# Settings compared by --benchmark-encoders
+ENCODER_BENCHMARK_SETTINGS = [
+    ('png', {'compress_level': 0}),
+    ('png', {'compress_level': 1}),
+    ('png', {'compress_level': 6}),
+    ('png', {'compress_level': 9}),
+    ('webp-lossless', {'webp_method': 0}),
+    ('webp-lossless', {'webp_method': 4}),
+    ('jpeg', {'quality': 75}),
+    ('jpeg', {'quality': 90}),
+    ('jpeg', {'quality': 95}),
+    ('webp', {'quality': 75}),
+    ('webp', {'quality': 90}),
+]
+
+def make_encoder(output_format, compress_level=PNG_COMPRESS_LEVEL, quality=LOSSY_QUALITY, webp_method=WEBP_METHOD):
+    """Returns the encoder settings dict used by save_passport_image."""
+    extension, pil_format = OUTPUT_FORMATS[output_format]
+    if output_format == 'png':
+        options = {'compress_level': compress_level}
+    elif output_format == 'webp-lossless':
+        options = {'lossless': True, 'method': webp_method}
+    elif output_format == 'jpeg':
+        options = {'quality': quality}
+    elif output_format == 'webp':
+        options = {'quality': quality, 'method': webp_method}
+    else:
+        return {'name': output_format, 'extension': extension, 'format': pil_format, 'options': {},
+                'label': "npy (uint8 memmap)", 'tensor_path': os.path.join(OUTPUT_FOLDER, TENSOR_FILE)}
+    label = f"{output_format} (" + ", ".join(f"{key}={value}" for key, value in options.items() if key != 'lossless') + ")"
+    return {'name': output_format, 'extension': extension, 'format': pil_format, 'options': options, 'label': label}
+
+# Per-process encode counters, summed across workers like FONT_CACHE_STATS
+ENCODE_STATS = {'images': 0, 'bytes': 0, 'seconds': 0.0}
+
+def save_passport_image(image, file_path, encoder):
+    start = time.perf_counter()
+    image.save(file_path, format=encoder['format'], **encoder['options'])
+    ENCODE_STATS['seconds'] += time.perf_counter() - start
+    ENCODE_STATS['images'] += 1
+    ENCODE_STATS['bytes'] += os.path.getsize(file_path)
+
+# --- TENSOR OUTPUT ---
+# Memory-mapped tensors opened by this process, keyed by path. Each pool worker
+# opens the file itself and writes its rows in place; nothing is pickled.
+_open_tensors = {}
+
+def create_tensor(tensor_path, count):
+    """Creates (or, when resuming, reopens) the preallocated passport tensor."""
+    shape = (count, PASSPORT_SIZE[1], PASSPORT_SIZE[0], 3)
+    if os.path.exists(tensor_path):
+        tensor = np.load(tensor_path, mmap_mode='r+')
+        if tensor.shape != shape or tensor.dtype != np.uint8:
+            print(f"ERROR: '{tensor_path}' has shape {tensor.shape}, expected {shape}.")
+            sys.exit(1)
+    else:
+        tensor = np.lib.format.open_memmap(tensor_path, mode='w+', dtype=np.uint8, shape=shape)
+    _open_tensors[tensor_path] = tensor
+    return tensor
+
+def write_tensor_row(image, index, encoder):
+    tensor = _open_tensors.get(encoder['tensor_path'])
+    if tensor is None:
+        tensor = _open_tensors[encoder['tensor_path']] = np.load(encoder['tensor_path'], mmap_mode='r+')
+    start = time.perf_counter()
+    tensor[index] = np.asarray(image)
+    ENCODE_STATS['seconds'] += time.perf_counter() - start
+    ENCODE_STATS['images'] += 1
+    ENCODE_STATS['bytes'] += tensor[index].nbytes
+
+def write_tensor_sidecars(journal_path, folder):
+    """Writes the name -> row index and the columnar ground truth for the tensor.
+
+    Columns are ordered by row; dates are datetime64[D], bounding boxes (N, 4)
+    int32 'bbox_<name>' arrays, everything else a fixed-width string array.
+    A repeated passport name indexes its last row, matching groundtruth.json.
+    """
+    latest = {}
+    for _offset, record in read_journal(journal_path):
+        if 'index' in record:
+            latest[record['index']] = record
+    rows = sorted(latest)
+
+    index = {latest[row]['file_name']: row for row in rows}
+    with open(os.path.join(folder, TENSOR_INDEX_FILE), "w") as f:
+        json.dump({'tensor': TENSOR_FILE, 'rows': index}, f, indent=4)
+
+    columns = {'row': np.array(rows, dtype=np.int64),
+               'file_name': np.array([latest[row]['file_name'] for row in rows], dtype=str)}
+    fields = latest[rows[0]]['groundtruth'].keys() if rows else []
+    for field in fields:
+        values = [latest[row]['groundtruth'][field] for row in rows]
+        if field == 'bounding_boxes':
+            # One (N, 4) int column per box, e.g. 'bbox_surname'
+            for name in values[0]:
+                columns[f'bbox_{name}'] = np.array([boxes[name] for boxes in values], dtype=np.int32)
+        else:
+            columns[field] = np.array(values, dtype='datetime64[D]' if field.startswith('date_') else str)
+    np.savez(os.path.join(folder, TENSOR_GROUNDTRUTH_FILE), **columns)
+
+def open_passport_tensor(folder=OUTPUT_FOLDER):
+    """Opens an npy-format passport dataset for reading.
+
+    Returns (images, rows, columns): the read-only (N, 600, 1000, 3) memmap,
+    the {name: row} index and the ground truth columns. Slicing `images`
+    (e.g. images[columns['row'][:64]]) reads rows straight from disk with no
+    image decoding.
+    """
+    images = np.load(os.path.join(folder, TENSOR_FILE), mmap_mode='r')
+    with open(os.path.join(folder, TENSOR_INDEX_FILE)) as f:
+        rows = json.load(f)['rows']
+    with np.load(os.path.join(folder, TENSOR_GROUNDTRUTH_FILE)) as sidecar:
+        columns = {name: sidecar[name] for name in sidecar.files}
+    return images, rows, columns
+
+def format_encode_stats(stats):
+    if not stats['images']:
+        return "no images encoded"
+    return (f"{stats['bytes'] / stats['images'] / 1024:.1f} KiB/image, "
+            f"{stats['seconds'] / stats['images'] * 1000:.2f} ms/encode")
+
 # --- HELPER FUNCTIONS for MRZ ---
-# (No changes in this section)
+MRZ_WEIGHTS = [7, 3, 1]
+MRZ_CHAR_VALUES = {str(i): i for i in range(10)}
+MRZ_CHAR_VALUES.update({chr(ord('A') + i): 10 + i for i in range(26)})
+
 def calculate_checksum(s):
     s = s.upper()
-    weights = [7, 3, 1]
     total = 0
-    char_map = {str(i): i for i in range(10)}
-    char_map.update({chr(ord('A') + i): 10 + i for i in range(26)})
-    
     for i, char in enumerate(s):
-        if char == '<':
-            val = 0
-        else:
-            val = char_map.get(char, 0)
-        total += val * weights[i % 3]
+        # '<' and any character outside 0-9 / A-Z count as 0
+        total += MRZ_CHAR_VALUES.get(char, 0) * MRZ_WEIGHTS[i % 3]
     return str(total % 10)
 
 def format_for_mrz(text, length):
@@ -81,16 +232,179 @@ def generate_mrz(data):
     
     return line1, line2
 
+# --- AVATAR GENERATION ---
+# Identicons laid out exactly like pydenticon.Generator(8, 8, digest=hashlib.sha256)
+# with its default black-on-white colours, built straight into a PIL image
+# instead of being encoded to PNG bytes and decoded again.
+AVATAR_SIZE = 170
+AVATAR_BLOCKS = 8
+
+def identicon_digest(seed):
+    """Returns the 16 digest bytes pydenticon derives from `seed`."""
+    # pydenticon treats a string that is already a sha256 hex digest as the digest itself
+    if len(seed) // 2 == hashlib.sha256().digest_size:
+        try:
+            return binascii.unhexlify(seed.encode('utf-8'))[:16]
+        except binascii.Error:
+            pass
+    return hashlib.sha256(seed.encode('utf-8')).digest()[:16]
+
+def build_avatar(seed):
+    """Builds the AVATAR_SIZE x AVATAR_SIZE identicon for `seed` as an 'L' image."""
+    digest = identicon_digest(seed)
+    half_columns = AVATAR_BLOCKS // 2 + AVATAR_BLOCKS % 2
+    cells = bytearray(b'\xff' * (AVATAR_BLOCKS * AVATAR_BLOCKS))
+    # Byte 0 picks the foreground colour in pydenticon; the cell bits start at byte 1
+    for cell in range(AVATAR_BLOCKS * half_columns):
+        if digest[1 + cell // 8] >> (7 - cell % 8) & 1:
+            column, row = cell // AVATAR_BLOCKS, cell % AVATAR_BLOCKS
+            cells[row * AVATAR_BLOCKS + column] = 0
+            cells[row * AVATAR_BLOCKS + AVATAR_BLOCKS - column - 1] = 0
+
+    block = AVATAR_SIZE // AVATAR_BLOCKS
+    grid = Image.frombytes('L', (AVATAR_BLOCKS, AVATAR_BLOCKS), bytes(cells))
+    avatar = Image.new('L', (AVATAR_SIZE, AVATAR_SIZE), 255)
+    # Blocks are a whole number of pixels, so NEAREST scaling reproduces them exactly
+    avatar.paste(grid.resize((block * AVATAR_BLOCKS, block * AVATAR_BLOCKS), Image.NEAREST), (0, 0))
+    return avatar
+
+def make_avatar_factory(cache_size):
+    """Returns build_avatar, wrapped in an LRU cache of `cache_size` seeds if it is positive."""
+    if cache_size > 0:
+        return lru_cache(maxsize=cache_size)(build_avatar)
+    return build_avatar
+
+# --- FONT REGISTRY ---
+# Font sizes each entry of font_paths is used at by the passport renderer
+PASSPORT_FONT_SIZES = {
+    'arial_bold': [26],
+    'arial_regular': [16, 22, 150],
+    'ocr_b': [36],
+}
+
+# Parsed fonts keyed by (path, size). FreeType faces cannot be pickled, so every
+# process (the main script and each pool worker) holds its own registry.
+_FONT_CACHE = {}
+FONT_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+def get_font(path, size):
+    """Returns the cached ImageFont for (path, size), loading it on first use."""
+    key = (path, size)
+    font = _FONT_CACHE.get(key)
+    if font is None:
+        FONT_CACHE_STATS['misses'] += 1
+        font = _FONT_CACHE[key] = ImageFont.truetype(path, size)
+    else:
+        FONT_CACHE_STATS['hits'] += 1
+    return font
+
+def preload_fonts(font_paths):
+    """Parses every font the renderer needs up front so no render pays for it."""
+    for name, sizes in PASSPORT_FONT_SIZES.items():
+        for size in sizes:
+            get_font(font_paths[name], size)
+
+# --- MRZ GLYPH ATLAS ---
+# The MRZ uses a tiny alphabet in a monospaced face, so each glyph is rasterized
+# once and the band is composed by slicing glyph masks into place. Glyphs sit at
+# the font's integer (hinted) advances, which is exactly where draw.text puts
+# them, and the band is blended with Image.paste(colour, mask) -- the same fill
+# draw.text uses -- so the result is pixel-identical. build_mrz_atlas checks
+# this against draw.text and the renderer falls back to draw.text if it fails.
+MRZ_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<"
+_MRZ_ATLASES = {}
+
+def render_text_mask(text, font, size):
+    mask = Image.new('L', size, 0)
+    ImageDraw.Draw(mask).text((0, 0), text, fill=255, font=font)
+    return np.asarray(mask)
+
+def build_mrz_atlas(font):
+    """Rasterizes every MRZ glyph of `font` once.
+
+    Returns {'height', 'glyphs': {char: (mask, advance)}, 'exact'}, where 'exact'
+    records whether composing the alphabet reproduced draw.text pixel for pixel.
+    """
+    height = max(font.getbbox(char)[3] for char in MRZ_ALPHABET)
+    glyphs = {}
+    for char in MRZ_ALPHABET:
+        left, _top, right, _bottom = font.getbbox(char)
+        if left < 0:
+            raise ValueError(f"MRZ glyph {char!r} extends left of its origin")
+        glyphs[char] = (render_text_mask(char, font, (right, height)), int(font.getlength(char)))
+    atlas = {'height': height, 'glyphs': glyphs, 'exact': False}
+
+    sample = MRZ_ALPHABET + MRZ_ALPHABET[::-1]
+    composed = compose_mrz_mask(atlas, sample)
+    reference = render_text_mask(sample, font, composed.shape[::-1])
+    atlas['exact'] = np.array_equal(composed, reference)
+    return atlas
+
+def get_mrz_atlas(font):
+    key = (font.path, font.size)
+    if key not in _MRZ_ATLASES:
+        _MRZ_ATLASES[key] = build_mrz_atlas(font)
+    return _MRZ_ATLASES[key]
+
+def compose_mrz_mask(atlas, text):
+    """Blits the glyph masks for `text` into one L mask at their pen positions."""
+    glyphs = atlas['glyphs']
+    pens, pen = [], 0
+    for char in text:
+        pens.append(pen)
+        pen += glyphs[char][1]
+    width = max(pen + glyphs[char][0].shape[1] for pen, char in zip(pens, text)) if text else 0
+    mask = np.zeros((atlas['height'], width), dtype=np.uint8)
+    for pen, char in zip(pens, text):
+        glyph = glyphs[char][0]
+        band = mask[:, pen:pen + glyph.shape[1]]
+        np.maximum(band, glyph, out=band) # Neighbouring glyphs may share anti-aliased edge columns
+    return mask
+
+def draw_mrz_line(image, xy, text, font, fill):
+    """Draws one MRZ line like draw.text(xy, text, fill=fill, font=font), using the glyph atlas."""
+    atlas = get_mrz_atlas(font)
+    if not atlas['exact'] or any(char not in atlas['glyphs'] for char in text):
+        ImageDraw.Draw(image).text(xy, text, fill=fill, font=font)
+        return
+    image.paste(fill, xy, Image.fromarray(compose_mrz_mask(atlas, text)))
+
 # --- IMAGE GENERATION ---
-def create_passport_image(data, avatar_image, file_path, font_paths, background_path): # <-- background_path added
-    width, height = 1000, 600
-    base_bg_color = (240, 245, 250) # A plain color for the base
-    font_color = (10, 10, 10)
-    label_color = (100, 100, 100)
-    
+PASSPORT_SIZE = (1000, 600)
+BASE_BG_COLOR = (240, 245, 250) # A plain color for the base
+FONT_COLOR = (10, 10, 10)
+LABEL_COLOR = (100, 100, 100)
+AVATAR_BOX = (40, 40, 210, 210)
+
+# Adjust these coordinates as needed to fit your background image.
+# Each entry is (x, y, label, field); the value is drawn 25px below its label.
+FIELD_LAYOUT = [
+    (250, 120, "1. Surname / Nom", 'surname'),
+    (650, 120, "2. Given Names / Prénoms", 'given_names'),
+    (250, 200, "3. Nationality / Nationalité", 'nationality_long'),
+    (650, 200, "4. Date of Birth", 'date_of_birth'),
+    (250, 280, "5. Sex / Sexe", 'sex'),
+    (450, 280, "6. Date of Issue", 'date_of_issue'),
+    (750, 280, "7. Date of Expiry", 'date_of_expiry'),
+    (250, 360, "8. Passport No.", 'passport_number'),
+]
+
+# Compiled templates, keyed by (font paths, background path)
+_TEMPLATE_CACHE = {}
+
+def build_passport_template(font_paths, background_path):
+    """Renders every part of the passport that does not depend on the record.
+
+    Returns (template, avatar_watermark): the RGB template holding the blended
+    background, header, avatar frame, SPECIMEN watermark and field labels, and
+    the RGBA watermark crop over the avatar box, which is re-applied after the
+    avatar is pasted so the result matches drawing everything in one pass.
+    """
+    width, height = PASSPORT_SIZE
+
     # --- START: BACKGROUND LOADING MODIFIED ---
     # Create a plain base background
-    plain_background = Image.new('RGB', (width, height), base_bg_color)
+    plain_background = Image.new('RGB', (width, height), BASE_BG_COLOR)
     
     try:
         # Load the complex background image
@@ -108,20 +422,16 @@ def create_passport_image(data, avatar_image, file_path, font_paths, background_
     # --- END: BACKGROUND LOADING MODIFIED ---
 
     draw = ImageDraw.Draw(image)
+
+    font_bold = get_font(font_paths['arial_bold'], 26)
+    font_regular = get_font(font_paths['arial_regular'], 22)
+    font_label = get_font(font_paths['arial_regular'], 16)
+    watermark_font = get_font(font_paths['arial_regular'], 150)
+
+    draw.text((250, 30), "REPUBLIC OF HACKATHON", fill=LABEL_COLOR, font=font_bold)
+    draw.text((250, 65), "PASSPORT / PASSEPORT", fill=LABEL_COLOR, font=font_regular)
     
-    # Load fonts
-    font_bold = ImageFont.truetype(font_paths['arial_bold'], 26)
-    font_regular = ImageFont.truetype(font_paths['arial_regular'], 22)
-    font_label = ImageFont.truetype(font_paths['arial_regular'], 16)
-    font_mrz = ImageFont.truetype(font_paths['ocr_b'], 36)
-    watermark_font = ImageFont.truetype(font_paths['arial_regular'], 150)
-
-    # Draw all text and other elements onto the blended background
-    draw.text((250, 30), "REPUBLIC OF HACKATHON", fill=label_color, font=font_bold)
-    draw.text((250, 65), "PASSPORT / PASSEPORT", fill=label_color, font=font_regular)
-    
-    draw.rectangle([30, 30, 210, 210], outline=label_color, width=2)
-    image.paste(avatar_image, (40, 40))
+    draw.rectangle([30, 30, 210, 210], outline=LABEL_COLOR, width=2)
 
     # Watermark layer
     watermark = Image.new("RGBA", image.size)
@@ -129,28 +439,473 @@ def create_passport_image(data, avatar_image, file_path, font_paths, background_
     watermark_draw.text((width/2, height/2), "SPECIMEN", font=watermark_font, fill=(255, 0, 0, 80), anchor="ms")
     image.paste(watermark, (0, 0), watermark)
 
-    # Adjust these coordinates as needed to fit your background image
-    fields = [
-        (250, 120, "1. Surname / Nom", data['surname']),
-        (650, 120, "2. Given Names / Prénoms", data['given_names']),
-        (250, 200, "3. Nationality / Nationalité", data['nationality_long']),
-        (650, 200, "4. Date of Birth", data['date_of_birth'].strftime('%d %b %Y').upper()),
-        (250, 280, "5. Sex / Sexe", data['sex']),
-        (450, 280, "6. Date of Issue", data['date_of_issue'].strftime('%d %b %Y').upper()),
-        (750, 280, "7. Date of Expiry", data['date_of_expiry'].strftime('%d %b %Y').upper()),
-        (250, 360, "8. Passport No.", data['passport_number']),
+    for x, y, label, _field in FIELD_LAYOUT:
+        draw.text((x, y), label, fill=LABEL_COLOR, font=font_label)
+
+    return image, watermark.crop(AVATAR_BOX)
+
+def get_passport_template(font_paths, background_path):
+    """Returns the cached (template, avatar_watermark) pair, building it on first use."""
+    key = (tuple(sorted(font_paths.items())), background_path)
+    if key not in _TEMPLATE_CACHE:
+        _TEMPLATE_CACHE[key] = build_passport_template(font_paths, background_path)
+    return _TEMPLATE_CACHE[key]
+
+def clip_box(box):
+    """Clips an [x0, y0, x1, y1] box to the passport image."""
+    width, height = PASSPORT_SIZE
+    return [max(0, min(box[0], width)), max(0, min(box[1], height)),
+            max(0, min(box[2], width)), max(0, min(box[3], height))]
+
+def render_passport_image(data, avatar_image, font_paths, background_path):
+    """Draws one passport onto a copy of the compiled template.
+
+    Returns (image, boxes): boxes maps each drawn value (keyed by its ground
+    truth field), 'avatar', 'mrz_line1' and 'mrz_line2' to the [x0, y0, x1, y1]
+    pixel box of its ink, clipped to the image (the MRZ runs past the right edge).
+    """
+    template, avatar_watermark = get_passport_template(font_paths, background_path)
+    image = template.copy()
+    draw = ImageDraw.Draw(image)
+    
+    # Load fonts
+    font_regular = get_font(font_paths['arial_regular'], 22)
+    font_mrz = get_font(font_paths['ocr_b'], 36)
+
+    # The watermark sits on top of the avatar, so re-apply its crop after pasting
+    image.paste(avatar_image, AVATAR_BOX[:2])
+    image.paste(avatar_watermark, AVATAR_BOX[:2], avatar_watermark)
+    boxes = {'avatar': list(AVATAR_BOX)}
+
+    values = [
+        data['surname'],
+        data['given_names'],
+        data['nationality_long'],
+        data['date_of_birth'].strftime('%d %b %Y').upper(),
+        data['sex'],
+        data['date_of_issue'].strftime('%d %b %Y').upper(),
+        data['date_of_expiry'].strftime('%d %b %Y').upper(),
+        data['passport_number'],
     ]
-    for x, y, label, value in fields:
-        draw.text((x, y), label, fill=label_color, font=font_label)
-        draw.text((x, y + 25), value, fill=font_color, font=font_regular)
+    for (x, y, _label, field), value in zip(FIELD_LAYOUT, values):
+        draw.text((x, y + 25), value, fill=FONT_COLOR, font=font_regular)
+        boxes[field] = clip_box(draw.textbbox((x, y + 25), value, font=font_regular))
+
+    for field, xy in (('mrz_line1', (30, 500)), ('mrz_line2', (30, 550))):
+        draw_mrz_line(image, xy, data[field], font_mrz, FONT_COLOR)
+        boxes[field] = clip_box(draw.textbbox(xy, data[field], font=font_mrz))
+    return image, boxes
 
-    draw.text((30, 500), data['mrz_line1'], fill=font_color, font=font_mrz)
-    draw.text((30, 550), data['mrz_line2'], fill=font_color, font=font_mrz)
+def create_passport_image(data, avatar_image, file_path, font_paths, background_path, encoder=None): # <-- background_path added
+    """Renders and saves one passport; returns its bounding boxes (see render_passport_image)."""
+    image, boxes = render_passport_image(data, avatar_image, font_paths, background_path)
+    save_passport_image(image, file_path, encoder or make_encoder('png'))
+    return boxes
+
+# --- RECORD GENERATION ---
+def derive_seed(master_seed, index):
+    """Derives the seed for one passport from the master seed and its index.
+
+    Seeding per index (rather than per worker) keeps the output for a given
+    master seed identical whatever the worker count or shard layout.
+    """
+    digest = hashlib.sha256(f"{master_seed}:{index}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+def generate_passport_data(index, master_seed, fake):
+    """Generates the record for passport number `index`, MRZ lines included."""
+    seed = derive_seed(master_seed, index)
+    random.seed(seed)
+    fake.seed_instance(seed)
+
+    nat_code = random.choice(list(PASSPORT_FORMATS.keys()))
+    country_name = fake.country()
+    sex = random.choice(['M', 'F'])
+    first_name = fake.first_name_male() if sex == 'M' else fake.first_name_female()
+    last_name = fake.last_name()
     
-    image.save(file_path)
+    birth_date = fake.date_of_birth(minimum_age=18, maximum_age=80)
+    issue_date = fake.date_between(start_date=birth_date + timedelta(days=18*365), end_date=datetime.now())
+    expiry_date = issue_date + timedelta(days=10*365 - random.randint(1,30))
+
+    passport_data = {
+        'passport_number': generate_passport_number(nat_code),
+        'surname': last_name.upper(),
+        'given_names': first_name.upper(),
+        'nationality': nat_code,
+        'nationality_long': country_name.upper(),
+        'sex': sex,
+        'date_of_birth': birth_date,
+        'date_of_issue': issue_date,
+        'date_of_expiry': expiry_date,
+    }
+    
+    mrz1, mrz2 = generate_mrz(passport_data)
+    passport_data['mrz_line1'] = mrz1
+    passport_data['mrz_line2'] = mrz2
+    return passport_data
+
+def generate_passport(index, record_source, avatar_factory, font_paths, background_path, encoder, layout=OUTPUT_LAYOUT):
+    """Renders and saves passport number `index`, taking its record from `record_source`.
+
+    Files are named by index, since passport numbers are drawn at random and
+    may repeat. Returns (file_name, groundtruth_entry).
+    """
+    passport_data = record_source(index)
+
+    avatar_seed = f"{passport_data['passport_number']}-{passport_data['surname']}"
+    avatar_image_pil = avatar_factory(avatar_seed)
+
+    if encoder['name'] == 'npy':
+        # The row is the passport index; the name only keys the index and ground truth
+        file_name = document_id("passport", index)
+        image, boxes = render_passport_image(passport_data, avatar_image_pil, font_paths, background_path)
+        write_tensor_row(image, index, encoder)
+    else:
+        file_name = f"{document_id('passport', index)}.{encoder['extension']}"
+        file_path = output_path(OUTPUT_FOLDER, layout_path(file_name, layout))
+        
+        # Pass the background image path to the function
+        boxes = create_passport_image(passport_data, avatar_image_pil, file_path, font_paths, background_path, encoder)
+
+    groundtruth_entry = {
+        'passport_number': passport_data['passport_number'],
+        'surname': passport_data['surname'],
+        'given_names': passport_data['given_names'],
+        'nationality_code': passport_data['nationality'],
+        'nationality_long': passport_data['nationality_long'],
+        'sex': passport_data['sex'],
+        'date_of_birth': passport_data['date_of_birth'].isoformat(),
+        'date_of_issue': passport_data['date_of_issue'].isoformat(),
+        'date_of_expiry': passport_data['date_of_expiry'].isoformat(),
+        'mrz_line1': passport_data['mrz_line1'],
+        'mrz_line2': passport_data['mrz_line2'],
+        'bounding_boxes': boxes
+    }
+    return file_name, groundtruth_entry
+
+# --- BATCH RECORD GENERATION ---
+# Vectorized counterpart of generate_passport_data: all records for a run are
+# drawn up front as NumPy columns from one seeded Generator, and rendering only
+# reads rows back out. Names and countries come from Faker's en_US lists (with
+# its name weights), dates follow the same ranges as the per-record path.
+MRZ_VALUE_TABLE = np.zeros(256, dtype=np.int64)
+for _char, _value in MRZ_CHAR_VALUES.items():
+    MRZ_VALUE_TABLE[ord(_char)] = _value
+MRZ_WEIGHT_TABLE = np.resize(np.array(MRZ_WEIGHTS, dtype=np.int64), 64)
+
+def weighted_choice(rng, weights, count):
+    """Draws `count` upper-cased keys from a Faker {value: weight} mapping."""
+    # Upper-casing the vocabulary is far cheaper than upper-casing the draws
+    values = np.char.upper(np.array(list(weights)))
+    p = np.array(list(weights.values()), dtype=np.float64)
+    return values[rng.choice(len(values), size=count, p=p / p.sum())]
+
+def shift_years(day, years):
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError: # 29 February in a non-leap year
+        return day.replace(year=day.year + years, day=28)
+
+def char_matrix(strings, width):
+    """Views an array of ASCII strings as a (count, width) uint8 matrix, padding with '<'."""
+    padded = np.char.ljust(strings.astype(f'U{width}'), width, '<')
+    return np.frombuffer(padded.astype(f'S{width}').tobytes(), dtype=np.uint8).reshape(-1, width).copy()
+
+def date_matrix(dates):
+    """Formats datetime64[D] values as a (count, 6) uint8 matrix of YYMMDD digits."""
+    years = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = dates.astype('datetime64[M]')
+    days = (dates - months).astype(np.int64) + 1
+    months = months.astype(np.int64) % 12 + 1
+    yy = years % 100
+    return (np.stack([yy // 10, yy % 10, months // 10, months % 10, days // 10, days % 10], axis=1) + ord('0')).astype(np.uint8)
+
+def checksum_column(matrix):
+    """Vectorized calculate_checksum over the rows of a uint8 character matrix, as ASCII digits."""
+    totals = (MRZ_VALUE_TABLE[matrix] * MRZ_WEIGHT_TABLE[:matrix.shape[1]]).sum(axis=1)
+    return (totals % 10 + ord('0')).astype(np.uint8)[:, None]
+
+def generate_mrz_columns(columns):
+    """Vectorized generate_mrz: returns the (mrz_line1, mrz_line2) string columns."""
+    count = len(columns['surname'])
+    full_name = np.char.add(np.char.add(np.char.replace(columns['surname'], ' ', '<'), '<<'),
+                            np.char.replace(columns['given_names'], ' ', '<'))
+    line1 = np.char.add(np.char.add('P<', columns['nationality']), np.char.ljust(full_name, 39, '<'))
+
+    passport_num = char_matrix(columns['passport_number'], 9)
+    dob = date_matrix(columns['date_of_birth'])
+    expiry = date_matrix(columns['date_of_expiry'])
+    personal_num = np.full((count, 14), ord('<'), dtype=np.uint8)
+    composite = np.hstack([passport_num, checksum_column(passport_num), dob, checksum_column(dob),
+                           expiry, checksum_column(expiry), personal_num, checksum_column(personal_num)])
+    line2 = np.hstack([composite[:, :10], char_matrix(columns['nationality'], 3), composite[:, 10:17],
+                       char_matrix(columns['sex'], 1), composite[:, 17:], checksum_column(composite)])
+    return line1, line2.view('S44').ravel().astype('U44')
+
+def generate_passport_numbers(rng, nationality):
+    """Draws a passport number for each nationality code from its PASSPORT_FORMATS mask."""
+    numbers = np.empty(len(nationality), dtype='U9')
+    for code, fmt in PASSPORT_FORMATS.items():
+        rows = np.flatnonzero(nationality == code)
+        mask = np.array([char == 'L' for char in fmt])
+        chars = np.where(mask, rng.integers(0, 26, (len(rows), len(fmt))) + ord('A'),
+                         rng.integers(0, 10, (len(rows), len(fmt))) + ord('0')).astype(np.uint8)
+        numbers[rows] = chars.view(f'S{len(fmt)}').ravel().astype('U9')
+    return numbers
+
+def generate_passport_columns(count, seed, today=None):
+    """Generates `count` passport records as a dict of NumPy columns.
+
+    Dates are datetime64[D]; everything else is a string column. The MRZ lines
+    are computed with the vectorized check digits of generate_mrz_columns.
+    """
+    rng = np.random.default_rng(seed)
+    today = today or datetime.now().date()
+
+    codes = np.array(list(PASSPORT_FORMATS))
+    nationality = codes[rng.integers(0, len(codes), count)]
+    countries = np.char.upper(np.array(AddressProvider.countries))
+    sex = np.where(rng.integers(0, 2, count) == 0, 'M', 'F')
+    given_names = np.where(sex == 'M', weighted_choice(rng, PersonProvider.first_names_male, count),
+                           weighted_choice(rng, PersonProvider.first_names_female, count))
+
+    # date_of_birth(minimum_age=18, maximum_age=80): after the day 81 years ago, up to 18 years ago
+    oldest = np.datetime64(shift_years(today, -81), 'D') + 1
+    youngest = np.datetime64(shift_years(today, -18), 'D')
+    birth = oldest + rng.integers(0, (youngest - oldest).astype(np.int64) + 1, count)
+    # Issued at least 18*365 days after birth, and no later than today
+    earliest_issue = birth + 18 * 365
+    issue_span = (np.datetime64(today, 'D') - earliest_issue).astype(np.int64) + 1
+    issue = earliest_issue + (rng.random(count) * issue_span).astype(np.int64)
+    expiry = issue + 10 * 365 - rng.integers(1, 31, count)
+
+    columns = {
+        'passport_number': generate_passport_numbers(rng, nationality),
+        'surname': weighted_choice(rng, PersonProvider.last_names, count),
+        'given_names': given_names,
+        'nationality': nationality,
+        'nationality_long': countries[rng.integers(0, len(countries), count)],
+        'sex': sex,
+        'date_of_birth': birth,
+        'date_of_issue': issue,
+        'date_of_expiry': expiry,
+    }
+    columns['mrz_line1'], columns['mrz_line2'] = generate_mrz_columns(columns)
+    return columns
+
+def record_from_columns(columns, index):
+    """Returns row `index` of the columns in the same form as generate_passport_data."""
+    return {name: column[index].item() for name, column in columns.items()}
+
+def make_record_source(records, master_seed, count, pool_path=None):
+    """Returns a callable mapping a passport index to its record dict; 'pooled' needs the ensure_pool() path."""
+    if records == 'columnar':
+        columns = generate_passport_columns(count, master_seed)
+        return lambda index: record_from_columns(columns, index)
+    fake = Faker()
+    if records == 'pooled':
+        # Names and countries come from the pool through random, which generate_passport_data seeds per index
+        fake = PooledFaker(fake, pool_path)
+    return lambda index: generate_passport_data(index, master_seed, fake)
+
+# --- PROCESS POOL ---
+# Per-process state, set up once by init_worker
+_worker_state = {}
+
+def init_worker(records, master_seed, count, font_paths, background_path, avatar_cache_size, encoder, pool_path=None, layout=OUTPUT_LAYOUT):
+    # Columnar records are regenerated from the seed in each worker rather than
+    # pickled across; that takes well under a second per 100k passports
+    _worker_state['record_source'] = make_record_source(records, master_seed, count, pool_path)
+    _worker_state['avatar_factory'] = make_avatar_factory(avatar_cache_size)
+    _worker_state['font_paths'] = font_paths
+    _worker_state['background_path'] = background_path
+    _worker_state['encoder'] = encoder
+    _worker_state['layout'] = layout
+    preload_fonts(font_paths)
+
+def process_stats():
+    """Snapshot of this process's cumulative font cache and encode counters."""
+    return {'font': dict(FONT_CACHE_STATS), 'encode': dict(ENCODE_STATS)}
+
+def sum_stats(snapshots):
+    """Adds up process_stats() snapshots from several processes."""
+    return {
+        'font': {key: sum(snapshot['font'][key] for snapshot in snapshots) for key in FONT_CACHE_STATS},
+        'encode': {key: sum(snapshot['encode'][key] for snapshot in snapshots) for key in ENCODE_STATS},
+    }
+
+def generate_shard(indices):
+    """Renders the passports at `indices` in a worker.
+
+    Returns (entries, pid, stats): (index, file_name, groundtruth_entry) for
+    each passport in order, and this worker's process_stats() snapshot.
+    """
+    entries = []
+    for i in indices:
+        file_name, groundtruth_entry = generate_passport(
+            i, _worker_state['record_source'], _worker_state['avatar_factory'],
+            _worker_state['font_paths'], _worker_state['background_path'], _worker_state['encoder'], _worker_state['layout'])
+        entries.append((i, file_name, groundtruth_entry))
+    return entries, os.getpid(), process_stats()
+
+def shard_indices(indices, workers):
+    """Splits the pending indices into shards, a few per worker so slow shards even out.
+
+    Shards are capped at MAX_SHARD_SIZE so a crash loses little finished work.
+    """
+    shard_size = max(1, min(MAX_SHARD_SIZE, -(-len(indices) // (workers * 4))))
+    return [indices[start:start + shard_size] for start in range(0, len(indices), shard_size)]
+
+# --- CHECKPOINT JOURNAL ---
+# The journal is a JSON-lines file: a {"master_seed", "output_format", "records", "layout"} header followed by one
+# {"index", "file_name", "groundtruth"} record per passport, appended as soon as
+# the image is on disk. Truncated or corrupt lines (from a crash) are ignored.
+def read_journal(journal_path):
+    """Yields (offset, record) for each readable line of the journal."""
+    with open(journal_path, "rb") as f:
+        offset = 0
+        for line in f:
+            try:
+                yield offset, json.loads(line)
+            except ValueError:
+                pass
+            offset += len(line)
+
+def load_journal(journal_path):
+    """Returns (header, completed): the journaled run settings and {index: file_name}."""
+    header, completed = None, {}
+    for _offset, record in read_journal(journal_path):
+        if 'master_seed' in record:
+            header = record
+        else:
+            completed[record['index']] = record['file_name']
+    return header, completed
+
+def trim_journal(journal_path):
+    """Cuts a half-written last line (from a crash) off the journal, so the next record starts on a line of its own."""
+    with open(journal_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 4096)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+
+def append_journal(journal, index, file_name, groundtruth_entry):
+    journal.write(json.dumps({'index': index, 'file_name': file_name, 'groundtruth': groundtruth_entry}) + "\n")
+    journal.flush()
+
+def journal_entries(journal_path):
+    """Yields (file_name, groundtruth_entry) in index order, as groundtruth.json holds them.
+
+    Only line offsets are held in memory; each record is re-read from disk as it
+    is yielded. A repeated file name keeps its first position and last value,
+    like assigning into a dict.
+    """
+    latest = {}
+    for offset, record in read_journal(journal_path):
+        if 'index' in record:
+            latest[record['index']] = (offset, record['file_name'])
+
+    first_index, last_offset = {}, {}
+    for index in sorted(latest):
+        offset, file_name = latest[index]
+        first_index.setdefault(file_name, index)
+        last_offset[file_name] = offset
+
+    with open(journal_path, "rb") as journal:
+        for file_name in sorted(first_index, key=first_index.get):
+            journal.seek(last_offset[file_name])
+            yield file_name, json.loads(journal.readline())['groundtruth']
+
+def compact_journal(journal_path, groundtruth_path):
+    """Writes the journal out as groundtruth.json, streaming one entry at a time.
+
+    The output matches json.dump(..., indent=4) of the equivalent dict.
+    """
+    with open(groundtruth_path, "w") as out:
+        out.write("{")
+        n = 0
+        for n, (file_name, entry) in enumerate(journal_entries(journal_path), 1):
+            out.write("," if n > 1 else "")
+            out.write(f"\n    {json.dumps(file_name)}: " + json.dumps(entry, indent=4).replace("\n", "\n    "))
+        out.write("\n}" if n else "}")
+
+def export_coco(journal_path, coco_path, layout=OUTPUT_LAYOUT):
+    """Writes the journaled bounding boxes as a COCO detection file.
+
+    Each box key ('surname', 'avatar', 'mrz_line1', ...) is a category, and
+    boxes become [x, y, width, height]; image file names are paths relative
+    to the output folder. Images and annotations are streamed
+    from the journal in two passes, so memory stays flat.
+    """
+    width, height = PASSPORT_SIZE
+    categories = [field for _x, _y, _label, field in FIELD_LAYOUT] + ['avatar', 'mrz_line1', 'mrz_line2']
+    category_ids = {name: n for n, name in enumerate(categories, 1)}
+    with open(coco_path, "w") as out:
+        out.write('{"images": [')
+        for image_id, (file_name, _entry) in enumerate(journal_entries(journal_path), 1):
+            out.write("," if image_id > 1 else "")
+            out.write(json.dumps({'id': image_id, 'file_name': layout_path(file_name, layout), 'width': width, 'height': height}))
+        out.write('], "annotations": [')
+        annotation_id = 0
+        for image_id, (_file_name, entry) in enumerate(journal_entries(journal_path), 1):
+            for name, (x0, y0, x1, y1) in entry.get('bounding_boxes', {}).items():
+                annotation_id += 1
+                out.write("," if annotation_id > 1 else "")
+                out.write(json.dumps({'id': annotation_id, 'image_id': image_id, 'category_id': category_ids[name],
+                                      'bbox': [x0, y0, x1 - x0, y1 - y0], 'area': (x1 - x0) * (y1 - y0), 'iscrowd': 0}))
+        out.write('], "categories": ')
+        out.write(json.dumps([{'id': category_id, 'name': name} for name, category_id in category_ids.items()]))
+        out.write("}")
+
+# --- ENCODER BENCHMARK ---
+def benchmark_encoders(count, master_seed, font_paths, background_path):
+    """Renders `count` passports in memory and reports size and encode time for each setting."""
+    preload_fonts(font_paths)
+    fake = Faker()
+    images = []
+    for i in range(count):
+        passport_data = generate_passport_data(i, master_seed, fake)
+        avatar_image = build_avatar(f"{passport_data['passport_number']}-{passport_data['surname']}")
+        images.append(render_passport_image(passport_data, avatar_image, font_paths, background_path)[0])
+
+    print(f"{'setting':<36}{'KiB/image':>12}{'ms/encode':>12}")
+    for output_format, settings in ENCODER_BENCHMARK_SETTINGS:
+        encoder = make_encoder(output_format, **settings)
+        total_bytes, total_seconds = 0, 0.0
+        for image in images:
+            stream = BytesIO()
+            start = time.perf_counter()
+            image.save(stream, format=encoder['format'], **encoder['options'])
+            total_seconds += time.perf_counter() - start
+            total_bytes += stream.tell()
+        print(f"{encoder['label']:<36}{total_bytes / count / 1024:>12.1f}{total_seconds / count * 1000:>12.2f}")
 
 # --- MAIN SCRIPT ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate realistic passport images with ground truth.")
+    parser.add_argument("--workers", type=int, default=NUMBER_OF_WORKERS, help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=MASTER_SEED, help="master seed for reproducible output")
+    parser.add_argument("--records", choices=['faker', 'pooled', 'columnar'], default=RECORD_GENERATOR, help="per-passport Faker records, the same with values from the faker_pools pool, or one NumPy batch for the whole run")
+    parser.add_argument("--avatar-cache", type=int, default=AVATAR_CACHE_SIZE, help="LRU cache size for repeated avatar seeds (0 disables)")
+    parser.add_argument("--output-format", choices=list(OUTPUT_FORMATS), default=OUTPUT_FORMAT, help="image encoder for the output files")
+    parser.add_argument("--layout", choices=OUTPUT_LAYOUTS, default=OUTPUT_LAYOUT, help="flat output folder, or two levels of hash-prefixed subfolders for large runs")
+    parser.add_argument("--compress-level", type=int, default=PNG_COMPRESS_LEVEL, help="png zlib compression level (0-9)")
+    parser.add_argument("--quality", type=int, default=LOSSY_QUALITY, help="jpeg / lossy webp quality (1-100)")
+    parser.add_argument("--webp-method", type=int, default=WEBP_METHOD, help="webp encoder effort (0-6)")
+    parser.add_argument("--benchmark-encoders", type=int, metavar="N", help="render N passports in memory, report bytes/image and ms/encode per encoder setting, and exit")
+    parser.add_argument("--coco", action="store_true", help=f"also export the bounding boxes as COCO annotations to {COCO_FILE}")
+    parser.add_argument("--resume", action="store_true", help="keep existing output and skip passports already journaled")
+    args = parser.parse_args()
+
     font_paths = {
         'ocr_b': os.path.join(RESOURCES_FOLDER, "OCR-B.ttf"),
         'arial_regular': os.path.join(RESOURCES_FOLDER, "arial.ttf"),
@@ -167,79 +922,106 @@ if __name__ == "__main__":
 
     background_image_path = os.path.join(RESOURCES_FOLDER, BACKGROUND_IMAGE_FILE) # <-- Path for background
 
-    fake = Faker()
+    if args.benchmark_encoders:
+        benchmark_encoders(args.benchmark_encoders, args.seed if args.seed is not None else 0, font_paths, background_image_path)
+        sys.exit(0)
+
+    encoder = make_encoder(args.output_format, args.compress_level, args.quality, args.webp_method)
+
+    journal_path = os.path.join(OUTPUT_FOLDER, JOURNAL_FILE)
+    journal_header, completed = None, {}
+    if args.resume and os.path.exists(journal_path):
+        journal_header, completed = load_journal(journal_path)
+    if journal_header is None and completed:
+        # Appending a fresh header would mix records of two seeds in one groundtruth.json
+        print(f"ERROR: '{journal_path}' lists {len(completed)} finished passports but has no readable header, so their seed is unknown.")
+        print("Run again without --resume to start over.")
+        sys.exit(1)
+    if journal_header:
+        if args.seed is not None and args.seed != journal_header['master_seed']:
+            print(f"ERROR: --seed {args.seed} does not match the seed {journal_header['master_seed']} of the run being resumed.")
+            sys.exit(1)
+        if journal_header.get('output_format', 'png') != args.output_format:
+            print(f"ERROR: --output-format {args.output_format} does not match the format {journal_header['output_format']} of the run being resumed.")
+            sys.exit(1)
+        if journal_header.get('records', 'faker') != args.records:
+            print(f"ERROR: --records {args.records} does not match the generator {journal_header['records']} of the run being resumed.")
+            sys.exit(1)
+        if journal_header.get('layout', 'flat') != args.layout:
+            print(f"ERROR: --layout {args.layout} does not match the layout {journal_header['layout']} of the run being resumed.")
+            sys.exit(1)
+    elif not args.resume:
+        # --- START: FOLDER CLEANUP UTILITY ---
+        # If the output folder exists, remove it and all its contents
+        if os.path.exists(OUTPUT_FOLDER):
+            print(f"Removing existing directory: {OUTPUT_FOLDER}")
+            shutil.rmtree(OUTPUT_FOLDER)
+        # --- END: FOLDER CLEANUP UTILITY ---
+
+    journal_seed = journal_header['master_seed'] if journal_header else None
+    master_seed = next(seed for seed in (journal_seed, args.seed, random.SystemRandom().randrange(2**32)) if seed is not None)
+    print(f"Using master seed {master_seed} with {args.workers} worker(s), encoding {encoder['label']}")
+    # With --seed the pool drawn from that seed, so seeded runs stay reproducible; otherwise the rolling one
+    pool_path = ensure_pool(seed=args.seed) if args.records == 'pooled' else None
 
-    # --- START: FOLDER CLEANUP UTILITY ---
-    # If the output folder exists, remove it and all its contents
-    if os.path.exists(OUTPUT_FOLDER):
-        print(f"Removing existing directory: {OUTPUT_FOLDER}")
-        shutil.rmtree(OUTPUT_FOLDER)
-    # --- END: FOLDER CLEANUP UTILITY ---
-    
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
     os.makedirs(RESOURCES_FOLDER, exist_ok=True)
-        
-    avatar_generator = pydenticon.Generator(8, 8, digest=hashlib.sha256)
-    
-    all_groundtruth_data = {}
-
-    for i in range(NUMBER_OF_IMAGES):
-        nat_code = random.choice(list(PASSPORT_FORMATS.keys()))
-        country_name = fake.country()
-        sex = random.choice(['M', 'F'])
-        first_name = fake.first_name_male() if sex == 'M' else fake.first_name_female()
-        last_name = fake.last_name()
-        
-        birth_date = fake.date_of_birth(minimum_age=18, maximum_age=80)
-        issue_date = fake.date_between(start_date=birth_date + timedelta(days=18*365), end_date=datetime.now())
-        expiry_date = issue_date + timedelta(days=10*365 - random.randint(1,30))
-
-        passport_data = {
-            'passport_number': generate_passport_number(nat_code),
-            'surname': last_name.upper(),
-            'given_names': first_name.upper(),
-            'nationality': nat_code,
-            'nationality_long': country_name.upper(),
-            'sex': sex,
-            'date_of_birth': birth_date,
-            'date_of_issue': issue_date,
-            'date_of_expiry': expiry_date,
-        }
-        
-        mrz1, mrz2 = generate_mrz(passport_data)
-        passport_data['mrz_line1'] = mrz1
-        passport_data['mrz_line2'] = mrz2
 
-        avatar_seed = f"{passport_data['passport_number']}-{passport_data['surname']}"
-        avatar_image_bytes = avatar_generator.generate(avatar_seed, 170, 170, output_format="png")
-        avatar_image_pil = Image.open(BytesIO(avatar_image_bytes))
+    if encoder['name'] == 'npy':
+        # Rows are written before they are journaled, so a journal entry implies its row
+        create_tensor(encoder['tensor_path'], NUMBER_OF_IMAGES)
+        pending = [i for i in range(NUMBER_OF_IMAGES) if i not in completed]
+    else:
+        # An index is done only if both its journal entry and its image made it to disk
+        pending = [i for i in range(NUMBER_OF_IMAGES)
+                   if i not in completed or not os.path.exists(os.path.join(OUTPUT_FOLDER, layout_path(completed[i], args.layout)))]
+    if args.resume:
+        print(f"Resuming: {NUMBER_OF_IMAGES - len(pending)} passports already done, {len(pending)} to go")
 
-        file_name = f"passport_{passport_data['passport_number']}.png"
-        file_path = os.path.join(OUTPUT_FOLDER, file_name)
-        
-        # Pass the background image path to the function
-        create_passport_image(passport_data, avatar_image_pil, file_path, font_paths, background_image_path)
-
-        groundtruth_entry = {
-            'passport_number': passport_data['passport_number'],
-            'surname': passport_data['surname'],
-            'given_names': passport_data['given_names'],
-            'nationality_code': passport_data['nationality'],
-            'nationality_long': passport_data['nationality_long'],
-            'sex': passport_data['sex'],
-            'date_of_birth': passport_data['date_of_birth'].isoformat(),
-            'date_of_issue': passport_data['date_of_issue'].isoformat(),
-            'date_of_expiry': passport_data['date_of_expiry'].isoformat(),
-            'mrz_line1': passport_data['mrz_line1'],
-            'mrz_line2': passport_data['mrz_line2']
-        }
-        all_groundtruth_data[file_name] = groundtruth_entry
-        
-        print(f"({i+1}/{NUMBER_OF_IMAGES}) Generated realistic passport image: {file_name}")
+    if os.path.exists(journal_path):
+        trim_journal(journal_path)
+    with open(journal_path, "a") as journal:
+        if journal_header is None:
+            journal.write(json.dumps({'master_seed': master_seed, 'output_format': args.output_format, 'records': args.records, 'layout': args.layout}) + "\n")
+
+        done = NUMBER_OF_IMAGES - len(pending)
+        if args.workers <= 1:
+            preload_fonts(font_paths)
+            record_source = make_record_source(args.records, master_seed, NUMBER_OF_IMAGES, pool_path)
+            avatar_factory = make_avatar_factory(args.avatar_cache)
+            for i in pending:
+                file_name, groundtruth_entry = generate_passport(i, record_source, avatar_factory, font_paths, background_image_path, encoder, args.layout)
+                append_journal(journal, i, file_name, groundtruth_entry)
+                done += 1
+                print(f"({done}/{NUMBER_OF_IMAGES}) Generated realistic passport image: {file_name}")
+            stats = process_stats()
+        else:
+            worker_stats = {}
+            with Pool(args.workers, initializer=init_worker, initargs=(args.records, master_seed, NUMBER_OF_IMAGES, font_paths, background_image_path, args.avatar_cache, encoder, pool_path, args.layout)) as pool:
+                for shard, pid, snapshot in pool.imap_unordered(generate_shard, shard_indices(pending, args.workers)):
+                    for i, file_name, groundtruth_entry in shard:
+                        append_journal(journal, i, file_name, groundtruth_entry)
+                    worker_stats[pid] = snapshot
+                    done += len(shard)
+                    print(f"({done}/{NUMBER_OF_IMAGES}) Generated realistic passport images")
+            stats = sum_stats(list(worker_stats.values()))
 
     groundtruth_filepath = os.path.join(OUTPUT_FOLDER, "groundtruth.json")
-    with open(groundtruth_filepath, "w") as f:
-        json.dump(all_groundtruth_data, f, indent=4)
+    compact_journal(journal_path, groundtruth_filepath)
+    if args.coco:
+        coco_filepath = os.path.join(OUTPUT_FOLDER, COCO_FILE)
+        export_coco(journal_path, coco_filepath, args.layout)
+        print(f"COCO annotations saved to '{coco_filepath}'")
+    if encoder['name'] == 'npy':
+        _open_tensors[encoder['tensor_path']].flush()
+        write_tensor_sidecars(journal_path, OUTPUT_FOLDER)
+        print(f"Passport tensor saved to '{encoder['tensor_path']}' with index '{TENSOR_INDEX_FILE}'")
+    else:
+        file_names = {record['file_name'] for _offset, record in read_journal(journal_path) if 'index' in record}
+        index_filepath = write_index(OUTPUT_FOLDER, [layout_path(file_name, args.layout) for file_name in file_names])
+        print(f"File index saved to '{index_filepath}'")
 
     print(f"\nGeneration complete in folder '{OUTPUT_FOLDER}'")
-    print(f"Ground truth data saved to '{groundtruth_filepath}'")
\ No newline at end of file
+    print(f"Ground truth data saved to '{groundtruth_filepath}'")
+    print(f"Font cache: {stats['font']['hits']} hits, {stats['font']['misses']} misses")
+    print(f"Encoder {encoder['label']}: {format_encode_stats(stats['encode'])}")
@@ -1,22 +1,45 @@
 import random
 import shutil
 from datetime import datetime, timedelta
-from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.lib.utils import ImageReader
 from reportlab.lib import colors
 import os
 import json
+import argparse
+import csv
+import hashlib
+import math
+import numpy as np
+from collections import namedtuple
 # --- START: ADDED FOR CUSTOM FONT ---
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 import sys
 # --- END: ADDED FOR CUSTOM FONT ---
+import PIL
+import reportlab
+import pdf_resources
+import pdf_raster
+import pdf_boxes
+import text_layout
+import output_layout
+from pdf_resources import draw_image, format_image_cache_stats, use_font_family, missing_font_files, format_font_cache_stats, FONT_FAMILIES, RESOURCES_FOLDER
+from pdf_raster import open_canvas, raster_pages
+from pdf_boxes import box_file_path
+from output_layout import layout_path, beside, output_path, write_index, OUTPUT_LAYOUTS
+from output_manifest import source_hash, resources_hash, hash_json, load_manifest, save_manifest, reference_date, is_current, make_entry, remove_stale_files
 
 
 # --- Configuration ---
 NUMBER_OF_INVOICES = 100
+INVOICES_PER_PDF = 1 # Overridden by --per-pdf; K > 1 writes K invoices per PDF, each starting on a new page
+MAX_LINE_ITEMS = 5 # Overridden by --max-items; each invoice gets 1..N line items, long tables continue on extra pages
+CUSTOMERS_CSV = None # Overridden by --customers; CSV with name,address[,weight] columns instead of CUSTOMER_COMPANIES
+PRODUCTS_CSV = None # Overridden by --products; CSV with name,price[,weight] columns instead of PRODUCT_ITEMS
+RASTER_DPI = 0 # Overridden by --raster-dpi; N > 0 also draws every page to <pdf name>_p<page>.png at N dpi
+WORD_BOXES = False # Overridden by --boxes; also record word and field boxes of every page to <pdf name>_boxes.json
+OUTPUT_LAYOUT = "flat" # Overridden by --layout; "sharded" spreads the files over hash-prefixed subfolders (output_layout.py)
+SEED = None # Overridden by --seed; a fixed seed draws the same invoices every run, dated from the manifest's reference day
 OUTPUT_FOLDER = "./out/02-invoices/"
 
 # Our Company Information
@@ -24,6 +47,8 @@ OUR_COMPANY_NAME = "Global Tech Services Inc."
 OUR_COMPANY_LOGO_PATH = "./resources/company_logo.png"
 OUR_COMPANY_ADDRESS = "789 Tech Park, Bangkok 10110"
 
+WIDTH, HEIGHT = letter
+
 # Template Colors
 MODERN_BLUE = colors.HexColor('#005cb9')
 HEADER_GRAY = colors.HexColor('#4c4c4c')
@@ -40,9 +65,149 @@ PRODUCT_ITEMS = [
     # ... (rest of the list is unchanged)
 ]
 
+# --- External catalogs ---
+# A catalog CSV is compiled once into <csv>.store/, a folder of .npy arrays:
+# each text column as one UTF-8 byte blob plus row offsets, each number column
+# as float64, and Vose alias tables built from the optional "weight" column.
+# The arrays are opened memory-mapped, so a 100k-row catalog costs almost no
+# private memory per process, and a weighted draw is one uniform index and
+# one coin flip whatever the catalog size.
+CATALOG_STORE_SUFFIX = ".store"
+
+def catalog_numbers(csv_path, rows, column):
+    """The column as floats; a blank or non-numeric cell is reported with its CSV line and exits."""
+    values = []
+    for line, row in enumerate(rows, 2):
+        try:
+            value = float(row[column])
+        except (TypeError, ValueError):
+            value = math.nan
+        if not math.isfinite(value):
+            print(f"ERROR: Catalog '{csv_path}' line {line}: {column} must be a number, got '{row[column] or ''}'.")
+            sys.exit(1)
+        values.append(value)
+    return values
+
+def build_alias_table(weights):
+    """Vose's alias method: row i is kept with probability prob[i], otherwise alias[i] is used."""
+    count = len(weights)
+    scaled = (np.asarray(weights, dtype=np.float64) * (count / np.sum(weights))).tolist()
+    prob, alias = [1.0] * count, list(range(count))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        prob[less], alias[less] = scaled[less], more
+        scaled[more] += scaled[less] - 1.0
+        (small if scaled[more] < 1.0 else large).append(more)
+    # Whatever is left over is 1.0 up to rounding and keeps itself
+    return np.array(prob, dtype=np.float64), np.array(alias, dtype=np.int64)
+
+def compile_catalog(csv_path, store_path, text_columns, number_columns, csv_hash):
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        print(f"ERROR: Catalog '{csv_path}' has no rows.")
+        sys.exit(1)
+    missing = [column for column in text_columns + number_columns if column not in rows[0]]
+    if missing:
+        print(f"ERROR: Catalog '{csv_path}' is missing the column(s): {', '.join(missing)}")
+        sys.exit(1)
+
+    numbers = {column: catalog_numbers(csv_path, rows, column) for column in number_columns}
+    weights = catalog_numbers(csv_path, rows, "weight") if "weight" in rows[0] else [1.0] * len(rows)
+    negative = next((line for line, weight in enumerate(weights, 2) if weight < 0), None)
+    if negative is not None:
+        print(f"ERROR: Catalog '{csv_path}' line {negative}: weight must not be negative.")
+        sys.exit(1)
+    if sum(weights) <= 0:
+        print(f"ERROR: Catalog '{csv_path}' has no row with a positive weight.")
+        sys.exit(1)
+
+    # Built in a folder of its own and swapped in whole, so a process reading the store never sees it half written
+    build_path = f"{store_path}.{os.getpid()}.tmp"
+    shutil.rmtree(build_path, ignore_errors=True)
+    os.makedirs(build_path)
+    for column in text_columns:
+        encoded = [row[column].encode('utf-8') for row in rows]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        np.save(os.path.join(build_path, f"{column}.bytes.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        np.save(os.path.join(build_path, f"{column}.offsets.npy"), offsets)
+    for column in number_columns:
+        np.save(os.path.join(build_path, f"{column}.npy"), np.array(numbers[column], dtype=np.float64))
+    prob, alias = build_alias_table(weights)
+    np.save(os.path.join(build_path, "alias_prob.npy"), prob)
+    np.save(os.path.join(build_path, "alias_index.npy"), alias)
+    with open(os.path.join(build_path, "meta.json"), 'w') as f:
+        json.dump({"source_sha256": csv_hash, "rows": len(rows), "text_columns": text_columns, "number_columns": number_columns}, f)
+
+    # A folder cannot be renamed over a full one: move the old store aside first. Processes that
+    # already have its arrays mapped keep reading them; one opening it in between just recompiles.
+    old_path = f"{store_path}.{os.getpid()}.old"
+    if os.path.exists(store_path):
+        os.replace(store_path, old_path)
+    os.replace(build_path, store_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+def load_catalog(csv_path, text_columns, number_columns):
+    """Opens the compiled store for `csv_path`, compiling it first if the CSV changed."""
+    with open(csv_path, 'rb') as f:
+        csv_hash = hashlib.sha256(f.read()).hexdigest()
+    store_path = csv_path + CATALOG_STORE_SUFFIX
+    expected = {"source_sha256": csv_hash, "text_columns": text_columns, "number_columns": number_columns}
+    try:
+        with open(os.path.join(store_path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+    if any(meta.get(key) != value for key, value in expected.items()):
+        print(f"Compiling catalog '{csv_path}' into '{store_path}'...")
+        compile_catalog(csv_path, store_path, text_columns, number_columns, csv_hash)
+
+    def open_array(name):
+        return np.load(os.path.join(store_path, name), mmap_mode='r')
+    return {
+        "text": {column: (open_array(f"{column}.bytes.npy"), open_array(f"{column}.offsets.npy")) for column in text_columns},
+        "numbers": {column: open_array(f"{column}.npy") for column in number_columns},
+        "prob": open_array("alias_prob.npy"),
+        "alias": open_array("alias_index.npy"),
+    }
+
+def catalog_record(catalog, index):
+    record = {}
+    for column, (blob, offsets) in catalog["text"].items():
+        record[column] = blob[offsets[index]:offsets[index + 1]].tobytes().decode('utf-8')
+    for column, values in catalog["numbers"].items():
+        record[column] = float(values[index])
+    return record
+
+def sample_catalog(catalog, rng=random):
+    """One weighted draw in O(1), from `rng` (the global `random` stream by default)."""
+    index = rng.randrange(len(catalog["prob"]))
+    if rng.random() >= catalog["prob"][index]:
+        index = int(catalog["alias"][index])
+    return catalog_record(catalog, index)
+
+def make_sampler(csv_path, builtin, text_columns, number_columns):
+    """Returns a picker taking an optional random.Random: weighted draws from the CSV catalog, or a choice from builtin."""
+    if csv_path is None:
+        return lambda rng=random: rng.choice(builtin)
+    if not os.path.exists(csv_path):
+        print(f"ERROR: Catalog file '{csv_path}' not found.")
+        sys.exit(1)
+    catalog = load_catalog(csv_path, text_columns, number_columns)
+    print(f"Loaded catalog '{csv_path}' ({len(catalog['prob'])} rows).")
+    return lambda rng=random: sample_catalog(catalog, rng)
+
 
 # --- Helper function for drawing table ---
-def draw_items_table(c, y_pos, data, table_style):
+TABLE_ROW_HEIGHT = 0.25 * inch
+TABLE_BOTTOM = 1 * inch # Lowest baseline an item row may use before the table continues on a new page
+TOTALS_SPACE = 1.5 * inch # Room the template's totals block needs under the last row
+CONTINUATION_TOP = HEIGHT - 1 * inch # Header baseline on continuation pages
+
+def draw_table_header(c, y_pos, table_style):
     width, _ = letter
     c.setFont("Kanit-Bold", 10) # <-- MODIFIED
 
@@ -61,147 +226,389 @@ def draw_items_table(c, y_pos, data, table_style):
     c.drawRightString(width - 0.7 * inch, y_pos, "Total")
 
     c.setFillColor(colors.black)
-    y_pos -= 0.35 * inch
+    c.setFont("Kanit", 10) # <-- MODIFIED
+    return y_pos - 0.35 * inch
+
+def draw_page_subtotal(c, y_pos, page_subtotal):
+    width, _ = letter
+    c.setFont("Kanit-Bold", 10)
+    c.drawRightString(6.2 * inch, y_pos, "Page subtotal:")
+    c.drawRightString(width - 0.7 * inch, y_pos, f"${page_subtotal:.2f}")
+    return y_pos - TABLE_ROW_HEIGHT
+
+def start_continuation_page(c, data, table_style=None):
+    """Ends the current page and starts the next one for the same invoice."""
+    c.showPage()
+    c.setFont("Kanit-Bold", 10)
+    c.drawString(0.5 * inch, CONTINUATION_TOP + 0.4 * inch, f"Invoice {data['invoice_id']} (continued)")
+    if table_style is None:
+        return CONTINUATION_TOP
+    return draw_table_header(c, CONTINUATION_TOP, table_style)
+
+def draw_items_table(c, y_pos, data, table_style):
+    """Draws the line items, continuing onto new pages as the page fills up.
+
+    `data["items"]` may be any iterable, e.g. a generator, and is consumed
+    once, so the table holds one row at a time however many lines the invoice
+    has. A table that spans several pages gets the header repeated on each
+    page and a subtotal line under each page's rows. The ground truth of each
+    row, with the canvas page it was drawn on, goes to data["line_items"], and
+    the running totals to data["subtotal"], ["tax_amount"] and ["total"] for
+    the template's totals block. Returns the y that block is placed below, on
+    a page with TOTALS_SPACE left.
+    """
+    width, _ = letter
+    y_pos = draw_table_header(c, y_pos, table_style)
+    page_subtotal, subtotal, continued = 0, 0, False
+    data["line_items"] = []
 
     for item in data["items"]:
+        if y_pos < TABLE_BOTTOM:
+            draw_page_subtotal(c, y_pos, page_subtotal)
+            y_pos = start_continuation_page(c, data, table_style)
+            page_subtotal, continued = 0, True
         total_price = item["quantity"] * item["price"]
-        c.setFont("Kanit", 10) # <-- MODIFIED
         c.drawString(0.7 * inch, y_pos, item["name"])
         c.drawRightString(5.0 * inch, y_pos, str(item["quantity"]))
         c.drawRightString(6.2 * inch, y_pos, f"${item['price']:.2f}")
         c.drawRightString(width - 0.7 * inch, y_pos, f"${total_price:.2f}")
-        y_pos -= 0.25 * inch
+        data["line_items"].append({
+            "description": item["name"],
+            "quantity": item["quantity"],
+            "unit_price": item["price"],
+            "line_total": round(total_price, 2),
+            "page": c.getPageNumber()
+        })
+        page_subtotal += total_price
+        subtotal += total_price
+        y_pos -= TABLE_ROW_HEIGHT
+
+    data["subtotal"] = subtotal
+    data["tax_amount"] = subtotal * data["tax_rate"]
+    data["total"] = subtotal + data["tax_amount"]
+    if continued:
+        y_pos = draw_page_subtotal(c, y_pos, page_subtotal)
+    if y_pos - TOTALS_SPACE < 0:
+        y_pos = start_continuation_page(c, data)
     return y_pos
 
-# --- TEMPLATE 1: CLASSIC ---
-def create_classic_template(c, data):
-    width, height = letter
-    if os.path.exists(OUR_COMPANY_LOGO_PATH): c.drawImage(OUR_COMPANY_LOGO_PATH, 0.5 * inch, height - 1.25 * inch, width=1*inch, height=1*inch, preserveAspectRatio=True, mask='auto')
-    c.setFont("Kanit", 10); c.drawString(0.5 * inch, height - 1.5 * inch, OUR_COMPANY_ADDRESS) # <-- MODIFIED
-
-    c.setFont("Kanit-Bold", 24); c.drawCentredString(width / 2, height - 1 * inch, "INVOICE") # <-- MODIFIED
+# --- Template display lists ---
+# Each template is declared as a list of drawing ops, compiled once by
+# compile_template() and replayed per invoice by draw_invoice():
+#   ("font", name, size) / ("fill", color) / ("stroke", color) / ("line_width", w)
+#       set the graphics state for the ops that follow
+#   ("image", path, x, y, w, h)            skipped when the file is missing
+#   ("rect", x, y, w, h)                   filled, no stroke
+#   ("line", x1, y1, x2, y2)
+#   ("text", align, x, y, text)            align is "left", "right" or "centre"
+#   ("items_table", y, table_style)        see draw_items_table()
+# A text given as Slot("...") is formatted with the invoice data, e.g.
+# Slot("{customer[name]}"); a y given as Below(dy) is dy points below the y
+# returned by the items table. Slots reading {subtotal}, {tax_amount} or
+# {total} must come after the table, which adds them up as it draws. Everything
+# else is static: it is drawn once per PDF into a form XObject and stamped onto
+# each page.
+Slot = namedtuple("Slot", "format")
+Below = namedtuple("Below", "offset")
 
-    c.setFont("Kanit-Bold", 12); c.drawString(width - 3.5 * inch, height - 1 * inch, "Invoice #:"); c.drawString(width - 2.5 * inch, height - 1 * inch, data["invoice_id"]) # <-- MODIFIED
-    c.drawString(width - 3.5 * inch, height - 1.25 * inch, "Issue Date:"); c.drawString(width - 2.5 * inch, height - 1.25 * inch, data["issue_date"])
-
-    c.setFont("Kanit-Bold", 12); c.drawString(0.5 * inch, height - 2.5 * inch, "BILL TO:") # <-- MODIFIED
-    c.setFont("Kanit", 12); c.drawString(0.5 * inch, height - 2.75 * inch, data["customer"]["name"]); c.drawString(0.5 * inch, height - 2.95 * inch, data["customer"]["address"]) # <-- MODIFIED
-
-    y_pos = draw_items_table(c, height - 4 * inch, data, {})
-
-    c.setFont("Kanit-Bold", 12); c.drawRightString(width - 2.5 * inch, y_pos - 0.5 * inch, "Total:"); c.drawRightString(width - 0.7 * inch, y_pos - 0.5 * inch, f'${data["total"]:.2f}') # <-- MODIFIED
+# --- TEMPLATE 1: CLASSIC ---
+CLASSIC_TEMPLATE = [
+    ("image", OUR_COMPANY_LOGO_PATH, 0.5 * inch, HEIGHT - 1.25 * inch, 1 * inch, 1 * inch),
+    ("font", "Kanit", 10), ("text", "left", 0.5 * inch, HEIGHT - 1.5 * inch, OUR_COMPANY_ADDRESS),
+    ("font", "Kanit-Bold", 24), ("text", "centre", WIDTH / 2, HEIGHT - 1 * inch, "INVOICE"),
+    ("font", "Kanit-Bold", 12),
+    ("text", "left", WIDTH - 3.5 * inch, HEIGHT - 1 * inch, "Invoice #:"), ("text", "left", WIDTH - 2.5 * inch, HEIGHT - 1 * inch, Slot("{invoice_id}")),
+    ("text", "left", WIDTH - 3.5 * inch, HEIGHT - 1.25 * inch, "Issue Date:"), ("text", "left", WIDTH - 2.5 * inch, HEIGHT - 1.25 * inch, Slot("{issue_date}")),
+    ("text", "left", 0.5 * inch, HEIGHT - 2.5 * inch, "BILL TO:"),
+    ("font", "Kanit", 12),
+    ("text", "left", 0.5 * inch, HEIGHT - 2.75 * inch, Slot("{customer[name]}")), ("text", "left", 0.5 * inch, HEIGHT - 2.95 * inch, Slot("{customer[address]}")),
+    ("items_table", HEIGHT - 4 * inch, {}),
+    ("font", "Kanit-Bold", 12),
+    ("text", "right", WIDTH - 2.5 * inch, Below(0.5 * inch), "Total:"), ("text", "right", WIDTH - 0.7 * inch, Below(0.5 * inch), Slot("${total:.2f}")),
+]
 
 # --- TEMPLATE 2: MODERN MINIMALIST ---
-def create_modern_template(c, data):
-    width, height = letter
-    c.setFillColor(colors.black)
-    if os.path.exists(OUR_COMPANY_LOGO_PATH): c.drawImage(OUR_COMPANY_LOGO_PATH, 0.5 * inch, height - 1.1 * inch, width=0.8*inch, height=0.8*inch, preserveAspectRatio=True, mask='auto')
-
-    c.setFont("Kanit-Bold", 16); c.drawString(1.5 * inch, height - 0.9 * inch, OUR_COMPANY_NAME) # <-- MODIFIED
-    c.setFont("Kanit", 9); c.drawString(1.5 * inch, height - 1.1 * inch, OUR_COMPANY_ADDRESS) # <-- MODIFIED
-
-    c.setStrokeColor(MODERN_BLUE); c.setLineWidth(2); c.line(0.5 * inch, height - 1.5 * inch, width - 0.5 * inch, height - 1.5 * inch)
-
-    c.setFont("Kanit-Bold", 10); c.drawString(0.5 * inch, height - 1.8 * inch, "BILL TO"); c.drawString(4.5 * inch, height - 1.8 * inch, "INVOICE DETAILS") # <-- MODIFIED
-    c.setFont("Kanit", 10); c.drawString(0.5 * inch, height - 2.0 * inch, data["customer"]["name"]); c.drawString(0.5 * inch, height - 2.2 * inch, data["customer"]["address"]) # <-- MODIFIED
-    c.drawString(4.5 * inch, height - 2.0 * inch, f"Invoice #: {data['invoice_id']}"); c.drawString(4.5 * inch, height - 2.2 * inch, f"Issue Date: {data['issue_date']}")
-
-    y_pos = draw_items_table(c, height - 3 * inch, data, {"header_font_color": MODERN_BLUE})
-    c.setFont("Kanit-Bold", 12); c.drawRightString(width - 2.5 * inch, y_pos - 0.5 * inch, "Total Due:"); c.drawRightString(width - 0.7 * inch, y_pos - 0.5 * inch, f'${data["total"]:.2f}') # <-- MODIFIED
+MODERN_TEMPLATE = [
+    ("fill", colors.black),
+    ("image", OUR_COMPANY_LOGO_PATH, 0.5 * inch, HEIGHT - 1.1 * inch, 0.8 * inch, 0.8 * inch),
+    ("font", "Kanit-Bold", 16), ("text", "left", 1.5 * inch, HEIGHT - 0.9 * inch, OUR_COMPANY_NAME),
+    ("font", "Kanit", 9), ("text", "left", 1.5 * inch, HEIGHT - 1.1 * inch, OUR_COMPANY_ADDRESS),
+    ("stroke", MODERN_BLUE), ("line_width", 2), ("line", 0.5 * inch, HEIGHT - 1.5 * inch, WIDTH - 0.5 * inch, HEIGHT - 1.5 * inch),
+    ("font", "Kanit-Bold", 10), ("text", "left", 0.5 * inch, HEIGHT - 1.8 * inch, "BILL TO"), ("text", "left", 4.5 * inch, HEIGHT - 1.8 * inch, "INVOICE DETAILS"),
+    ("font", "Kanit", 10),
+    ("text", "left", 0.5 * inch, HEIGHT - 2.0 * inch, Slot("{customer[name]}")), ("text", "left", 0.5 * inch, HEIGHT - 2.2 * inch, Slot("{customer[address]}")),
+    ("text", "left", 4.5 * inch, HEIGHT - 2.0 * inch, Slot("Invoice #: {invoice_id}")), ("text", "left", 4.5 * inch, HEIGHT - 2.2 * inch, Slot("Issue Date: {issue_date}")),
+    ("items_table", HEIGHT - 3 * inch, {"header_font_color": MODERN_BLUE}),
+    ("font", "Kanit-Bold", 12),
+    ("text", "right", WIDTH - 2.5 * inch, Below(0.5 * inch), "Total Due:"), ("text", "right", WIDTH - 0.7 * inch, Below(0.5 * inch), Slot("${total:.2f}")),
+]
 
 # --- TEMPLATE 3: BOLD HEADER ---
-def create_bold_header_template(c, data):
-    width, height = letter
-    c.setFillColor(HEADER_GRAY); c.rect(0, height - 1.5*inch, width, 1.5*inch, stroke=0, fill=1)
-
-    c.setFillColor(colors.white)
-    if os.path.exists(OUR_COMPANY_LOGO_PATH): c.drawImage(OUR_COMPANY_LOGO_PATH, 0.5 * inch, height - 1.25 * inch, width=1*inch, height=1*inch, preserveAspectRatio=True, mask='auto')
-    c.setFont("Kanit-Bold", 28); c.drawRightString(width - 0.5 * inch, height - 1.1 * inch, "INVOICE") # <-- MODIFIED
-
-    c.setFillColor(colors.black)
-    c.setFont("Kanit-Bold", 10); c.drawString(0.5 * inch, height - 1.8 * inch, "FROM"); c.drawString(4.5 * inch, height - 1.8 * inch, "BILL TO") # <-- MODIFIED
-    c.setFont("Kanit", 10); c.drawString(0.5 * inch, height - 2.0 * inch, OUR_COMPANY_NAME); c.drawString(0.5 * inch, height - 2.2 * inch, OUR_COMPANY_ADDRESS) # <-- MODIFIED
-    c.drawString(4.5 * inch, height - 2.0 * inch, data["customer"]["name"]); c.drawString(4.5 * inch, height - 2.2 * inch, data["customer"]["address"])
-
-    y_pos = draw_items_table(c, height - 3.5 * inch, data, {"header_bg_color": colors.lightgrey})
-    c.setFillColor(HEADER_GRAY); c.rect(width - 3.2 * inch, y_pos - 0.5 * inch, 2.7 * inch, 0.5 * inch, stroke=0, fill=1)
-    c.setFillColor(colors.white); c.setFont("Kanit-Bold", 12); c.drawString(width - 3 * inch, y_pos - 0.35 * inch, "TOTAL"); c.drawRightString(width - 0.7 * inch, y_pos - 0.35 * inch, f'${data["total"]:.2f}') # <-- MODIFIED
+BOLD_HEADER_TEMPLATE = [
+    ("fill", HEADER_GRAY), ("rect", 0, HEIGHT - 1.5 * inch, WIDTH, 1.5 * inch),
+    ("fill", colors.white),
+    ("image", OUR_COMPANY_LOGO_PATH, 0.5 * inch, HEIGHT - 1.25 * inch, 1 * inch, 1 * inch),
+    ("font", "Kanit-Bold", 28), ("text", "right", WIDTH - 0.5 * inch, HEIGHT - 1.1 * inch, "INVOICE"),
+    ("fill", colors.black),
+    ("font", "Kanit-Bold", 10), ("text", "left", 0.5 * inch, HEIGHT - 1.8 * inch, "FROM"), ("text", "left", 4.5 * inch, HEIGHT - 1.8 * inch, "BILL TO"),
+    ("font", "Kanit", 10),
+    ("text", "left", 0.5 * inch, HEIGHT - 2.0 * inch, OUR_COMPANY_NAME), ("text", "left", 0.5 * inch, HEIGHT - 2.2 * inch, OUR_COMPANY_ADDRESS),
+    ("text", "left", 4.5 * inch, HEIGHT - 2.0 * inch, Slot("{customer[name]}")), ("text", "left", 4.5 * inch, HEIGHT - 2.2 * inch, Slot("{customer[address]}")),
+    ("items_table", HEIGHT - 3.5 * inch, {"header_bg_color": colors.lightgrey}),
+    ("fill", HEADER_GRAY), ("rect", WIDTH - 3.2 * inch, Below(0.5 * inch), 2.7 * inch, 0.5 * inch),
+    ("fill", colors.white), ("font", "Kanit-Bold", 12),
+    ("text", "left", WIDTH - 3 * inch, Below(0.35 * inch), "TOTAL"), ("text", "right", WIDTH - 0.7 * inch, Below(0.35 * inch), Slot("${total:.2f}")),
+]
 
 # --- TEMPLATE 4: BOXED LAYOUT ---
-def create_boxed_template(c, data):
-    width, height = letter
-    c.setFont("Kanit-Bold", 16); c.drawString(0.5*inch, height-0.7*inch, OUR_COMPANY_NAME) # <-- MODIFIED
-    c.setFont("Kanit-Bold", 28); c.drawRightString(width - 0.5*inch, height-0.7*inch, "INVOICE") # <-- MODIFIED
-
-    c.setFillColor(BOX_GRAY_LIGHT); c.rect(0.5*inch, height-2.5*inch, 3.5*inch, 1.2*inch, stroke=0, fill=1)
-    c.rect(4.5*inch, height-2.5*inch, 3.5*inch, 1.2*inch, stroke=0, fill=1)
-    c.setFillColor(colors.black)
-
-    c.setFont("Kanit-Bold", 10); c.drawString(0.7*inch, height-1.5*inch, "BILL TO") # <-- MODIFIED
-    c.setFont("Kanit", 10); c.drawString(0.7*inch, height-1.7*inch, data["customer"]["name"]); c.drawString(0.7*inch, height-1.9*inch, data["customer"]["address"]) # <-- MODIFIED
-
-    c.setFont("Kanit-Bold", 10); c.drawString(4.7*inch, height-1.5*inch, "INVOICE #"); c.drawString(4.7*inch, height-1.9*inch, "ISSUE DATE") # <-- MODIFIED
-    c.setFont("Kanit", 10); c.drawString(5.7*inch, height-1.5*inch, data["invoice_id"]); c.drawString(5.7*inch, height-1.9*inch, data["issue_date"]) # <-- MODIFIED
-
-    y_pos = draw_items_table(c, height-3*inch, data, {"header_bg_color": colors.black, "header_font_color": colors.white})
-    c.setFont("Kanit-Bold", 12); c.drawRightString(width - 2.5 * inch, y_pos - 0.5 * inch, "TOTAL:"); c.drawRightString(width - 0.7 * inch, y_pos - 0.5 * inch, f'${data["total"]:.2f}') # <-- MODIFIED
+BOXED_TEMPLATE = [
+    ("font", "Kanit-Bold", 16), ("text", "left", 0.5 * inch, HEIGHT - 0.7 * inch, OUR_COMPANY_NAME),
+    ("font", "Kanit-Bold", 28), ("text", "right", WIDTH - 0.5 * inch, HEIGHT - 0.7 * inch, "INVOICE"),
+    ("fill", BOX_GRAY_LIGHT),
+    ("rect", 0.5 * inch, HEIGHT - 2.5 * inch, 3.5 * inch, 1.2 * inch), ("rect", 4.5 * inch, HEIGHT - 2.5 * inch, 3.5 * inch, 1.2 * inch),
+    ("fill", colors.black),
+    ("font", "Kanit-Bold", 10), ("text", "left", 0.7 * inch, HEIGHT - 1.5 * inch, "BILL TO"),
+    ("font", "Kanit", 10),
+    ("text", "left", 0.7 * inch, HEIGHT - 1.7 * inch, Slot("{customer[name]}")), ("text", "left", 0.7 * inch, HEIGHT - 1.9 * inch, Slot("{customer[address]}")),
+    ("font", "Kanit-Bold", 10), ("text", "left", 4.7 * inch, HEIGHT - 1.5 * inch, "INVOICE #"), ("text", "left", 4.7 * inch, HEIGHT - 1.9 * inch, "ISSUE DATE"),
+    ("font", "Kanit", 10),
+    ("text", "left", 5.7 * inch, HEIGHT - 1.5 * inch, Slot("{invoice_id}")), ("text", "left", 5.7 * inch, HEIGHT - 1.9 * inch, Slot("{issue_date}")),
+    ("items_table", HEIGHT - 3 * inch, {"header_bg_color": colors.black, "header_font_color": colors.white}),
+    ("font", "Kanit-Bold", 12),
+    ("text", "right", WIDTH - 2.5 * inch, Below(0.5 * inch), "TOTAL:"), ("text", "right", WIDTH - 0.7 * inch, Below(0.5 * inch), Slot("${total:.2f}")),
+]
 
 # --- TEMPLATE 5: CENTERED FORMAL ---
-def create_centered_template(c, data):
-    width, height = letter
-    if os.path.exists(OUR_COMPANY_LOGO_PATH): c.drawCentredString(width/2, height - 0.8 * inch, ""); c.drawImage(OUR_COMPANY_LOGO_PATH, width/2 - 0.5*inch, height - 1*inch, width=1*inch, height=1*inch, preserveAspectRatio=True, mask='auto')
-
-    c.setFont("Kanit-Bold", 16); c.drawCentredString(width/2, height-1.4*inch, OUR_COMPANY_NAME) # <-- MODIFIED
-    c.setFont("Kanit", 10); c.drawCentredString(width/2, height-1.6*inch, OUR_COMPANY_ADDRESS) # <-- MODIFIED
-
-    c.setFont("Kanit-Bold", 12); c.drawString(0.5*inch, height-2.5*inch, "BILL TO:"); c.drawRightString(width-0.5*inch, height-2.5*inch, f"INVOICE #: {data['invoice_id']}") # <-- MODIFIED
-    c.setFont("Kanit", 10); c.drawString(0.5*inch, height-2.7*inch, data["customer"]["name"]); c.drawRightString(width-0.5*inch, height-2.7*inch, f"DATE: {data['issue_date']}") # <-- MODIFIED
+CENTERED_TEMPLATE = [
+    ("image", OUR_COMPANY_LOGO_PATH, WIDTH / 2 - 0.5 * inch, HEIGHT - 1 * inch, 1 * inch, 1 * inch),
+    ("font", "Kanit-Bold", 16), ("text", "centre", WIDTH / 2, HEIGHT - 1.4 * inch, OUR_COMPANY_NAME),
+    ("font", "Kanit", 10), ("text", "centre", WIDTH / 2, HEIGHT - 1.6 * inch, OUR_COMPANY_ADDRESS),
+    ("font", "Kanit-Bold", 12),
+    ("text", "left", 0.5 * inch, HEIGHT - 2.5 * inch, "BILL TO:"), ("text", "right", WIDTH - 0.5 * inch, HEIGHT - 2.5 * inch, Slot("INVOICE #: {invoice_id}")),
+    ("font", "Kanit", 10),
+    ("text", "left", 0.5 * inch, HEIGHT - 2.7 * inch, Slot("{customer[name]}")), ("text", "right", WIDTH - 0.5 * inch, HEIGHT - 2.7 * inch, Slot("DATE: {issue_date}")),
+    ("items_table", HEIGHT - 3.5 * inch, {}),
+    ("font", "Kanit-Bold", 14), ("text", "right", WIDTH - 0.7 * inch, Below(0.6 * inch), Slot("TOTAL: ${total:.2f}")),
+    ("font", "Kanit-Italic", 10), ("text", "centre", WIDTH / 2, Below(1.2 * inch), "Thank you for your business!"),
+]
 
-    y_pos = draw_items_table(c, height-3.5*inch, data, {})
-    c.setFont("Kanit-Bold", 14); c.drawRightString(width-0.7*inch, y_pos - 0.6 * inch, f'TOTAL: ${data["total"]:.2f}') # <-- MODIFIED
-    c.setFont("Kanit-Italic", 10); c.drawCentredString(width/2, y_pos-1.2*inch, "Thank you for your business!") # <-- MODIFIED
+INVOICE_TEMPLATES = {
+    "classic": CLASSIC_TEMPLATE,
+    "modern": MODERN_TEMPLATE,
+    "bold_header": BOLD_HEADER_TEMPLATE,
+    "boxed": BOXED_TEMPLATE,
+    "centered": CENTERED_TEMPLATE,
+}
+
+# --- Template compilation and replay ---
+STATE_OPS = ("font", "fill", "stroke", "line_width")
+DEFAULT_STATE = (("Helvetica", 12), colors.black, colors.black, 1) # a fresh canvas page
+TEXT_METHODS = {"left": "drawString", "right": "drawRightString", "centre": "drawCentredString"}
+
+_COMPILED_TEMPLATES = {} # template name -> {"form": ..., "static": [...], "dynamic": [...]}
+
+def compile_template(name):
+    """Splits a declared template into static and per-invoice ops.
+
+    Each op is stored with the graphics state it was declared under, as
+    (state, kind, args), so replay only issues the state changes it needs.
+    Ops that read a Slot, sit Below the table, or are the table itself are
+    per-invoice; the rest go into the template's form XObject.
+    """
+    state = dict(zip(STATE_OPS, DEFAULT_STATE))
+    static, dynamic = [], []
+    for op in INVOICE_TEMPLATES[name]:
+        kind, args = op[0], op[1:]
+        if kind in STATE_OPS:
+            state[kind] = args if kind == "font" else args[0]
+            continue
+        if kind == "image" and not os.path.exists(args[0]):
+            continue
+        if kind == "text":
+            align, x, y, text = args
+            kind, args = TEXT_METHODS[align], (x, y, text)
+        per_invoice = kind == "items_table" or any(isinstance(arg, (Slot, Below)) for arg in args)
+        (dynamic if per_invoice else static).append((tuple(state[key] for key in STATE_OPS), kind, args))
+    return {"form": f"invoice_template_{name}", "static": static, "dynamic": dynamic}
+
+def get_compiled_template(name):
+    if name not in _COMPILED_TEMPLATES:
+        _COMPILED_TEMPLATES[name] = compile_template(name)
+    return _COMPILED_TEMPLATES[name]
+
+def set_state(c, state, current):
+    font, fill, stroke, line_width = state
+    if current is None or font != current[0]: c.setFont(*font)
+    if current is None or fill != current[1]: c.setFillColor(fill)
+    if current is None or stroke != current[2]: c.setStrokeColor(stroke)
+    if current is None or line_width != current[3]: c.setLineWidth(line_width)
+
+def replay_ops(c, ops, data=None):
+    """Draws compiled ops onto the canvas, binding Slots to `data`."""
+    current, table_y = DEFAULT_STATE, None
+    for state, kind, args in ops:
+        if state != current:
+            set_state(c, state, current)
+            current = state
+        if kind == "items_table":
+            table_y = draw_items_table(c, args[0], data, args[1])
+            current = None # the table leaves its own font and colours behind
+            continue
+        args = [table_y - arg.offset if isinstance(arg, Below) else arg.format.format(**data) if isinstance(arg, Slot) else arg for arg in args]
+        if kind == "image":
+            draw_image(c, *args)
+        elif kind == "rect":
+            c.rect(*args, stroke=0, fill=1)
+        elif kind == "line":
+            c.line(*args)
+        else:
+            getattr(c, kind)(*args)
 
 # --- PDF Creation Dispatcher ---
-# (This function is unchanged)
-def create_invoice_pdf(invoice_data, file_path, template_choice):
-    c = canvas.Canvas(file_path, pagesize=letter)
-    if template_choice == 'classic': create_classic_template(c, invoice_data)
-    elif template_choice == 'modern': create_modern_template(c, invoice_data)
-    elif template_choice == 'bold_header': create_bold_header_template(c, invoice_data)
-    elif template_choice == 'boxed': create_boxed_template(c, invoice_data)
-    elif template_choice == 'centered': create_centered_template(c, invoice_data)
+def draw_invoice(c, invoice_data, template_choice):
+    """Replays a compiled template onto the current page.
+
+    The static part is written into the PDF once as a form XObject the first
+    time a template is used in a file; later pages only reference it.
+    """
+    use_font_family("Kanit")
+    compiled = get_compiled_template(template_choice)
+    if not c.hasForm(compiled["form"]):
+        c.beginForm(compiled["form"])
+        replay_ops(c, compiled["static"])
+        c.endForm()
+    c.doForm(compiled["form"])
+    replay_ops(c, compiled["dynamic"], invoice_data)
+
+def create_invoice_pdf(invoice_data, file_path, template_choice, raster_dpi=RASTER_DPI, boxes=WORD_BOXES):
+    """Writes one invoice PDF (and its box file with boxes=True) and returns the PNG page rasters drawn with it, if any."""
+    c = open_canvas(file_path, letter, raster_dpi, boxes)
+    draw_invoice(c, invoice_data, template_choice)
     c.save()
+    return raster_pages(c)
+
+def create_invoice_batch_pdf(invoices, file_path, raster_dpi=RASTER_DPI, boxes=WORD_BOXES):
+    """Writes several invoices to one PDF, each starting on a new page.
+
+    `invoices` is a list of (invoice_data, template_choice). The Kanit subsets
+    and the company logo are embedded once for the whole file; every page
+    starts from the same default graphics state as a fresh canvas. Returns
+    the [first, last] page of each invoice and the PNG page rasters, if any.
+    """
+    c = open_canvas(file_path, letter, raster_dpi, boxes)
+    page_ranges = []
+    for invoice_data, template_choice in invoices:
+        first_page = c.getPageNumber()
+        draw_invoice(c, invoice_data, template_choice)
+        c.showPage()
+        page_ranges.append([first_page, c.getPageNumber() - 1])
+    c.save()
+    return page_ranges, raster_pages(c)
+
+def build_groundtruth_record(invoice_data):
+    """Ground truth for one drawn invoice, from the line items and totals draw_items_table() collected."""
+    groundtruth_record = {
+        "invoice_id": invoice_data["invoice_id"],
+        "issue_date": invoice_data["issue_date"],
+        "customer_name": invoice_data["customer"]["name"],
+        "customer_address": invoice_data["customer"]["address"],
+        "subtotal": round(invoice_data["subtotal"], 2),
+        "tax_amount": round(invoice_data["tax_amount"], 2),
+        "total": round(invoice_data["total"], 2),
+        "line_items": invoice_data["line_items"]
+    }
+    return groundtruth_record
+
+class LineItems:
+    """The line items of one invoice, drawn on demand from their own seed.
+
+    Iterating yields `count` item dicts one at a time and the same ones every
+    time, so the table can be drawn and the document hashed without the whole
+    list ever being held.
+    """
+    def __init__(self, count, seed, pick_product):
+        self.count, self.seed, self.pick_product = count, seed, pick_product
+
+    def __iter__(self):
+        rng = random.Random(self.seed)
+        for _ in range(self.count):
+            item = self.pick_product(rng)
+            yield {"name": item["name"], "quantity": rng.randint(1, 10), "price": item["price"]}
+
+def generate_invoice_data(i, pick_customer, pick_product, max_items=MAX_LINE_ITEMS, now=None):
+    """Draws invoice `i` from the samplers, dated back from `now` (default: the current time).
+
+    Items come as a LineItems; draw_items_table() adds the totals.
+    """
+    invoice_id = f"INV-2025-{i:04d}"
+    issue_date = (now or datetime.now()) - timedelta(days=random.randint(0, 30))
+    customer = pick_customer()
+    items = LineItems(random.randint(1, max_items), random.getrandbits(64), pick_product)
+
+    return {
+        "filename": f"invoice_{invoice_id}.pdf", "invoice_id": invoice_id,
+        "issue_date": issue_date.strftime("%Y-%m-%d"), "customer": customer,
+        "items": items, "tax_rate": 0.07,
+    }
+
+# --- Incremental regeneration ---
+# Code and layout every template draws through; editing any of it re-renders all invoices
+INVOICE_RENDER_CODE = (draw_table_header, draw_page_subtotal, start_continuation_page, draw_items_table,
+                       compile_template, set_state, replay_ops, draw_invoice, build_groundtruth_record, LineItems,
+                       pdf_resources, pdf_raster, pdf_boxes, text_layout, output_layout,
+                       TABLE_ROW_HEIGHT, TABLE_BOTTOM, TOTALS_SPACE, CONTINUATION_TOP, DEFAULT_STATE)
+
+def invoice_template_hash(name):
+    """Hash of one template's declared ops plus the shared drawing code, so editing a template only touches its invoices."""
+    return source_hash(name, INVOICE_TEMPLATES[name], *INVOICE_RENDER_CODE)
+
+def invoice_resources_hash():
+    font_paths = [os.path.join(RESOURCES_FOLDER, file_name) for file_name in FONT_FAMILIES["Kanit"].values()]
+    return resources_hash([OUR_COMPANY_LOGO_PATH] + font_paths, versions=(reportlab.Version, PIL.__version__))
+
+def invoice_document_hash(invoices, template_hashes, resources, raster_dpi, boxes, layout):
+    """Hash of everything one output file is drawn from; taken before drawing adds the line items and totals.
+
+    The line items are hashed one at a time as LineItems draws them again.
+    """
+    digest = hashlib.sha256(hash_json({
+        "invoices": [[{key: value for key, value in data.items() if key != "items"}, template_hashes[template_choice]]
+                     for data, template_choice in invoices],
+        "resources": resources, "raster_dpi": raster_dpi, "boxes": boxes, "layout": layout}).encode())
+    for data, _template_choice in invoices:
+        for item in data["items"]:
+            digest.update(hash_json(item).encode())
+    return digest.hexdigest()
 
 
 # --- Main Generation Loop ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate invoice PDFs with ground truth.")
+    parser.add_argument("--per-pdf", type=int, default=INVOICES_PER_PDF, help="invoices per PDF file, each starting on a new page")
+    parser.add_argument("--max-items", type=int, default=MAX_LINE_ITEMS, help="maximum line items per invoice")
+    parser.add_argument("--customers", default=CUSTOMERS_CSV, help="customer catalog CSV (name,address[,weight])")
+    parser.add_argument("--products", default=PRODUCTS_CSV, help="product catalog CSV (name,price[,weight])")
+    parser.add_argument("--raster-dpi", type=int, default=RASTER_DPI, help="also write a PNG of every page at this DPI")
+    parser.add_argument("--boxes", action="store_true", default=WORD_BOXES, help="also write the word and field boxes of every page to <pdf name>_boxes.json")
+    parser.add_argument("--layout", choices=OUTPUT_LAYOUTS, default=OUTPUT_LAYOUT, help="flat output folder, or two levels of hash-prefixed subfolders for large runs")
+    parser.add_argument("--seed", type=int, default=SEED, help="random seed, so reruns draw the same invoices")
+    parser.add_argument("--incremental", action="store_true", help="keep the output folder and only re-render files whose inputs changed since the last run")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
     # --- START: ADDED FOR CUSTOM FONT ---
-    # Define font paths
-    font_regular_path = os.path.join("resources", "Kanit-Regular.ttf")
-    font_bold_path = os.path.join("resources", "Kanit-Bold.ttf")
-    font_italic_path = os.path.join("resources", "Kanit-Italic.ttf")
-    font_bold_italic_path = os.path.join("resources", "Kanit-BoldItalic.ttf")
-
-    # Check if font files exist before registering
-    if not all(os.path.exists(p) for p in [font_regular_path, font_bold_path, font_italic_path, font_bold_italic_path]):
+    # Check the font files up front; the family itself is registered on first use by draw_invoice()
+    if missing_font_files("Kanit"):
         print("ERROR: Kanit font files not found in the 'resources' folder.")
         print("Please download Kanit from Google Fonts and place the following files in './resources/':")
         print("- Kanit-Regular.ttf\n- Kanit-Bold.ttf\n- Kanit-Italic.ttf\n- Kanit-BoldItalic.ttf")
         sys.exit(1) # Exit the script
-
-    # Register the Kanit font family
-    pdfmetrics.registerFont(TTFont('Kanit', font_regular_path))
-    pdfmetrics.registerFont(TTFont('Kanit-Bold', font_bold_path))
-    pdfmetrics.registerFont(TTFont('Kanit-Italic', font_italic_path))
-    pdfmetrics.registerFont(TTFont('Kanit-BoldItalic', font_bold_italic_path))
-    pdfmetrics.registerFontFamily('Kanit', normal='Kanit', bold='Kanit-Bold', italic='Kanit-Italic', boldItalic='Kanit-BoldItalic')
-    print("Successfully registered Kanit font family.")
     # --- END: ADDED FOR CUSTOM FONT ---
 
 
     # --- START: FOLDER CLEANUP UTILITY ---
-    # If the output folder exists, remove it and all its contents
-    if os.path.exists(OUTPUT_FOLDER):
+    # If the output folder exists, remove it and all its contents (--incremental reuses it through manifest.json)
+    if os.path.exists(OUTPUT_FOLDER) and not args.incremental:
         print(f"Removing existing directory: {OUTPUT_FOLDER}")
         shutil.rmtree(OUTPUT_FOLDER)
     # --- END: FOLDER CLEANUP UTILITY ---
@@ -215,56 +622,80 @@ if __name__ == "__main__":
         print(f"WARNING: Logo file not found at '{OUR_COMPANY_LOGO_PATH}'.")
         print("Please place your logo there to have it included in the invoices.")
 
+    pick_customer = make_sampler(args.customers, CUSTOMER_COMPANIES, ["name", "address"], [])
+    pick_product = make_sampler(args.products, PRODUCT_ITEMS, ["name"], ["price"])
+
     groundtruth_data = {}
+    batch = [] # (invoice_data, template_choice) waiting for a --per-pdf file
+
+    previous_documents = load_manifest(OUTPUT_FOLDER) if args.incremental else {}
+    documents = {} # output file -> manifest entry for this run
+    now = reference_date(OUTPUT_FOLDER, args.incremental) # kept in the manifest, so reruns on later days draw the same dates
+    template_hashes = {name: invoice_template_hash(name) for name in INVOICE_TEMPLATES}
+    resources = invoice_resources_hash()
+    unchanged_files = 0
 
     for i in range(1, NUMBER_OF_INVOICES + 1):
-        invoice_id = f"INV-2025-{i:04d}"
-        issue_date = datetime.now() - timedelta(days=random.randint(0, 30))
-        customer = random.choice(CUSTOMER_COMPANIES)
-
-        items, subtotal = [], 0
-        for _ in range(random.randint(1, 5)):
-            item = random.choice(PRODUCT_ITEMS)
-            quantity = random.randint(1, 10)
-            items.append({"name": item["name"], "quantity": quantity, "price": item["price"]})
-            subtotal += quantity * item["price"]
-
-        tax_rate, tax_amount = 0.07, subtotal * 0.07
-        total = subtotal + tax_amount
-
-        invoice_data = {
-            "filename": f"invoice_{invoice_id}.pdf", "invoice_id": invoice_id,
-            "issue_date": issue_date.strftime("%Y-%m-%d"), "customer": customer,
-            "items": items, "subtotal": subtotal, "tax_rate": tax_rate,
-            "tax_amount": tax_amount, "total": total,
-        }
-
-        template_choice = random.choice(['classic', 'modern', 'bold_header', 'boxed', 'centered'])
-        file_path = os.path.join(OUTPUT_FOLDER, invoice_data["filename"])
-        create_invoice_pdf(invoice_data, file_path, template_choice)
-
-        # Create and store ground truth data
-        groundtruth_record = {
-            "invoice_id": invoice_data["invoice_id"],
-            "issue_date": invoice_data["issue_date"],
-            "customer_name": invoice_data["customer"]["name"],
-            "customer_address": invoice_data["customer"]["address"],
-            "subtotal": round(invoice_data["subtotal"], 2),
-            "tax_amount": round(invoice_data["tax_amount"], 2),
-            "total": round(invoice_data["total"], 2),
-            "line_items": []
-        }
-        for item in invoice_data["items"]:
-            groundtruth_record["line_items"].append({
-                "description": item["name"],
-                "quantity": item["quantity"],
-                "unit_price": item["price"],
-                "line_total": round(item["quantity"] * item["price"], 2)
-            })
-
-        groundtruth_data[invoice_data["filename"]] = groundtruth_record
-
-        print(f"({i}/{NUMBER_OF_INVOICES}) Created: {invoice_data['filename']} (Template: {template_choice})")
+        invoice_data = generate_invoice_data(i, pick_customer, pick_product, args.max_items, now)
+        template_choice = random.choice(list(INVOICE_TEMPLATES))
+        if args.per_pdf <= 1:
+            filename = invoice_data["filename"]
+            relative_path = layout_path(filename, args.layout)
+            document_hash = invoice_document_hash([(invoice_data, template_choice)], template_hashes, resources, args.raster_dpi, args.boxes, args.layout)
+            if is_current(OUTPUT_FOLDER, previous_documents.get(filename), document_hash):
+                documents[filename] = previous_documents[filename]
+                groundtruth_data.update(documents[filename]["groundtruth"])
+                unchanged_files += 1
+                print(f"({i}/{NUMBER_OF_INVOICES}) Unchanged: {filename}")
+                continue
+            rasters = create_invoice_pdf(invoice_data, output_path(OUTPUT_FOLDER, relative_path), template_choice, args.raster_dpi, args.boxes)
+            # Create and store ground truth data
+            groundtruth_data[filename] = build_groundtruth_record(invoice_data)
+            raster_names = [beside(relative_path, os.path.basename(path)) for path in rasters]
+            if rasters:
+                groundtruth_data[filename]["rasters"] = raster_names
+            box_names = [box_file_path(relative_path)] if args.boxes else []
+            if box_names:
+                groundtruth_data[filename]["boxes"] = box_names[0]
+            documents[filename] = make_entry(document_hash, [relative_path] + raster_names + box_names, {filename: groundtruth_data[filename]})
+            print(f"({i}/{NUMBER_OF_INVOICES}) Created: {filename} (Template: {template_choice})")
+            continue
+
+        # Batch mode: ground truth is keyed by invoice_id and records the file and the pages the invoice spans
+        batch.append((invoice_data, template_choice))
+        if len(batch) == args.per_pdf or i == NUMBER_OF_INVOICES:
+            batch_filename = f"invoices_{batch[0][0]['invoice_id']}_to_{batch[-1][0]['invoice_id']}.pdf"
+            relative_path = layout_path(batch_filename, args.layout)
+            document_hash = invoice_document_hash(batch, template_hashes, resources, args.raster_dpi, args.boxes, args.layout)
+            if is_current(OUTPUT_FOLDER, previous_documents.get(batch_filename), document_hash):
+                documents[batch_filename] = previous_documents[batch_filename]
+                groundtruth_data.update(documents[batch_filename]["groundtruth"])
+                unchanged_files += 1
+                print(f"({i}/{NUMBER_OF_INVOICES}) Unchanged: {batch_filename}")
+                batch = []
+                continue
+            page_ranges, rasters = create_invoice_batch_pdf(batch, output_path(OUTPUT_FOLDER, relative_path), args.raster_dpi, args.boxes)
+            batch_groundtruth = {}
+            raster_names = [beside(relative_path, os.path.basename(path)) for path in rasters]
+            box_names = [box_file_path(relative_path)] if args.boxes else []
+            for (first_page, last_page), (data, _template) in zip(page_ranges, batch):
+                # "pages" is the invoice's first and last page; line item pages count from the start of the file too
+                batch_groundtruth[data["invoice_id"]] = {"file": batch_filename, "page": first_page, "pages": [first_page, last_page],
+                                                         **build_groundtruth_record(data)}
+                if rasters:
+                    batch_groundtruth[data["invoice_id"]]["rasters"] = raster_names[first_page - 1:last_page]
+                if box_names:
+                    # One box file for the whole PDF, its pages counted like "page"
+                    batch_groundtruth[data["invoice_id"]]["boxes"] = box_names[0]
+            groundtruth_data.update(batch_groundtruth)
+            documents[batch_filename] = make_entry(document_hash, [relative_path] + raster_names + box_names, batch_groundtruth)
+            print(f"({i}/{NUMBER_OF_INVOICES}) Created: {batch_filename} ({len(batch)} invoices)")
+            batch = []
+
+    # Drop files of documents this run no longer produces, then record what each file was built from
+    removed_files = remove_stale_files(OUTPUT_FOLDER, previous_documents, documents)
+    save_manifest(OUTPUT_FOLDER, documents, now)
+    index_filepath = write_index(OUTPUT_FOLDER, [name for entry in documents.values() for name in entry["files"]])
 
     # Write the groundtruth JSON file
     groundtruth_file_path = os.path.join(OUTPUT_FOLDER, "groundtruth.json")
@@ -272,4 +703,9 @@ if __name__ == "__main__":
         json.dump(groundtruth_data, f, indent=4)
 
     print(f"\nSuccessfully generated {NUMBER_OF_INVOICES} invoices in the '{OUTPUT_FOLDER}' folder.")
-    print(f"Successfully generated groundtruth.json at '{groundtruth_file_path}'")
\ No newline at end of file
+    if args.incremental:
+        print(f"Incremental: {len(documents) - unchanged_files} files rendered, {unchanged_files} unchanged, {removed_files} stale files removed")
+    print(f"Successfully generated groundtruth.json at '{groundtruth_file_path}'")
+    print(f"File index saved to '{index_filepath}'")
+    print(f"Image cache: {format_image_cache_stats()}")
+    print(f"Font cache: {format_font_cache_stats()}")
\ No newline at end of file
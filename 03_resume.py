@@ -2,16 +2,35 @@ import os
 import shutil
 import random
 import json # <--- ADDED: Import the json library
+import sys
+import argparse
 from datetime import datetime, timedelta
 from faker import Faker
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
-from reportlab.pdfgen import canvas
 from reportlab.lib import colors
+import reportlab
+import pdf_raster
+import pdf_boxes
+import text_layout
+import output_layout
+from text_layout import wrap_words, format_width_cache_stats
+from faker_pools import PooledFaker, ensure_pool
+from pdf_raster import open_canvas
+from pdf_boxes import box_file_path
+from output_layout import document_id, layout_path, output_path, write_index, OUTPUT_LAYOUTS
+from output_manifest import source_hash, resources_hash, hash_json, load_manifest, save_manifest, reference_date, is_current, make_entry, remove_stale_files
 
 # --- CONFIGURATION ---
 NUMBER_OF_RESUMES = 100
 OUTPUT_FOLDER = "out/03_resumes"
+RESUME_TEMPLATES = ["classic", "modern", "sidebar"] # Names create_resume_pdf() accepts
+MAX_JOBS = 3 # Overridden by --max-jobs; raise it (and MAX_BULLETS) for longer, multi-page resumes
+MAX_BULLETS = 4 # Overridden by --max-bullets; description bullets per job, at least 2
+WORD_BOXES = False # Overridden by --boxes; also record word and field boxes of every page to <pdf name>_boxes.json
+USE_FAKER_POOLS = False # Overridden by --faker-pools; draw names, addresses, phones and bs lines from the shared pool
+OUTPUT_LAYOUT = "flat" # Overridden by --layout; "sharded" spreads the files over hash-prefixed subfolders (output_layout.py)
+SEED = None # Overridden by --seed; a fixed seed draws the same resumes every run
 
 # Template Colors
 MODERN_BLUE = colors.HexColor('#2d5d8a')
@@ -121,217 +140,314 @@ def get_job_title(industry, years_exp):
     else: level = "senior"
     return random.choice(INDUSTRY_DATA[industry]["job_titles"][level])
 
-def wrap_text(c, text, x, y, max_width, line_height, font, size):
-    c.setFont(font, size)
-    lines = []
-    words = text.split()
-    if not words: return y
-    current_line = words[0]
-    for word in words[1:]:
-        if c.stringWidth(f"{current_line} {word}", font, size) < max_width:
-            current_line += f" {word}"
-        else:
-            lines.append(current_line)
-            current_line = word
-    lines.append(current_line)
-    for line in lines:
-        c.drawString(x, y, line)
-        y -= line_height
-    return y
+# --- FLOW LAYOUT ---
+# Templates describe their content as blocks, measured once when they are
+# built: (height, draw, keep_with_next), where draw(c, y) draws the block with
+# its first baseline at y and height is how far it moves the cursor down.
+# Gaps are blocks without a draw. paginate() then splits the blocks across
+# pages at block boundaries, so a long resume is laid out in one pass.
+PAGE_TOP = letter[1] - 1 * inch # First baseline on continuation pages
+PAGE_BOTTOM = 0.75 * inch # The cursor may not move below this
+
+def paragraph_block(text, x, max_width, line_height, font, size, keep=False):
+    """A wrapped paragraph; the text is wrapped here, not when it is drawn."""
+    lines = list(wrap_words(text.split(), font, size, max_width))
+    def draw(c, y):
+        c.setFont(font, size)
+        for line in lines:
+            c.drawString(x, y, line)
+            y -= line_height
+    return (len(lines) * line_height, draw, keep)
+
+def entry_block(title, right_text, subtitle, x, right_x, fonts, height, keep=False):
+    """A title with right-aligned text (a job's dates, a graduation year) and a subtitle 0.2" below."""
+    title_font, right_font, subtitle_font = fonts
+    def draw(c, y):
+        c.setFont(*title_font)
+        c.drawString(x, y, title)
+        c.setFont(*right_font)
+        c.drawRightString(right_x, y, right_text)
+        c.setFont(*subtitle_font)
+        c.drawString(x, y - 0.2 * inch, subtitle)
+    return (height, draw, keep)
+
+def gap(height):
+    return (height, None, False)
+
+def experience_blocks(jobs, x, right_x, bullet_width, fonts):
+    blocks = []
+    for job in jobs:
+        # The job header stays with its first bullet
+        blocks.append(entry_block(job["title"], job["dates"], job["company"], x, right_x, fonts, 0.45 * inch, keep=True))
+        for bullet in job["description"]:
+            blocks.append(paragraph_block(f"• {bullet}", x + 0.2 * inch, bullet_width, 14, "Helvetica", 10))
+        blocks.append(gap(0.1 * inch))
+    return blocks
+
+def paginate(blocks, first_top, next_top=PAGE_TOP, bottom=PAGE_BOTTOM):
+    """Splits blocks into pages at block boundaries; returns the pages as lists of (y, draw).
+
+    A keep_with_next block goes to the next page together with the block
+    after it, unless the run is taller than a page. Gaps are dropped where
+    they would open a page.
+    """
+    units, unit = [], []
+    for block in blocks:
+        unit.append(block)
+        if not block[2]:
+            units.append(unit)
+            unit = []
+    if unit:
+        units.append(unit)
+
+    pages, y = [[]], first_top
+    for unit in units:
+        height = sum(block[0] for block in unit)
+        if y - height < bottom and pages[-1] and height <= next_top - bottom:
+            pages.append([])
+            y = next_top
+        for block_height, draw, _keep in unit:
+            if y - block_height < bottom and pages[-1]:
+                pages.append([])
+                y = next_top
+            if draw is None and not pages[-1]:
+                continue
+            if draw is not None:
+                pages[-1].append((y, draw))
+            y -= block_height
+    return pages
+
+def draw_placed(c, placed):
+    for y, draw in placed:
+        draw(c, y)
 
 # --- TEMPLATE 1: CLASSIC PROFESSIONAL ---
 def create_classic_template(c, data):
     width, height = letter
-    # Name & Contact
-    c.setFont("Helvetica-Bold", 24)
-    c.drawCentredString(width / 2.0, height - 1 * inch, data["name"])
-    c.setFont("Helvetica", 10)
-    contact_info = f'{data["address"]} | {data["phone"]} | {data["email"]}'
-    c.drawCentredString(width / 2.0, height - 1.25 * inch, contact_info)
-    y_pos = height - 1.75 * inch
-
-    # Sections
+    blocks = []
     for section in ["summary", "experience", "education", "skills"]:
         if not data.get(section): continue
-        
-        c.setFont("Helvetica-Bold", 14)
+
         title = data[f"{section}_title"] if f"{section}_title" in data else section.replace("_", " ").title()
-        c.drawString(1 * inch, y_pos, title)
-        c.line(1 * inch, y_pos - 0.05 * inch, width - 1 * inch, y_pos - 0.05 * inch)
-        y_pos -= 0.3 * inch
+        def draw_title(c, y, title=title):
+            c.setFont("Helvetica-Bold", 14)
+            c.drawString(1 * inch, y, title)
+            c.line(1 * inch, y - 0.05 * inch, width - 1 * inch, y - 0.05 * inch)
+        blocks.append((0.3 * inch, draw_title, True))
 
         if section == "summary":
-            y_pos = wrap_text(c, data["summary_text"], 1 * inch, y_pos, width - 2 * inch, 14, "Helvetica", 10)
+            blocks.append(paragraph_block(data["summary_text"], 1 * inch, width - 2 * inch, 14, "Helvetica", 10))
         elif section == "skills":
             skills_text = ", ".join(data["skills"])
-            y_pos = wrap_text(c, skills_text, 1 * inch, y_pos, width - 2 * inch, 14, "Helvetica", 10)
+            blocks.append(paragraph_block(skills_text, 1 * inch, width - 2 * inch, 14, "Helvetica", 10))
         elif section == "education":
             edu = data["education"]
-            c.setFont("Helvetica-Bold", 11)
-            c.drawString(1 * inch, y_pos, edu["university"])
-            c.setFont("Helvetica-Oblique", 11)
-            c.drawRightString(width - 1 * inch, y_pos, f'Graduated: {edu["grad_year"]}')
-            y_pos -= 0.2 * inch
-            c.setFont("Helvetica", 11)
-            c.drawString(1 * inch, y_pos, edu["degree"])
+            blocks.append(entry_block(edu["university"], f'Graduated: {edu["grad_year"]}', edu["degree"], 1 * inch, width - 1 * inch,
+                                      (("Helvetica-Bold", 11), ("Helvetica-Oblique", 11), ("Helvetica", 11)), 0.2 * inch))
         elif section == "experience":
-            for job in data["experience"]:
-                c.setFont("Helvetica-Bold", 11)
-                c.drawString(1 * inch, y_pos, job["title"])
-                c.setFont("Helvetica-Oblique", 11)
-                c.drawRightString(width - 1 * inch, y_pos, job["dates"])
-                y_pos -= 0.2 * inch
-                c.setFont("Helvetica", 11)
-                c.drawString(1 * inch, y_pos, job["company"])
-                y_pos -= 0.25 * inch
-                for bullet in job["description"]:
-                    y_pos = wrap_text(c, f"• {bullet}", 1.2 * inch, y_pos, width - 2.4 * inch, 14, "Helvetica", 10)
-                y_pos -= 0.1 * inch
-        y_pos -= 0.25 * inch
+            blocks += experience_blocks(data["experience"], 1 * inch, width - 1 * inch, width - 2.4 * inch,
+                                        (("Helvetica-Bold", 11), ("Helvetica-Oblique", 11), ("Helvetica", 11)))
+        blocks.append(gap(0.25 * inch))
+
+    for number, placed in enumerate(paginate(blocks, height - 1.75 * inch)):
+        if number:
+            c.showPage()
+        else:
+            # Name & Contact
+            c.setFont("Helvetica-Bold", 24)
+            c.drawCentredString(width / 2.0, height - 1 * inch, data["name"])
+            c.setFont("Helvetica", 10)
+            contact_info = f'{data["address"]} | {data["phone"]} | {data["email"]}'
+            c.drawCentredString(width / 2.0, height - 1.25 * inch, contact_info)
+        draw_placed(c, placed)
 
 # --- TEMPLATE 2: MODERN WITH COLOR ---
 def create_modern_template(c, data):
     width, height = letter
-    c.setFillColor(colors.black)
-    
-    # Name & Contact
-    c.setFont("Helvetica-Bold", 28)
-    c.drawString(1 * inch, height - 1 * inch, data["name"])
-    c.setFont("Helvetica", 10)
-    c.drawString(1 * inch, height - 1.25 * inch, f'{data["email"]} | {data["phone"]}')
-    c.drawString(1 * inch, height - 1.4 * inch, data["address"])
-    y_pos = height - 2 * inch
-    
-    # Sections
+    blocks = []
     for section in ["summary", "experience", "education", "skills"]:
         if not data.get(section): continue
-        
-        c.setFont("Helvetica-Bold", 14)
-        c.setFillColor(MODERN_BLUE)
+
         title = data[f"{section}_title"] if f"{section}_title" in data else section.replace("_", " ").title()
-        c.drawString(1 * inch, y_pos, title)
-        c.setStrokeColor(MODERN_BLUE)
-        c.setLineWidth(2)
-        c.line(1 * inch, y_pos - 0.1 * inch, 3 * inch, y_pos - 0.1 * inch)
-        c.setFillColor(colors.black)
-        y_pos -= 0.35 * inch
+        def draw_title(c, y, title=title):
+            c.setFont("Helvetica-Bold", 14)
+            c.setFillColor(MODERN_BLUE)
+            c.drawString(1 * inch, y, title)
+            c.setStrokeColor(MODERN_BLUE)
+            c.setLineWidth(2)
+            c.line(1 * inch, y - 0.1 * inch, 3 * inch, y - 0.1 * inch)
+            c.setFillColor(colors.black)
+        blocks.append((0.35 * inch, draw_title, True))
 
-        # Logic for drawing content is similar to classic, just different styling
+        # Content blocks are the classic ones with different styling
         if section == "summary":
-            y_pos = wrap_text(c, data["summary_text"], 1 * inch, y_pos, width - 2 * inch, 15, "Helvetica", 10)
+            blocks.append(paragraph_block(data["summary_text"], 1 * inch, width - 2 * inch, 15, "Helvetica", 10))
         elif section == "skills":
             skills_text = ", ".join(data["skills"])
-            y_pos = wrap_text(c, skills_text, 1 * inch, y_pos, width - 2 * inch, 15, "Helvetica", 10)
+            blocks.append(paragraph_block(skills_text, 1 * inch, width - 2 * inch, 15, "Helvetica", 10))
         elif section == "education":
             edu = data["education"]
-            c.setFont("Helvetica-Bold", 11)
-            c.drawString(1 * inch, y_pos, edu["university"])
-            c.setFont("Helvetica", 10)
-            c.drawRightString(width - 1 * inch, y_pos, f'Graduated: {edu["grad_year"]}')
-            y_pos -= 0.2 * inch
-            c.setFont("Helvetica-Oblique", 11)
-            c.drawString(1 * inch, y_pos, edu["degree"])
+            blocks.append(entry_block(edu["university"], f'Graduated: {edu["grad_year"]}', edu["degree"], 1 * inch, width - 1 * inch,
+                                      (("Helvetica-Bold", 11), ("Helvetica", 10), ("Helvetica-Oblique", 11)), 0.2 * inch))
         elif section == "experience":
-            for job in data["experience"]:
-                c.setFont("Helvetica-Bold", 11)
-                c.drawString(1 * inch, y_pos, job["title"])
-                c.setFont("Helvetica", 10)
-                c.drawRightString(width - 1 * inch, y_pos, job["dates"])
-                y_pos -= 0.2 * inch
-                c.setFont("Helvetica-Oblique", 11)
-                c.drawString(1 * inch, y_pos, job["company"])
-                y_pos -= 0.25 * inch
-                for bullet in job["description"]:
-                    y_pos = wrap_text(c, f"• {bullet}", 1.2 * inch, y_pos, width - 2.4 * inch, 14, "Helvetica", 10)
-                y_pos -= 0.1 * inch
-        y_pos -= 0.25 * inch
+            blocks += experience_blocks(data["experience"], 1 * inch, width - 1 * inch, width - 2.4 * inch,
+                                        (("Helvetica-Bold", 11), ("Helvetica", 10), ("Helvetica-Oblique", 11)))
+        blocks.append(gap(0.25 * inch))
+
+    for number, placed in enumerate(paginate(blocks, height - 2 * inch)):
+        if number:
+            c.showPage()
+        else:
+            c.setFillColor(colors.black)
+            # Name & Contact
+            c.setFont("Helvetica-Bold", 28)
+            c.drawString(1 * inch, height - 1 * inch, data["name"])
+            c.setFont("Helvetica", 10)
+            c.drawString(1 * inch, height - 1.25 * inch, f'{data["email"]} | {data["phone"]}')
+            c.drawString(1 * inch, height - 1.4 * inch, data["address"])
+        draw_placed(c, placed)
 
 # --- TEMPLATE 3: SIDEBAR LAYOUT ---
 def create_sidebar_template(c, data):
     width, height = letter
     sidebar_width = 2.5 * inch
     main_margin = 0.5 * inch
-    
-    # Draw Sidebar
-    c.setFillColor(SIDEBAR_GRAY)
-    c.rect(0, 0, sidebar_width, height, stroke=0, fill=1)
-    
+
     # --- Sidebar Content ---
-    c.setFillColor(colors.white)
-    y_pos_side = height - 1 * inch
-    
-    # Name
-    c.setFont("Helvetica-Bold", 20)
-    y_pos_side = wrap_text(c, data["name"], main_margin, y_pos_side, sidebar_width - 1 * inch, 22, "Helvetica-Bold", 18)
-    y_pos_side -= 0.5 * inch
-    
-    # Contact
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(main_margin, y_pos_side, "Contact")
-    c.line(main_margin, y_pos_side - 0.05 * inch, sidebar_width - main_margin, y_pos_side - 0.05 * inch)
-    y_pos_side -= 0.25 * inch
-    c.setFont("Helvetica", 9)
-    y_pos_side = wrap_text(c, data["email"], main_margin, y_pos_side, sidebar_width - 1*inch, 12, "Helvetica", 9)
-    y_pos_side = wrap_text(c, data["phone"], main_margin, y_pos_side, sidebar_width - 1*inch, 12, "Helvetica", 9)
-    y_pos_side = wrap_text(c, data["address"], main_margin, y_pos_side, sidebar_width - 1*inch, 12, "Helvetica", 9)
-    y_pos_side -= 0.4 * inch
-
-    # Skills
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(main_margin, y_pos_side, "Skills")
-    c.line(main_margin, y_pos_side - 0.05 * inch, sidebar_width - main_margin, y_pos_side - 0.05 * inch)
-    y_pos_side -= 0.25 * inch
-    c.setFont("Helvetica", 9)
+    # The name heads the sidebar on every page; the rest flows on from page to page
+    name = paragraph_block(data["name"], main_margin, sidebar_width - 1 * inch, 22, "Helvetica-Bold", 18)
+    def draw_name(c, y):
+        c.setFont("Helvetica-Bold", 20)
+        name[1](c, y)
+    running_header = [(name[0], draw_name, False), gap(0.5 * inch)]
+
+    def sidebar_title(title):
+        def draw(c, y):
+            c.setFont("Helvetica-Bold", 11)
+            c.drawString(main_margin, y, title)
+            c.line(main_margin, y - 0.05 * inch, sidebar_width - main_margin, y - 0.05 * inch)
+            c.setFont("Helvetica", 9)
+        return (0.25 * inch, draw, True)
+
+    side_blocks = [sidebar_title("Contact")]
+    for text in (data["email"], data["phone"], data["address"]):
+        side_blocks.append(paragraph_block(text, main_margin, sidebar_width - 1 * inch, 12, "Helvetica", 9))
+    side_blocks += [gap(0.4 * inch), sidebar_title("Skills")]
     for skill in data["skills"]:
-        y_pos_side = wrap_text(c, f"• {skill}", main_margin, y_pos_side, sidebar_width - 1*inch, 12, "Helvetica", 9)
-        
+        side_blocks.append(paragraph_block(f"• {skill}", main_margin, sidebar_width - 1 * inch, 12, "Helvetica", 9))
+
     # --- Main Content ---
-    c.setFillColor(colors.black)
-    y_pos_main = height - 1 * inch
     main_x = sidebar_width + main_margin
     main_width = width - main_x - main_margin
 
-    # Summary
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(main_x, y_pos_main, data["summary_title"])
-    y_pos_main -= 0.25 * inch
-    y_pos_main = wrap_text(c, data["summary_text"], main_x, y_pos_main, main_width, 15, "Helvetica", 10)
-    y_pos_main -= 0.25 * inch
+    def main_title(title):
+        def draw(c, y):
+            c.setFont("Helvetica-Bold", 14)
+            c.drawString(main_x, y, title)
+        return (0.25 * inch, draw, True)
 
-    # Experience
+    main_blocks = [main_title(data["summary_title"]),
+                   paragraph_block(data["summary_text"], main_x, main_width, 15, "Helvetica", 10),
+                   gap(0.25 * inch)]
     if data["experience"]:
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(main_x, y_pos_main, "Work Experience")
-        y_pos_main -= 0.25 * inch
-        for job in data["experience"]:
-            c.setFont("Helvetica-Bold", 11)
-            c.drawString(main_x, y_pos_main, job["title"])
-            c.setFont("Helvetica-Oblique", 10)
-            c.drawRightString(width - main_margin, y_pos_main, job["dates"])
-            y_pos_main -= 0.2 * inch
-            c.setFont("Helvetica", 10)
-            c.drawString(main_x, y_pos_main, job["company"])
-            y_pos_main -= 0.25 * inch
-            for bullet in job["description"]:
-                y_pos_main = wrap_text(c, f"• {bullet}", main_x + 0.2*inch, y_pos_main, main_width - 0.4*inch, 14, "Helvetica", 10)
-            y_pos_main -= 0.1 * inch
-
-    # Education
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(main_x, y_pos_main, "Education")
-    y_pos_main -= 0.25 * inch
+        main_blocks.append(main_title("Work Experience"))
+        main_blocks += experience_blocks(data["experience"], main_x, width - main_margin, main_width - 0.4 * inch,
+                                         (("Helvetica-Bold", 11), ("Helvetica-Oblique", 10), ("Helvetica", 10)))
     edu = data["education"]
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(main_x, y_pos_main, edu["university"])
-    c.setFont("Helvetica-Oblique", 10)
-    c.drawRightString(width - main_margin, y_pos_main, f'Graduated: {edu["grad_year"]}')
-    y_pos_main -= 0.2 * inch
-    c.setFont("Helvetica", 10)
-    c.drawString(main_x, y_pos_main, edu["degree"])
+    main_blocks += [main_title("Education"),
+                    entry_block(edu["university"], f'Graduated: {edu["grad_year"]}', edu["degree"], main_x, width - main_margin,
+                                (("Helvetica-Bold", 11), ("Helvetica-Oblique", 10), ("Helvetica", 10)), 0.2 * inch)]
+
+    header_height = sum(block[0] for block in running_header)
+    side_pages = paginate(running_header + side_blocks, height - 1 * inch, height - 1 * inch - header_height)
+    main_pages = paginate(main_blocks, height - 1 * inch)
+    for number in range(max(len(side_pages), len(main_pages))):
+        if number:
+            c.showPage()
+        # Draw Sidebar
+        c.setFillColor(SIDEBAR_GRAY)
+        c.rect(0, 0, sidebar_width, height, stroke=0, fill=1)
+        c.setFillColor(colors.white)
+        if number:
+            draw_name(c, height - 1 * inch)
+        if number < len(side_pages):
+            draw_placed(c, side_pages[number])
+        c.setFillColor(colors.black)
+        if number < len(main_pages):
+            draw_placed(c, main_pages[number])
+
+# --- Record Generation ---
+def generate_resume_data(fake, max_jobs=MAX_JOBS, max_bullets=MAX_BULLETS, now=None):
+    """Draws one resume's record: contact details, experience, education and skills.
+
+    Job and graduation years count back from the year of `now` (default: the current time).
+    """
+    # A job per ~4 years, so careers get long enough for max_jobs
+    years_of_experience = random.randint(0, max(15, 4 * max_jobs))
+    industry = random.choice(list(INDUSTRY_DATA.keys()))
+    
+    name = fake.name()
+    if years_of_experience < 2:
+        summary_title, summary_text = "Objective", f"Highly motivated individual seeking an entry-level position in the {industry} industry."
+    else:
+        summary_title, summary_text = "Professional Summary", f"Experienced {get_job_title(industry, years_of_experience)} with {years_of_experience} years of experience in the {industry} sector."
+
+    experience = []
+    current_year = (now or datetime.now()).year
+    end_year = current_year
+    if years_of_experience > 0:
+        num_jobs = min(max_jobs, (years_of_experience + 2) // 4)
+        exp_left = years_of_experience
+        for j in range(num_jobs):
+            job_duration = random.randint(2, max(3, exp_left // (num_jobs-j if num_jobs-j > 0 else 1)))
+            start_year = end_year - job_duration
+            experience.append({
+                "title": get_job_title(industry, max(1, exp_left)),
+                "company": random.choice(INDUSTRY_DATA[industry]["company_names"]),
+                "dates": f"{start_year} - {end_year if j > 0 else 'Present'}",
+                "description": [fake.bs() + "." for _ in range(random.randint(2, max_bullets))]
+            })
+            end_year = start_year - 1
+            exp_left -= job_duration
+
+    education = {
+        "university": random.choice(UNIVERSITIES),
+        "degree": random.choice(DEGREES),
+        "grad_year": current_year - years_of_experience - random.randint(1, 2)
+    }
+    
+    num_skills = random.randint(5, 8)
+    skills = random.sample(INDUSTRY_DATA[industry]["skills"], min(num_skills, len(INDUSTRY_DATA[industry]["skills"])))
+
+    return {
+        "name": name, "address": fake.address().replace("\n", ", "), "phone": fake.phone_number(),
+        "email": f'{name.lower().replace(" ", ".")}@example.com', "summary_title": summary_title,
+        "summary_text": summary_text, "experience": experience, "education": education, "skills": skills,
+    }
+
+def build_resume_groundtruth(resume_data, template_choice):
+    """Ground truth for one drawn resume."""
+    return {
+        "template_used": template_choice,
+        "contact_info": {
+            "name": resume_data["name"],
+            "email": resume_data["email"],
+            "phone": resume_data["phone"],
+            "address": resume_data["address"]
+        },
+        "summary": resume_data["summary_text"],
+        "work_experience": resume_data["experience"],
+        "education": {
+            "institution": resume_data["education"]["university"],
+            "degree": resume_data["education"]["degree"],
+            "graduation_year": resume_data["education"]["grad_year"]
+        },
+        "skills": resume_data["skills"]
+    }
 
 # --- PDF Creation Wrapper ---
-def create_resume_pdf(resume_data, file_path, template_choice):
-    c = canvas.Canvas(file_path, pagesize=letter)
+def create_resume_pdf(resume_data, file_path, template_choice, boxes=WORD_BOXES):
+    c = open_canvas(file_path, letter, boxes=boxes)
     if template_choice == 'classic':
         create_classic_template(c, resume_data)
     elif template_choice == 'modern':
@@ -340,13 +456,41 @@ def create_resume_pdf(resume_data, file_path, template_choice):
         create_sidebar_template(c, resume_data)
     c.save()
 
+# --- INCREMENTAL REGENERATION ---
+RESUME_TEMPLATE_CODE = {'classic': create_classic_template, 'modern': create_modern_template, 'sidebar': create_sidebar_template}
+# Code every template draws through; editing any of it re-renders all resumes
+RESUME_RENDER_CODE = (paragraph_block, entry_block, gap, experience_blocks, paginate, draw_placed, create_resume_pdf,
+                      build_resume_groundtruth, pdf_raster, pdf_boxes, text_layout, output_layout,
+                      PAGE_TOP, PAGE_BOTTOM, MODERN_BLUE, SIDEBAR_GRAY)
+
+def resume_template_hash(name):
+    return source_hash(name, RESUME_TEMPLATE_CODE[name], *RESUME_RENDER_CODE)
+
 # --- MAIN GENERATION LOGIC ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate resumes with ground truth.")
+    parser.add_argument("--faker-pools", action="store_true", default=USE_FAKER_POOLS, help="draw Faker values from the pre-generated pool (faker_pools.py) instead of calling Faker per resume")
+    parser.add_argument("--max-jobs", type=int, default=MAX_JOBS, help="most jobs per resume; long careers flow onto further pages")
+    parser.add_argument("--max-bullets", type=int, default=MAX_BULLETS, help="most description bullets per job (at least 2)")
+    parser.add_argument("--boxes", action="store_true", default=WORD_BOXES, help="also write the word and field boxes of every page to <pdf name>_boxes.json")
+    parser.add_argument("--layout", choices=OUTPUT_LAYOUTS, default=OUTPUT_LAYOUT, help="flat output folder, or two levels of hash-prefixed subfolders for large runs")
+    parser.add_argument("--seed", type=int, default=SEED, help="random seed, so reruns draw the same resumes")
+    parser.add_argument("--incremental", action="store_true", help="keep the output folder and only re-render resumes whose inputs changed since the last run")
+    args = parser.parse_args()
+    if args.max_jobs < 1 or args.max_bullets < 2:
+        print("ERROR: --max-jobs must be at least 1 and --max-bullets at least 2.")
+        sys.exit(1)
+
     fake = Faker()
+    if args.faker_pools:
+        fake = PooledFaker(fake, ensure_pool(seed=args.seed))
+    if args.seed is not None:
+        random.seed(args.seed)
+        Faker.seed(args.seed)
 
     # --- START: FOLDER CLEANUP UTILITY ---
-    # If the output folder exists, remove it and all its contents
-    if os.path.exists(OUTPUT_FOLDER):
+    # If the output folder exists, remove it and all its contents (--incremental reuses it through manifest.json)
+    if os.path.exists(OUTPUT_FOLDER) and not args.incremental:
         print(f"Removing existing directory: {OUTPUT_FOLDER}")
         shutil.rmtree(OUTPUT_FOLDER)
     # --- END: FOLDER CLEANUP UTILITY ---
@@ -357,86 +501,58 @@ if __name__ == "__main__":
     # <--- ADDED: Initialize a dictionary to hold all ground truth data
     all_groundtruth_data = {}
 
+    previous_documents = load_manifest(OUTPUT_FOLDER) if args.incremental else {}
+    documents = {} # output file -> manifest entry for this run
+    now = reference_date(OUTPUT_FOLDER, args.incremental) # kept in the manifest, so reruns in a later year draw the same years
+    template_hashes = {name: resume_template_hash(name) for name in RESUME_TEMPLATES}
+    resources = resources_hash([], versions=(reportlab.Version,))
+
     print(f"Generating {NUMBER_OF_RESUMES} resumes with random templates...")
 
     for i in range(NUMBER_OF_RESUMES):
-        years_of_experience = random.randint(0, 15)
-        industry = random.choice(list(INDUSTRY_DATA.keys()))
-        
-        name = fake.name()
-        if years_of_experience < 2:
-            summary_title, summary_text = "Objective", f"Highly motivated individual seeking an entry-level position in the {industry} industry."
-        else:
-            summary_title, summary_text = "Professional Summary", f"Experienced {get_job_title(industry, years_of_experience)} with {years_of_experience} years of experience in the {industry} sector."
-
-        experience = []
-        current_year = datetime.now().year
-        end_year = current_year
-        if years_of_experience > 0:
-            num_jobs = min(3, (years_of_experience + 2) // 4)
-            exp_left = years_of_experience
-            for j in range(num_jobs):
-                job_duration = random.randint(2, max(3, exp_left // (num_jobs-j if num_jobs-j > 0 else 1)))
-                start_year = end_year - job_duration
-                experience.append({
-                    "title": get_job_title(industry, max(1, exp_left)),
-                    "company": random.choice(INDUSTRY_DATA[industry]["company_names"]),
-                    "dates": f"{start_year} - {end_year if j > 0 else 'Present'}",
-                    "description": [fake.bs() + "." for _ in range(random.randint(2, 4))]
-                })
-                end_year = start_year - 1
-                exp_left -= job_duration
-
-        education = {
-            "university": random.choice(UNIVERSITIES),
-            "degree": random.choice(DEGREES),
-            "grad_year": current_year - years_of_experience - random.randint(1, 2)
-        }
-        
-        num_skills = random.randint(5, 8)
-        skills = random.sample(INDUSTRY_DATA[industry]["skills"], min(num_skills, len(INDUSTRY_DATA[industry]["skills"])))
-
-        resume_data = {
-            "name": name, "address": fake.address().replace("\n", ", "), "phone": fake.phone_number(),
-            "email": f'{name.lower().replace(" ", ".")}@example.com', "summary_title": summary_title,
-            "summary_text": summary_text, "experience": experience, "education": education, "skills": skills,
-        }
-        
+        resume_data = generate_resume_data(fake, args.max_jobs, args.max_bullets, now)
         # Randomly choose a template
-        template_choice = random.choice(['classic', 'modern', 'sidebar'])
+        template_choice = random.choice(RESUME_TEMPLATES)
         
-        file_name = f"resume_{name.replace(' ', '_')}.pdf"
-        file_path = os.path.join(OUTPUT_FOLDER, file_name)
-        create_resume_pdf(resume_data, file_path, template_choice)
+        # Named by index: two resumes for the same name must not overwrite each other
+        file_name = f"{document_id('resume', i + 1)}.pdf"
+        relative_path = layout_path(file_name, args.layout)
+        document_hash = hash_json({"resume": resume_data, "template": template_hashes[template_choice],
+                                   "resources": resources, "boxes": args.boxes, "layout": args.layout})
+        if is_current(OUTPUT_FOLDER, previous_documents.get(file_name), document_hash):
+            documents[file_name] = previous_documents[file_name]
+            all_groundtruth_data.update(documents[file_name]["groundtruth"])
+            print(f"({i+1}/{NUMBER_OF_RESUMES}) Unchanged: {file_name}")
+            continue
+
+        create_resume_pdf(resume_data, output_path(OUTPUT_FOLDER, relative_path), template_choice, args.boxes)
         
         # <--- ADDED: Structure and store the ground truth data for this resume
-        groundtruth_entry = {
-            "template_used": template_choice,
-            "contact_info": {
-                "name": resume_data["name"],
-                "email": resume_data["email"],
-                "phone": resume_data["phone"],
-                "address": resume_data["address"]
-            },
-            "summary": resume_data["summary_text"],
-            "work_experience": resume_data["experience"],
-            "education": {
-                "institution": resume_data["education"]["university"],
-                "degree": resume_data["education"]["degree"],
-                "graduation_year": resume_data["education"]["grad_year"]
-            },
-            "skills": resume_data["skills"]
-        }
+        groundtruth_entry = build_resume_groundtruth(resume_data, template_choice)
+        box_names = [box_file_path(relative_path)] if args.boxes else []
+        if box_names:
+            groundtruth_entry["boxes"] = box_names[0]
         all_groundtruth_data[file_name] = groundtruth_entry
+        documents[file_name] = make_entry(document_hash, [relative_path] + box_names, {file_name: groundtruth_entry})
         # --- END ADDED SECTION ---
 
         print(f"({i+1}/{NUMBER_OF_RESUMES}) Created: {file_name} (Template: {template_choice})")
+
+    # Drop files of resumes this run no longer produces, then record what each file was built from
+    removed_files = remove_stale_files(OUTPUT_FOLDER, previous_documents, documents)
+    save_manifest(OUTPUT_FOLDER, documents, now)
     
     # <--- ADDED: Write the collected ground truth data to a single JSON file
     groundtruth_filepath = os.path.join(OUTPUT_FOLDER, "groundtruth.json")
     with open(groundtruth_filepath, "w") as f:
         json.dump(all_groundtruth_data, f, indent=4)
     # --- END ADDED SECTION ---
+    index_filepath = write_index(OUTPUT_FOLDER, [name for entry in documents.values() for name in entry["files"]])
 
     print(f"\nSuccessfully generated {NUMBER_OF_RESUMES} resumes in the '{OUTPUT_FOLDER}' folder.")
-    print(f"Ground truth data saved to '{groundtruth_filepath}'") # <--- ADDED: Confirmation message
\ No newline at end of file
+    print(f"Ground truth data saved to '{groundtruth_filepath}'") # <--- ADDED: Confirmation message
+    print(f"File index saved to '{index_filepath}'")
+    if args.incremental:
+        unchanged_files = sum(documents[name] is previous_documents.get(name) for name in documents)
+        print(f"Incremental: {len(documents) - unchanged_files} files rendered, {unchanged_files} unchanged, {removed_files} stale files removed")
+    print(f"Word width cache: {format_width_cache_stats()}")
\ No newline at end of file
@@ -2,14 +2,26 @@ import os
 import shutil
 import random
 import json
+import argparse
 from datetime import datetime, timedelta
 from faker import Faker
-from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+import PIL
+import reportlab
+import pdf_resources
+import pdf_raster
+import pdf_boxes
+import text_layout
+import output_layout
+from pdf_resources import draw_image, format_image_cache_stats, use_font_family, missing_font_files, format_font_cache_stats, FONT_FAMILIES
+from pdf_raster import open_canvas, raster_pages
+from pdf_boxes import box_file_path
+from text_layout import wrap_words, format_width_cache_stats
+from faker_pools import PooledFaker, ensure_pool
+from output_layout import layout_path, beside, output_path, write_index, OUTPUT_LAYOUTS
+from output_manifest import source_hash, resources_hash, hash_json, load_manifest, save_manifest, reference_date, is_current, make_entry, remove_stale_files
 # NOTE: You may need to install this library: pip install num2words
 from num2words import num2words
 
@@ -19,6 +31,11 @@ OUTPUT_FOLDER = "out/04_english_pos"
 RESOURCES_FOLDER = "./resources/"
 FONT_REGULAR = "Sarabun-Regular"
 FONT_BOLD = "Sarabun-Bold"
+RASTER_DPI = 0 # Overridden by --raster-dpi; N > 0 also draws every page to <pdf name>_p<page>.png at N dpi
+WORD_BOXES = False # Overridden by --boxes; also record word and field boxes of every page to <pdf name>_boxes.json
+OUTPUT_LAYOUT = "flat" # Overridden by --layout; "sharded" spreads the files over hash-prefixed subfolders (output_layout.py)
+SEED = None # Overridden by --seed; a fixed seed draws the same POs every run, dated from the manifest's reference day
+USE_FAKER_POOLS = False # Overridden by --faker-pools; draw vendor addresses and approver names from the shared pool
 
 # --- DATA POOLS ---
 # Using Faker for addresses to make them more realistic in English
@@ -89,15 +106,7 @@ def draw_wrapped_text(c, text, x, y, max_width, font_name, font_size):
     c.setFont(font_name, font_size)
     lines = []
     for line in text.split('\n'):
-        words = line.split()
-        current_line = ""
-        for word in words:
-            if c.stringWidth(current_line + " " + word, font_name, font_size) <= max_width:
-                current_line += " " + word if current_line else word
-            else:
-                lines.append(current_line)
-                current_line = word
-        lines.append(current_line)
+        lines.extend(wrap_words(line.split(), font_name, font_size, max_width, inclusive=True, measure_first=True))
     
     y_pos = y
     for line in lines:
@@ -108,7 +117,7 @@ def draw_wrapped_text(c, text, x, y, max_width, font_name, font_size):
 
 def draw_header_footer_template1(c, data):
     """Classic template with Garuda"""
-    c.drawImage(os.path.join(RESOURCES_FOLDER, "garuda.png"), 9.5 * cm, 26 * cm, width=3*cm, height=3*cm, preserveAspectRatio=True, mask='auto')
+    draw_image(c, os.path.join(RESOURCES_FOLDER, "garuda.png"), 9.5 * cm, 26 * cm, 3*cm, 3*cm)
     c.setFont(FONT_BOLD, 24)
     c.drawCentredString(10.5 * cm, 25 * cm, "Purchase Order")
     c.setFont(FONT_REGULAR, 12)
@@ -235,25 +244,133 @@ def create_template_3(c, data):
     y = draw_line_items_table(c, 18.5 * cm, data)
     draw_totals_and_signature(c, y, data)
 
+PO_TEMPLATES = {
+    'template1': create_template_1,
+    'template2': create_template_2,
+    'template3': create_template_3,
+}
+
+# --- RECORD GENERATION ---
+def generate_po_data(i, fake, now):
+    """Draws the record for PO number `i`, dated up to 30 days before `now`."""
+    po_date = now - timedelta(days=random.randint(0, 30))
+    delivery_date = po_date + timedelta(days=random.randint(60, 90))
+    
+    buyer = random.choice(GOV_AGENCIES)
+    vendor_profile = random.choice(SI_COMPANIES)
+    
+    vendor = {
+        "name": vendor_profile['name'],
+        "address": fake.address().replace('\n', ', '),
+        "tax_id": fake.unique.numerify(text='01055' + '#' * 8)
+    }
+    
+    items = []
+    for _ in range(random.randint(2, 5)):
+        item_type = random.choice(['hardware', 'software', 'service'])
+        item_profile = random.choice(IT_ITEMS[item_type])
+        quantity = random.randint(1, 5) if item_type == 'hardware' else 1
+        
+        item_data = {
+            "name": item_profile['name'],
+            "quantity": quantity,
+            "unit": "Unit(s)" if item_type == 'hardware' else "Set" if item_type == 'software' else "Service",
+            "unit_price": item_profile['price'],
+            "total": item_profile['price'] * quantity,
+            "type": item_type
+        }
+        items.append(item_data)
+    
+    subtotal = sum(item['total'] for item in items)
+    vat_amount = subtotal * 0.07
+    grand_total = subtotal + vat_amount
+    service_total = sum(item['total'] for item in items if item['type'] == 'service')
+    wht_amount = service_total * 0.03 if service_total > 0 else 0
+    net_payable = grand_total - wht_amount
+
+    # Assemble final data dictionary
+    return {
+        "po_number": f"PO-{po_date.year}-{i:04d}",
+        "po_date": po_date.isoformat(),
+        "po_date_str": get_english_date(po_date),
+        "delivery_date_str": get_english_date(delivery_date),
+        "project_number": fake.unique.numerify(text=f'PROJ-{po_date.year}-' + '#####'),
+        "project_name": random.choice(IT_PROJECTS),
+        "buyer": buyer,
+        "vendor": vendor,
+        "items": items,
+        "subtotal": subtotal,
+        "vat_amount": vat_amount,
+        "grand_total": grand_total,
+        "grand_total_en_str": num2words(grand_total, to='currency', lang='en_US').title(),
+        "service_total": service_total,
+        "wht_amount": wht_amount,
+        "net_payable": net_payable,
+        "approver_name": fake.name(),
+        "approver_title": "Chief Financial Officer"
+    }
+
+def create_po_pdf(po_data, file_path, template_choice, raster_dpi=RASTER_DPI, boxes=WORD_BOXES):
+    """Writes one PO PDF (and its box file with boxes=True) and returns the PNG page rasters drawn with it, if any."""
+    c = open_canvas(file_path, A4, raster_dpi, boxes)
+    use_font_family("Sarabun")
+    PO_TEMPLATES[template_choice](c, po_data)
+    c.save()
+    return raster_pages(c)
+
+# --- INCREMENTAL REGENERATION ---
+# Helpers only one template draws with; editing them re-renders only that template's POs
+PO_TEMPLATE_HELPERS = {'template1': (draw_header_footer_template1,)}
+# Code every template draws through; editing any of it re-renders all POs
+PO_RENDER_CODE = (get_english_date, draw_wrapped_text, create_po_pdf, draw_parties_template1, draw_line_items_table,
+                  draw_totals_and_signature, pdf_resources, pdf_raster, pdf_boxes, text_layout, output_layout, FONT_REGULAR, FONT_BOLD)
+
+def po_template_hash(name):
+    return source_hash(name, PO_TEMPLATES[name], *PO_TEMPLATE_HELPERS.get(name, ()), *PO_RENDER_CODE)
+
+def po_resources_hash():
+    font_paths = [os.path.join(RESOURCES_FOLDER, file_name) for file_name in FONT_FAMILIES["Sarabun"].values()]
+    return resources_hash([os.path.join(RESOURCES_FOLDER, "garuda.png")] + font_paths, versions=(reportlab.Version, PIL.__version__))
+
+def seed_data_pools(seed):
+    """Seeds random and Faker, and redraws the agency addresses Faker filled in at import."""
+    random.seed(seed)
+    Faker.seed(seed)
+    for agency in GOV_AGENCIES:
+        agency["address"] = fake_en.address().replace('\n', ', ')
+
 
 # --- MAIN SCRIPT ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate purchase order PDFs with ground truth.")
+    parser.add_argument("--raster-dpi", type=int, default=RASTER_DPI, help="also write a PNG of every page at this DPI")
+    parser.add_argument("--boxes", action="store_true", default=WORD_BOXES, help="also write the word and field boxes of every page to <pdf name>_boxes.json")
+    parser.add_argument("--layout", choices=OUTPUT_LAYOUTS, default=OUTPUT_LAYOUT, help="flat output folder, or two levels of hash-prefixed subfolders for large runs")
+    parser.add_argument("--seed", type=int, default=SEED, help="random seed, so reruns draw the same POs")
+    parser.add_argument("--incremental", action="store_true", help="keep the output folder and only re-render POs whose inputs changed since the last run")
+    parser.add_argument("--faker-pools", action="store_true", default=USE_FAKER_POOLS, help="draw Faker values from the pre-generated pool (faker_pools.py); with --seed, the pool seeded with it")
+    args = parser.parse_args()
+
     # 1. Setup and Pre-flight Checks
     fake = Faker("en_US")
+    if args.faker_pools:
+        fake = PooledFaker(fake, ensure_pool("en_US", seed=args.seed))
+    now = datetime.now()
+    if args.seed is not None:
+        seed_data_pools(args.seed)
+        # po_date keeps its time of day otherwise; the manifest keeps the day, so reruns on later days draw the same dates
+        now = reference_date(OUTPUT_FOLDER, args.incremental)
 
     # --- START: FOLDER CLEANUP UTILITY ---
-    # If the output folder exists, remove it and all its contents
-    if os.path.exists(OUTPUT_FOLDER):
+    # If the output folder exists, remove it and all its contents (--incremental reuses it through manifest.json)
+    if os.path.exists(OUTPUT_FOLDER) and not args.incremental:
         print(f"Removing existing directory: {OUTPUT_FOLDER}")
         shutil.rmtree(OUTPUT_FOLDER)
     # --- END: FOLDER CLEANUP UTILITY ---
 
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
     
-    try:
-        pdfmetrics.registerFont(TTFont(FONT_REGULAR, os.path.join(RESOURCES_FOLDER, 'Sarabun-Regular.ttf')))
-        pdfmetrics.registerFont(TTFont(FONT_BOLD, os.path.join(RESOURCES_FOLDER, 'Sarabun-Bold.ttf')))
-    except Exception:
+    if missing_font_files("Sarabun"):
         print("ERROR: Font files not found in 'resources' folder.")
         print("Please make sure 'Sarabun-Regular.ttf' and 'Sarabun-Bold.ttf' are present.")
         exit()
@@ -263,89 +380,56 @@ if __name__ == "__main__":
 
     all_groundtruth_data = {}
 
+    previous_documents = load_manifest(OUTPUT_FOLDER) if args.incremental else {}
+    documents = {} # output file -> manifest entry for this run
+    template_hashes = {name: po_template_hash(name) for name in PO_TEMPLATES}
+    resources = po_resources_hash()
+
     # 2. Main Generation Loop
     for i in range(1, NUMBER_OF_POS + 1):
-        # Generate raw data for a single PO
-        po_date = datetime.now() - timedelta(days=random.randint(0, 30))
-        delivery_date = po_date + timedelta(days=random.randint(60, 90))
-        
-        buyer = random.choice(GOV_AGENCIES)
-        vendor_profile = random.choice(SI_COMPANIES)
-        
-        vendor = {
-            "name": vendor_profile['name'],
-            "address": fake.address().replace('\n', ', '),
-            "tax_id": fake.unique.numerify(text='01055' + '#' * 8)
-        }
-        
-        items = []
-        for _ in range(random.randint(2, 5)):
-            item_type = random.choice(['hardware', 'software', 'service'])
-            item_profile = random.choice(IT_ITEMS[item_type])
-            quantity = random.randint(1, 5) if item_type == 'hardware' else 1
-            
-            item_data = {
-                "name": item_profile['name'],
-                "quantity": quantity,
-                "unit": "Unit(s)" if item_type == 'hardware' else "Set" if item_type == 'software' else "Service",
-                "unit_price": item_profile['price'],
-                "total": item_profile['price'] * quantity,
-                "type": item_type
-            }
-            items.append(item_data)
-        
-        subtotal = sum(item['total'] for item in items)
-        vat_amount = subtotal * 0.07
-        grand_total = subtotal + vat_amount
-        service_total = sum(item['total'] for item in items if item['type'] == 'service')
-        wht_amount = service_total * 0.03 if service_total > 0 else 0
-        net_payable = grand_total - wht_amount
-
-        # Assemble final data dictionary
-        po_data = {
-            "po_number": f"PO-{po_date.year}-{i:04d}",
-            "po_date": po_date.isoformat(),
-            "po_date_str": get_english_date(po_date),
-            "delivery_date_str": get_english_date(delivery_date),
-            "project_number": fake.unique.numerify(text=f'PROJ-{po_date.year}-' + '#####'),
-            "project_name": random.choice(IT_PROJECTS),
-            "buyer": buyer,
-            "vendor": vendor,
-            "items": items,
-            "subtotal": subtotal,
-            "vat_amount": vat_amount,
-            "grand_total": grand_total,
-            "grand_total_en_str": num2words(grand_total, to='currency', lang='en_US').title(),
-            "service_total": service_total,
-            "wht_amount": wht_amount,
-            "net_payable": net_payable,
-            "approver_name": fake.name(),
-            "approver_title": "Chief Financial Officer"
-        }
+        po_data = generate_po_data(i, fake, now)
 
         # Create PDF using a random template
         file_name = f"PO_{po_data['po_number']}.pdf"
-        file_path = os.path.join(OUTPUT_FOLDER, file_name)
-        c = canvas.Canvas(file_path, pagesize=A4)
-        
-        template_choice = random.choice(['template1', 'template2', 'template3'])
-        if template_choice == 'template1':
-            create_template_1(c, po_data)
-        elif template_choice == 'template2':
-            create_template_2(c, po_data)
-        else: # template3
-            create_template_3(c, po_data)
-        
-        c.save()
+        relative_path = layout_path(file_name, args.layout)
+        template_choice = random.choice(list(PO_TEMPLATES))
+        document_hash = hash_json({"po": po_data, "template": template_hashes[template_choice],
+                                   "resources": resources, "raster_dpi": args.raster_dpi, "boxes": args.boxes, "layout": args.layout})
+        if is_current(OUTPUT_FOLDER, previous_documents.get(file_name), document_hash):
+            documents[file_name] = previous_documents[file_name]
+            all_groundtruth_data.update(documents[file_name]["groundtruth"])
+            print(f"({i}/{NUMBER_OF_POS}) Unchanged {file_name}")
+            continue
+
+        rasters = create_po_pdf(po_data, output_path(OUTPUT_FOLDER, relative_path), template_choice, args.raster_dpi, args.boxes)
         
         # Save ground truth for this PO
         all_groundtruth_data[file_name] = po_data
+        raster_names = [beside(relative_path, os.path.basename(path)) for path in rasters]
+        if raster_names:
+            po_data["rasters"] = raster_names
+        box_names = [box_file_path(relative_path)] if args.boxes else []
+        if box_names:
+            po_data["boxes"] = box_names[0]
+        documents[file_name] = make_entry(document_hash, [relative_path] + raster_names + box_names, {file_name: po_data})
         print(f"({i}/{NUMBER_OF_POS}) Created {file_name} using {template_choice}")
 
+    # Drop files of POs this run no longer produces, then record what each file was built from
+    removed_files = remove_stale_files(OUTPUT_FOLDER, previous_documents, documents)
+    save_manifest(OUTPUT_FOLDER, documents, now)
+    index_filepath = write_index(OUTPUT_FOLDER, [name for entry in documents.values() for name in entry["files"]])
+
     # 3. Write Ground Truth File
     groundtruth_filepath = os.path.join(OUTPUT_FOLDER, "groundtruth.json")
     with open(groundtruth_filepath, "w", encoding='utf-8') as f:
         json.dump(all_groundtruth_data, f, indent=4, ensure_ascii=False)
 
     print(f"\nSuccessfully generated {NUMBER_OF_POS} POs in '{OUTPUT_FOLDER}'.")
-    print(f"Ground truth data saved to '{groundtruth_filepath}'.")
\ No newline at end of file
+    print(f"Ground truth data saved to '{groundtruth_filepath}'.")
+    print(f"File index saved to '{index_filepath}'.")
+    if args.incremental:
+        unchanged_files = sum(documents[name] is previous_documents.get(name) for name in documents)
+        print(f"Incremental: {len(documents) - unchanged_files} files rendered, {unchanged_files} unchanged, {removed_files} stale files removed")
+    print(f"Image cache: {format_image_cache_stats()}")
+    print(f"Font cache: {format_font_cache_stats()}")
+    print(f"Word width cache: {format_width_cache_stats()}")
\ No newline at end of file
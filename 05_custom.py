@@ -2,30 +2,32 @@ import os
 import shutil
 import random
 import json
+import argparse
 from datetime import datetime, timedelta
 from faker import Faker
-from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+import PIL
+import reportlab
+import pdf_resources
+import pdf_raster
+import pdf_boxes
+import text_layout
+import output_layout
+from pdf_resources import draw_image, format_image_cache_stats, use_font_family, missing_font_files, format_font_cache_stats, FONT_FAMILIES
+from pdf_raster import open_canvas
+from pdf_boxes import box_file_path
+from output_layout import document_id, layout_path, output_path, write_index, OUTPUT_LAYOUTS
+from output_manifest import source_hash, resources_hash, hash_json, load_manifest, save_manifest, reference_date, is_current, make_entry, remove_stale_files
 
 # --- CONFIGURATION ---
 NUMBER_OF_FORMS = 100
 OUTPUT_FOLDER = "out/05_customs_forms_en"
 RESOURCES_FOLDER = "./resources/"
-
-# Register Fonts
-try:
-    pdfmetrics.registerFont(TTFont('Kanit', os.path.join(RESOURCES_FOLDER, 'Kanit-Regular.ttf')))
-    pdfmetrics.registerFont(TTFont('Kanit-Bold', os.path.join(RESOURCES_FOLDER, 'Kanit-Bold.ttf')))
-    pdfmetrics.registerFont(TTFont('Kanit-Italic', os.path.join(RESOURCES_FOLDER, 'Kanit-Italic.ttf')))
-    pdfmetrics.registerFont(TTFont('Kanit-BoldItalic', os.path.join(RESOURCES_FOLDER, 'Kanit-BoldItalic.ttf')))
-except Exception as e:
-    print(f"ERROR: Could not register fonts. Make sure font files are in '{RESOURCES_FOLDER}'")
-    print(e)
-    exit()
+WORD_BOXES = False # Overridden by --boxes; also record word and field boxes of every page to <pdf name>_boxes.json
+OUTPUT_LAYOUT = "flat" # Overridden by --layout; "sharded" spreads the files over hash-prefixed subfolders (output_layout.py)
+SEED = None # Overridden by --seed; a fixed seed draws the same forms every run
 
 # --- DATA POOLS ---
 fake = Faker("en_US")
@@ -78,7 +80,7 @@ def draw_checkbox(c, x, y, size=0.4*cm, checked=False):
     c.restoreState()
 
 def draw_header(c, title, subtitle):
-    c.drawImage(os.path.join(RESOURCES_FOLDER, "garuda.png"), 9.75 * cm, 26.5 * cm, width=2.5*cm, height=2.5*cm, preserveAspectRatio=True, mask='auto')
+    draw_image(c, os.path.join(RESOURCES_FOLDER, "garuda.png"), 9.75 * cm, 26.5 * cm, 2.5*cm, 2.5*cm)
     c.setFont('Kanit-Bold', 16)
     c.drawCentredString(10.5 * cm, 26 * cm, "PASSENGER DECLARATION FORM")
     c.setFont('Kanit', 11)
@@ -162,7 +164,7 @@ def create_template_2(c, data):
     c.rect(0, 25*cm, 21*cm, 4.7*cm, stroke=0, fill=1)
     c.setFillColor(colors.white)
     
-    c.drawImage(os.path.join(RESOURCES_FOLDER, "garuda.png"), 2 * cm, 26.5 * cm, width=2*cm, height=2*cm, preserveAspectRatio=True, mask='auto')
+    draw_image(c, os.path.join(RESOURCES_FOLDER, "garuda.png"), 2 * cm, 26.5 * cm, 2*cm, 2*cm)
     c.setFont('Kanit-Bold', 18)
     c.drawString(4.5*cm, 27.5*cm, "Customs Declaration")
     c.setFont('Kanit', 14)
@@ -302,12 +304,89 @@ def create_template_3(c, data):
     c.drawString(14*cm, y-0.8*cm, "Signature")
     c.drawString(2*cm, y-2*cm, f"Date: {data['arrival_date_str']}")
 
+# --- RECORD GENERATION ---
+def generate_form_data(i, now=None):
+    """Draws the record for form number `i`: a person from the pool plus flight and declaration details.
+
+    Arrival dates count back from `now` (default: the current time).
+    """
+    # 1. Select a person from the pool
+    person = random.choice(PERSONS_POOL)
+    
+    # 2. Generate dynamic data for this form
+    arrival_date = (now or datetime.now()) - timedelta(days=random.randint(0, 30))
+    has_declaration = random.random() < 0.3 # 30% chance of having something to declare
+    
+    declared_items_list = []
+    if has_declaration:
+        num_items = random.randint(1,2)
+        items_to_declare = random.sample(DECLARED_GOODS, num_items)
+        for item in items_to_declare:
+            declared_items_list.append({
+                "item": item['item'],
+                "quantity": 1,
+                "value": random.randint(item['value_min'], item['value_max'])
+            })
+
+    return {
+        "form_id": i,
+        "person": person,
+        "passport_no": f"{random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}{random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}{random.randint(1000000, 9999999)}",
+        "dob_str": datetime.strptime(person['dob'], '%Y-%m-%d').strftime('%d %B %Y'),
+        "flight_no": f"{random.choice(AIRLINES)}{random.randint(100, 999)}",
+        "origin_city": random.choice(CITIES),
+        "arrival_date": arrival_date.isoformat(),
+        "arrival_date_str": get_english_date(arrival_date),
+        "family_members": random.randint(0, 3),
+        "declare_goods": has_declaration,
+        "declare_currency": random.random() < 0.05 if has_declaration else False,
+        "declared_items": declared_items_list
+    }
+
+FORM_TEMPLATES = {
+    'Classic': create_template_1,
+    'Modern': create_template_2,
+    'Compact': create_template_3,
+}
+
+def create_form_pdf(form_data, file_path, template_name, boxes=WORD_BOXES):
+    """Writes one customs form PDF with the named template (and its box file with boxes=True)."""
+    c = open_canvas(file_path, A4, boxes=boxes)
+    use_font_family("Kanit")
+    FORM_TEMPLATES[template_name](c, form_data)
+    c.save()
+
+# --- INCREMENTAL REGENERATION ---
+# Code every template draws through; editing any of it re-renders all forms
+FORM_RENDER_CODE = (get_english_date, draw_checkbox, draw_header, create_form_pdf,
+                    pdf_resources, pdf_raster, pdf_boxes, text_layout, output_layout)
+
+def form_template_hash(name):
+    return source_hash(name, FORM_TEMPLATES[name], *FORM_RENDER_CODE)
+
+def form_resources_hash():
+    font_paths = [os.path.join(RESOURCES_FOLDER, file_name) for file_name in FONT_FAMILIES["Kanit"].values()]
+    return resources_hash([os.path.join(RESOURCES_FOLDER, "garuda.png")] + font_paths, versions=(reportlab.Version, PIL.__version__))
+
 # --- MAIN SCRIPT ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate customs declaration forms with ground truth.")
+    parser.add_argument("--boxes", action="store_true", default=WORD_BOXES, help="also write the word and field boxes of every page to <pdf name>_boxes.json")
+    parser.add_argument("--layout", choices=OUTPUT_LAYOUTS, default=OUTPUT_LAYOUT, help="flat output folder, or two levels of hash-prefixed subfolders for large runs")
+    parser.add_argument("--seed", type=int, default=SEED, help="random seed, so reruns draw the same forms")
+    parser.add_argument("--incremental", action="store_true", help="keep the output folder and only re-render forms whose inputs changed since the last run")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    # Fonts are registered on first use; only check that the files are there
+    if missing_font_files("Kanit"):
+        print(f"ERROR: Could not register fonts. Make sure font files are in '{RESOURCES_FOLDER}'")
+        print(f"Missing: {', '.join(missing_font_files('Kanit'))}")
+        exit()
 
     # --- START: FOLDER CLEANUP UTILITY ---
-    # If the output folder exists, remove it and all its contents
-    if os.path.exists(OUTPUT_FOLDER):
+    # If the output folder exists, remove it and all its contents (--incremental reuses it through manifest.json)
+    if os.path.exists(OUTPUT_FOLDER) and not args.incremental:
         print(f"Removing existing directory: {OUTPUT_FOLDER}")
         shutil.rmtree(OUTPUT_FOLDER)
     # --- END: FOLDER CLEANUP UTILITY ---
@@ -315,63 +394,57 @@ if __name__ == "__main__":
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
     all_groundtruth_data = {}
 
+    previous_documents = load_manifest(OUTPUT_FOLDER) if args.incremental else {}
+    documents = {} # output file -> manifest entry for this run
+    # Seeded runs count back from the manifest's day, so reruns on later days draw the same dates;
+    # unseeded ones from the current time of day
+    now = reference_date(OUTPUT_FOLDER, args.incremental) if args.seed is not None else datetime.now()
+    template_hashes = {name: form_template_hash(name) for name in FORM_TEMPLATES}
+    resources = form_resources_hash()
+
     for i in range(1, NUMBER_OF_FORMS + 1):
-        # 1. Select a person from the pool
-        person = random.choice(PERSONS_POOL)
-        
-        # 2. Generate dynamic data for this form
-        arrival_date = datetime.now() - timedelta(days=random.randint(0, 30))
-        has_declaration = random.random() < 0.3 # 30% chance of having something to declare
-        
-        declared_items_list = []
-        if has_declaration:
-            num_items = random.randint(1,2)
-            items_to_declare = random.sample(DECLARED_GOODS, num_items)
-            for item in items_to_declare:
-                declared_items_list.append({
-                    "item": item['item'],
-                    "quantity": 1,
-                    "value": random.randint(item['value_min'], item['value_max'])
-                })
-
-        form_data = {
-            "form_id": i,
-            "person": person,
-            "passport_no": f"{random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}{random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}{random.randint(1000000, 9999999)}",
-            "dob_str": datetime.strptime(person['dob'], '%Y-%m-%d').strftime('%d %B %Y'),
-            "flight_no": f"{random.choice(AIRLINES)}{random.randint(100, 999)}",
-            "origin_city": random.choice(CITIES),
-            "arrival_date": arrival_date.isoformat(),
-            "arrival_date_str": get_english_date(arrival_date),
-            "family_members": random.randint(0, 3),
-            "declare_goods": has_declaration,
-            "declare_currency": random.random() < 0.05 if has_declaration else False,
-            "declared_items": declared_items_list
-        }
+        # 1-2. Draw the person and the form's dynamic data
+        form_data = generate_form_data(i, now)
 
         # 3. Create PDF using a random template
-        file_name = f"Customs_Form_EN_{form_data['passport_no']}.pdf"
-        file_path = os.path.join(OUTPUT_FOLDER, file_name)
-        c = canvas.Canvas(file_path, pagesize=A4)
-        
-        template_choice, template_name = random.choice([
-            (create_template_1, 'Classic'), 
-            (create_template_2, 'Modern'), 
-            (create_template_3, 'Compact')
-        ])
-        
-        template_choice(c, form_data)
-        c.save()
+        # Named by index, as passport numbers are drawn at random and may repeat
+        file_name = f"{document_id('Customs_Form_EN', i)}.pdf"
+        relative_path = layout_path(file_name, args.layout)
+        template_name = random.choice(list(FORM_TEMPLATES))
+        document_hash = hash_json({"form": form_data, "template": template_hashes[template_name],
+                                   "resources": resources, "boxes": args.boxes, "layout": args.layout})
+        if is_current(OUTPUT_FOLDER, previous_documents.get(file_name), document_hash):
+            documents[file_name] = previous_documents[file_name]
+            all_groundtruth_data.update(documents[file_name]["groundtruth"])
+            print(f"({i}/{NUMBER_OF_FORMS}) Unchanged {file_name}")
+            continue
+
+        create_form_pdf(form_data, output_path(OUTPUT_FOLDER, relative_path), template_name, args.boxes)
         
         # 4. Save ground truth
         form_data['template_used'] = template_name
+        box_names = [box_file_path(relative_path)] if args.boxes else []
+        if box_names:
+            form_data['boxes'] = box_names[0]
         all_groundtruth_data[file_name] = form_data
+        documents[file_name] = make_entry(document_hash, [relative_path] + box_names, {file_name: form_data})
         print(f"({i}/{NUMBER_OF_FORMS}) Created {file_name} using {template_name} template.")
 
+    # Drop files of forms this run no longer produces, then record what each file was built from
+    removed_files = remove_stale_files(OUTPUT_FOLDER, previous_documents, documents)
+    save_manifest(OUTPUT_FOLDER, documents, now)
+
     # 5. Write Ground Truth File
     groundtruth_filepath = os.path.join(OUTPUT_FOLDER, "groundtruth.json")
     with open(groundtruth_filepath, "w", encoding='utf-8') as f:
         json.dump(all_groundtruth_data, f, indent=4, ensure_ascii=False)
+    index_filepath = write_index(OUTPUT_FOLDER, [name for entry in documents.values() for name in entry["files"]])
 
     print(f"\nSuccessfully generated {NUMBER_OF_FORMS} forms in '{OUTPUT_FOLDER}'.")
-    print(f"Ground truth data saved to '{groundtruth_filepath}'.")
\ No newline at end of file
+    print(f"Ground truth data saved to '{groundtruth_filepath}'.")
+    print(f"File index saved to '{index_filepath}'.")
+    if args.incremental:
+        unchanged_files = sum(documents[name] is previous_documents.get(name) for name in documents)
+        print(f"Incremental: {len(documents) - unchanged_files} files rendered, {unchanged_files} unchanged, {removed_files} stale files removed")
+    print(f"Image cache: {format_image_cache_stats()}")
+    print(f"Font cache: {format_font_cache_stats()}")
\ No newline at end of file
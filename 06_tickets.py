@@ -2,13 +2,19 @@ import os
 import shutil
 import csv
 import random
+import argparse
 from datetime import datetime, timedelta
 from faker import Faker
+import output_layout
+from output_layout import layout_path, output_path, write_index, OUTPUT_LAYOUTS
+from output_manifest import source_hash, hash_json, load_manifest, save_manifest, reference_date, is_current, make_entry, remove_stale_files
 
 # --- CONFIGURATION ---
 NUMBER_OF_FILES = 100
 LINES_PER_FILE = 200
 OUTPUT_FOLDER = "out/06_tickets"
+OUTPUT_LAYOUT = "flat" # Overridden by --layout; "sharded" spreads the files over hash-prefixed subfolders (output_layout.py)
+SEED = None # Overridden by --seed; a fixed seed draws the same tickets every run
 
 # --- DATA FOR REALISM ---
 # Pre-define issue templates for more realistic tickets
@@ -54,22 +60,98 @@ ISSUE_TEMPLATES = {
 
 # Pre-generate a list of employees to make the data more consistent
 fake = Faker()
-EMPLOYEES = []
-for _ in range(150): # A pool of 150 employees
-    name = fake.name()
-    EMPLOYEES.append({
-        "name": name,
-        "email": f'{name.lower().replace(" ", ".")}@examplecorp.com',
-        "username": f'{name.split()[0][0].lower()}{name.split()[-1].lower()}'
-    })
+
+def draw_employees(count=150): # A pool of 150 employees
+    employees = []
+    for _ in range(count):
+        name = fake.name()
+        employees.append({
+            "name": name,
+            "email": f'{name.lower().replace(" ", ".")}@examplecorp.com',
+            "username": f'{name.split()[0][0].lower()}{name.split()[-1].lower()}'
+        })
+    return employees
+
+EMPLOYEES = draw_employees()
+
+def seed_data_pools(seed):
+    """Seeds random and Faker, and redraws the employees Faker filled in at import."""
+    random.seed(seed)
+    Faker.seed(seed)
+    EMPLOYEES[:] = draw_employees()
+
+
+# --- TICKET WRITER ---
+CSV_HEADER = ['ticket_id', 'timestamp', 'employee_name', 'employee_email', 'subject', 'description', 'urgency', 'status']
+
+def generate_ticket_row(ticket_id, now=None):
+    """Draws one ticket and returns it as a CSV row in CSV_HEADER order; timestamps count back from `now`."""
+    # 1. Select a random employee
+    employee = random.choice(EMPLOYEES)
+    
+    # 2. Select a random issue type and its templates
+    issue_category = random.choice(list(ISSUE_TEMPLATES.keys()))
+    subject_template = random.choice(ISSUE_TEMPLATES[issue_category]["subjects"])
+    desc_template = random.choice(ISSUE_TEMPLATES[issue_category]["descriptions"])
+    
+    # 3. Populate templates with specific details
+    description = desc_template.format(
+        employee_name=employee["name"],
+        employee_username=employee["username"],
+        asset_tag=f"LT-{random.randint(1000, 9999)}"
+    )
+
+    # 4. Generate other data points
+    timestamp = ((now or datetime.now()) - timedelta(days=random.randint(0, 365), hours=random.randint(0, 23))).isoformat() + "Z"
+    urgency = random.choices(['Low', 'Medium', 'High', 'Critical'], weights=[40, 40, 15, 5], k=1)[0]
+    status = random.choices(['Closed', 'Open', 'In Progress'], weights=[70, 20, 10], k=1)[0]
+    
+    return [
+        f"TIX-{ticket_id:06d}",
+        timestamp,
+        employee["name"],
+        employee["email"],
+        subject_template,
+        description,
+        urgency,
+        status
+    ]
+
+def write_ticket_rows(file_path, rows):
+    """Writes the header and `rows` (any iterable of ticket rows) to one CSV."""
+    with open(file_path, mode='w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        
+        # Write the header row
+        writer.writerow(CSV_HEADER)
+
+        for row in rows:
+            # 5. Write the ticket to the CSV file
+            writer.writerow(row)
+
+def write_ticket_file(file_path, first_ticket_id, lines=LINES_PER_FILE, now=None):
+    """Writes one CSV of `lines` tickets numbered from `first_ticket_id`; returns the next free ID."""
+    write_ticket_rows(file_path, (generate_ticket_row(ticket_id, now) for ticket_id in range(first_ticket_id, first_ticket_id + lines)))
+    return first_ticket_id + lines
+
+# --- INCREMENTAL REGENERATION ---
+# A file's hash covers its drawn rows, so only the writing is skipped for unchanged files
+TICKET_FILE_CODE = (write_ticket_rows, CSV_HEADER, output_layout)
 
 
 # --- MAIN SCRIPT ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate IT support ticket CSV files.")
+    parser.add_argument("--layout", choices=OUTPUT_LAYOUTS, default=OUTPUT_LAYOUT, help="flat output folder, or two levels of hash-prefixed subfolders for large runs")
+    parser.add_argument("--seed", type=int, default=SEED, help="random seed, so reruns draw the same tickets")
+    parser.add_argument("--incremental", action="store_true", help="keep the output folder and only rewrite files whose tickets changed since the last run")
+    args = parser.parse_args()
+    if args.seed is not None:
+        seed_data_pools(args.seed)
 
     # --- START: FOLDER CLEANUP UTILITY ---
-    # If the output folder exists, remove it and all its contents
-    if os.path.exists(OUTPUT_FOLDER):
+    # If the output folder exists, remove it and all its contents (--incremental reuses it through manifest.json)
+    if os.path.exists(OUTPUT_FOLDER) and not args.incremental:
         print(f"Removing existing directory: {OUTPUT_FOLDER}")
         shutil.rmtree(OUTPUT_FOLDER)
     # --- END: FOLDER CLEANUP UTILITY ---
@@ -79,54 +161,40 @@ if __name__ == "__main__":
 
     # Global ticket counter to ensure unique IDs across all files
     ticket_id_counter = 1
+
+    previous_documents = load_manifest(OUTPUT_FOLDER) if args.incremental else {}
+    documents = {} # output file -> manifest entry for this run
+    # Seeded runs count back from the manifest's day, so reruns on later days draw the same timestamps;
+    # unseeded ones from the current time of day
+    now = reference_date(OUTPUT_FOLDER, args.incremental) if args.seed is not None else datetime.now()
+    code = source_hash(*TICKET_FILE_CODE)
     
     print(f"Starting generation of {NUMBER_OF_FILES} files...")
 
     for i in range(1, NUMBER_OF_FILES + 1):
         file_name = f"it_support_tickets_{i:03d}.csv"
-        file_path = os.path.join(OUTPUT_FOLDER, file_name)
-
-        with open(file_path, mode='w', newline='', encoding='utf-8') as csv_file:
-            writer = csv.writer(csv_file)
-            
-            # Write the header row
-            writer.writerow(['ticket_id', 'timestamp', 'employee_name', 'employee_email', 'subject', 'description', 'urgency', 'status'])
-
-            for j in range(LINES_PER_FILE):
-                # 1. Select a random employee
-                employee = random.choice(EMPLOYEES)
-                
-                # 2. Select a random issue type and its templates
-                issue_category = random.choice(list(ISSUE_TEMPLATES.keys()))
-                subject_template = random.choice(ISSUE_TEMPLATES[issue_category]["subjects"])
-                desc_template = random.choice(ISSUE_TEMPLATES[issue_category]["descriptions"])
-                
-                # 3. Populate templates with specific details
-                description = desc_template.format(
-                    employee_name=employee["name"],
-                    employee_username=employee["username"],
-                    asset_tag=f"LT-{random.randint(1000, 9999)}"
-                )
-
-                # 4. Generate other data points
-                timestamp = (datetime.now() - timedelta(days=random.randint(0, 365), hours=random.randint(0, 23))).isoformat() + "Z"
-                urgency = random.choices(['Low', 'Medium', 'High', 'Critical'], weights=[40, 40, 15, 5], k=1)[0]
-                status = random.choices(['Closed', 'Open', 'In Progress'], weights=[70, 20, 10], k=1)[0]
-                
-                # 5. Write the ticket to the CSV file
-                writer.writerow([
-                    f"TIX-{ticket_id_counter:06d}",
-                    timestamp,
-                    employee["name"],
-                    employee["email"],
-                    subject_template,
-                    description,
-                    urgency,
-                    status
-                ])
-                
-                ticket_id_counter += 1
+        relative_path = layout_path(file_name, args.layout)
+
+        rows = [generate_ticket_row(ticket_id, now) for ticket_id in range(ticket_id_counter, ticket_id_counter + LINES_PER_FILE)]
+        ticket_id_counter += LINES_PER_FILE
+        document_hash = hash_json({"rows": rows, "code": code, "layout": args.layout})
+        if is_current(OUTPUT_FOLDER, previous_documents.get(file_name), document_hash):
+            documents[file_name] = previous_documents[file_name]
+            print(f"  ({i}/{NUMBER_OF_FILES}) Unchanged: {file_name}")
+            continue
+
+        write_ticket_rows(output_path(OUTPUT_FOLDER, relative_path), rows)
+        documents[file_name] = make_entry(document_hash, [relative_path], {})
         
         print(f"  ({i}/{NUMBER_OF_FILES}) Successfully created file: {file_name}")
 
-    print(f"\nGeneration complete. {NUMBER_OF_FILES} files with {LINES_PER_FILE} tickets each are in the '{OUTPUT_FOLDER}' folder.")
\ No newline at end of file
+    # Drop files this run no longer produces, then record what each file was built from
+    removed_files = remove_stale_files(OUTPUT_FOLDER, previous_documents, documents)
+    save_manifest(OUTPUT_FOLDER, documents, now)
+    index_filepath = write_index(OUTPUT_FOLDER, [name for entry in documents.values() for name in entry["files"]])
+
+    print(f"\nGeneration complete. {NUMBER_OF_FILES} files with {LINES_PER_FILE} tickets each are in the '{OUTPUT_FOLDER}' folder.")
+    print(f"File index saved to '{index_filepath}'")
+    if args.incremental:
+        unchanged_files = sum(documents[name] is previous_documents.get(name) for name in documents)
+        print(f"Incremental: {len(documents) - unchanged_files} files written, {unchanged_files} unchanged, {removed_files} stale files removed")
@@ -0,0 +1,263 @@
+"""Throughput benchmark for the six generators.
+
+Drives each script's generator functions in-process with a fixed seed:
+records are drawn up front, then every document is rendered into a scratch
+folder and timed on its own. Templates are used round-robin so each one
+gets the same number of samples, and one document per template is rendered
+untimed first, so font parsing and image decoding are not counted. Each
+generator runs in a fresh process, which makes the peak RSS its own.
+
+    python benchmark.py --output out/benchmark.json
+    python benchmark.py --baseline benchmarks/baseline.json
+
+With --baseline, every metric is compared against the stored run and the
+exit status is 1 if any got worse by more than --threshold.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import importlib.util
+from datetime import datetime
+from multiprocessing import get_context
+import numpy as np
+from faker import Faker
+from faker_pools import PooledFaker, ensure_pool
+try:
+    import resource
+except ImportError: # Windows has no getrusage; peak RSS is reported as null
+    resource = None
+
+# --- CONFIGURATION ---
+BENCHMARK_DOCS = 30 # Overridden by --docs; timed documents per generator, spread evenly over its templates
+BENCHMARK_SEED = 1234 # Overridden by --seed
+WARMUP_ROUNDS = 1 # Untimed documents per template before timing starts
+RESULTS_FILE = "out/benchmark.json" # Overridden by --output
+REGRESSION_THRESHOLD = 0.10 # Overridden by --threshold; relative change for the worse that fails the comparison
+SCRATCH_FOLDER = "out/.benchmark/"
+SCRIPT_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# --- GENERATOR ADAPTERS ---
+# Each setup function gets the loaded script, the seed and the Faker pool path
+# (None without --faker-pools) and returns its templates, the
+# file extension, record(i) for document i and render(record, path, template)
+# in the argument order of the scripts' own create_*_pdf functions.
+def passport_font_paths(module):
+    """The font files 01_passport_images' main block passes around."""
+    return {
+        'ocr_b': os.path.join(module.RESOURCES_FOLDER, "OCR-B.ttf"),
+        'arial_regular': os.path.join(module.RESOURCES_FOLDER, "arial.ttf"),
+        'arial_bold': os.path.join(module.RESOURCES_FOLDER, "arialbd.ttf")
+    }
+
+def make_faker(pool_path, *locale):
+    fake = Faker(*locale)
+    return PooledFaker(fake, pool_path) if pool_path else fake
+
+def setup_passports(module, seed, pool_path):
+    font_paths = passport_font_paths(module)
+    background_path = os.path.join(module.RESOURCES_FOLDER, module.BACKGROUND_IMAGE_FILE)
+    module.preload_fonts(font_paths)
+    fake = make_faker(pool_path)
+    encoder = module.make_encoder('png')
+
+    def render(data, path, template):
+        avatar = module.build_avatar(f"{data['passport_number']}-{data['surname']}")
+        module.create_passport_image(data, avatar, path, font_paths, background_path, encoder)
+    return {"templates": ["passport"], "extension": "png",
+            "record": lambda i: module.generate_passport_data(i, seed, fake), "render": render}
+
+def setup_invoices(module, seed, pool_path):
+    pick_customer = module.make_sampler(None, module.CUSTOMER_COMPANIES, ["name", "address"], [])
+    pick_product = module.make_sampler(None, module.PRODUCT_ITEMS, ["name"], ["price"])
+    return {"templates": list(module.INVOICE_TEMPLATES), "extension": "pdf",
+            "record": lambda i: module.generate_invoice_data(i + 1, pick_customer, pick_product),
+            "render": module.create_invoice_pdf}
+
+def setup_resumes(module, seed, pool_path):
+    fake = make_faker(pool_path)
+    return {"templates": module.RESUME_TEMPLATES, "extension": "pdf",
+            "record": lambda i: module.generate_resume_data(fake), "render": module.create_resume_pdf}
+
+def setup_pos(module, seed, pool_path):
+    fake = make_faker(pool_path, "en_US")
+    now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return {"templates": list(module.PO_TEMPLATES), "extension": "pdf",
+            "record": lambda i: module.generate_po_data(i + 1, fake, now), "render": module.create_po_pdf}
+
+def setup_customs(module, seed, pool_path):
+    return {"templates": list(module.FORM_TEMPLATES), "extension": "pdf",
+            "record": lambda i: module.generate_form_data(i + 1), "render": module.create_form_pdf}
+
+def setup_tickets(module, seed, pool_path):
+    # A document is one CSV file; its rows are drawn while it is written
+    return {"templates": ["csv"], "extension": "csv",
+            "record": lambda i: i * module.LINES_PER_FILE + 1,
+            "render": lambda first_ticket_id, path, template: module.write_ticket_file(path, first_ticket_id)}
+
+GENERATORS = {
+    "passports": ("01_passport_images.py", setup_passports),
+    "invoices": ("02_invoices.py", setup_invoices),
+    "resumes": ("03_resume.py", setup_resumes),
+    "pos": ("04_po.py", setup_pos),
+    "customs": ("05_custom.py", setup_customs),
+    "tickets": ("06_tickets.py", setup_tickets),
+}
+
+def load_script(file_name):
+    """Imports a generator script (their names are not valid module names) without running its main block."""
+    module_name = os.path.splitext(file_name)[0].lstrip("0123456789_")
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPT_FOLDER, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB elsewhere
+
+# --- MEASUREMENT ---
+def run_generator(name, docs, seed, pool_path=None):
+    """Benchmarks one generator; meant to run in a fresh process of its own."""
+    # Seed before the import, since some scripts draw Faker data pools at module level
+    random.seed(seed)
+    Faker.seed(seed)
+    file_name, setup = GENERATORS[name]
+    bench = setup(load_script(file_name), seed, pool_path)
+    templates = bench["templates"]
+    warmup = len(templates) * WARMUP_ROUNDS
+    jobs = [templates[i % len(templates)] for i in range(warmup + docs)]
+
+    start = time.perf_counter()
+    records = [bench["record"](i) for i in range(len(jobs))]
+    record_seconds = time.perf_counter() - start
+
+    folder = os.path.join(SCRATCH_FOLDER, name)
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    latencies = {template: [] for template in templates}
+    total_bytes = 0
+    for i, (record, template) in enumerate(zip(records, jobs)):
+        path = os.path.join(folder, f"{name}_{i:05d}.{bench['extension']}")
+        start = time.perf_counter()
+        bench["render"](record, path, template)
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            latencies[template].append(elapsed)
+            total_bytes += os.path.getsize(path)
+    shutil.rmtree(folder)
+
+    render_seconds = sum(sum(samples) for samples in latencies.values())
+    return {
+        "docs": docs,
+        "docs_per_sec": docs / render_seconds,
+        "record_ms_per_doc": record_seconds / len(jobs) * 1000,
+        "bytes_per_doc": total_bytes / docs,
+        "peak_rss_mb": peak_rss_mb(),
+        "templates": {template: {"docs": len(samples),
+                                 "p50_ms": float(np.percentile(samples, 50)) * 1000,
+                                 "p99_ms": float(np.percentile(samples, 99)) * 1000}
+                      for template, samples in latencies.items() if samples},
+    }
+
+def library_versions():
+    import PIL, reportlab
+    from importlib.metadata import version
+    return {"python": platform.python_version(), "numpy": np.__version__, "pillow": PIL.__version__,
+            "reportlab": reportlab.Version, "faker": version("faker")}
+
+def format_result(name, result):
+    rss = f"{result['peak_rss_mb']:.0f} MiB" if result['peak_rss_mb'] is not None else "n/a"
+    lines = [f"{name:<10}{result['docs_per_sec']:>10.1f} docs/s{result['bytes_per_doc'] / 1024:>10.1f} KiB/doc"
+             f"{result['record_ms_per_doc']:>9.2f} ms/record  peak RSS {rss}"]
+    for template, stats in result["templates"].items():
+        lines.append(f"  {template:<14}p50 {stats['p50_ms']:>8.2f} ms   p99 {stats['p99_ms']:>8.2f} ms   ({stats['docs']} docs)")
+    return "\n".join(lines)
+
+# --- BASELINE COMPARISON ---
+# Metric -> True when a higher value is better
+GENERATOR_METRICS = {"docs_per_sec": True, "bytes_per_doc": False, "peak_rss_mb": False}
+TEMPLATE_METRICS = {"p50_ms": False, "p99_ms": False}
+
+def compare_metric(label, current, baseline, higher_is_better, threshold):
+    """Returns (line, regressed) for one metric present in both runs."""
+    change = (current - baseline) / baseline if baseline else 0.0
+    worse = -change if higher_is_better else change
+    regressed = worse > threshold
+    flag = "REGRESSION" if regressed else "improved" if worse < -threshold else ""
+    return f"  {label:<36}{baseline:>12.2f}{current:>12.2f}{change:>+9.1%}  {flag}", regressed
+
+def compare_results(results, baseline, threshold):
+    """Compares every generator and template both runs measured; returns the number of regressions."""
+    print(f"\nCompared with baseline from {baseline['meta'].get('timestamp', '?')} (threshold {threshold:.0%})")
+    # Baselines from before --faker-pools existed ran without pools
+    for key, default in (("docs", None), ("seed", None), ("faker_pools", False)):
+        if baseline["meta"].get(key, default) != results["meta"][key]:
+            print(f"NOTE: baseline {key} is {baseline['meta'].get(key, default)}, this run used {results['meta'][key]}")
+    print(f"  {'metric':<36}{'baseline':>12}{'current':>12}{'change':>9}")
+    regressions = 0
+    for name, result in results["generators"].items():
+        old = baseline["generators"].get(name)
+        if old is None:
+            continue
+        checks = [(f"{name} {metric}", result[metric], old.get(metric), higher) for metric, higher in GENERATOR_METRICS.items()]
+        for template, stats in result["templates"].items():
+            old_stats = old["templates"].get(template, {})
+            checks += [(f"{name}/{template} {metric}", stats[metric], old_stats.get(metric), higher) for metric, higher in TEMPLATE_METRICS.items()]
+        for label, current, previous, higher in checks:
+            if current is None or previous is None:
+                continue
+            line, regressed = compare_metric(label, current, previous, higher, threshold)
+            regressions += regressed
+            print(line)
+    return regressions
+
+# --- MAIN SCRIPT ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the document generators and compare against a baseline.")
+    parser.add_argument("--docs", type=int, default=BENCHMARK_DOCS, help="timed documents per generator")
+    parser.add_argument("--seed", type=int, default=BENCHMARK_SEED, help="seed for random and Faker in every generator")
+    parser.add_argument("--only", nargs="+", choices=list(GENERATORS), default=list(GENERATORS), help="generators to run")
+    parser.add_argument("--output", default=RESULTS_FILE, help="where to write the results JSON")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="relative change for the worse that counts as a regression")
+    parser.add_argument("--faker-pools", action="store_true", help="draw Faker values from the faker_pools pool seeded with --seed")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f"ERROR: Baseline file not found: {args.baseline}")
+            sys.exit(1)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Drawn before the timed runs, which then only load it
+    pool_path = ensure_pool(seed=args.seed) if args.faker_pools else None
+    results = {
+        "meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "docs": args.docs, "seed": args.seed,
+                 "faker_pools": args.faker_pools,
+                 "warmup_rounds": WARMUP_ROUNDS, "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "versions": library_versions()},
+        "generators": {},
+    }
+    # A fresh process per generator, so imports and peak RSS of one do not leak into the next
+    context = get_context("spawn")
+    for name in args.only:
+        with context.Pool(1) as pool:
+            results["generators"][name] = pool.apply(run_generator, (name, args.docs, args.seed, pool_path))
+        print(format_result(name, results["generators"][name]))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"\nResults saved to '{args.output}'")
+
+    if baseline is not None and compare_results(results, baseline, args.threshold):
+        sys.exit(1)
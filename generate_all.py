@@ -0,0 +1,294 @@
+"""Regenerates all six datasets at once on one shared process pool.
+
+Every dataset's documents are split into index-range tasks sized to take
+about TASK_SECONDS each, and all tasks go on one queue that idle workers
+pull from, costliest first. A worker that finishes early just takes the
+next task, whatever dataset it belongs to, so the fast ticket files fill
+the gaps left by the PDF datasets and the run ends when the total work is
+done rather than when the slowest script is.
+
+Each document is seeded from (master seed, dataset, index), and dates
+count back from one reference time (midnight today) shared by all workers,
+so the output does not depend on the worker count or on which worker drew
+a task. Passports keep their own per-index seeding and match
+`01_passport_images.py --seed` for the same seed. Workers return ground
+truth entries; the parent merges them in index order and writes each
+dataset's groundtruth.json and file index (output_layout.py).
+
+    python generate_all.py --seed 42
+    python generate_all.py --only invoices pos --benchmark out/benchmark.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+from datetime import datetime
+from multiprocessing import Pool
+from faker import Faker
+from benchmark import load_script, passport_font_paths
+from pdf_resources import missing_font_files
+from faker_pools import PooledFaker, ensure_pool
+from output_layout import document_id, layout_path, output_path, write_index, OUTPUT_LAYOUTS
+
+# --- CONFIGURATION ---
+NUMBER_OF_WORKERS = 0 # Overridden by --workers; 0 uses every available core, as far as free memory allows
+TASK_SECONDS = 0.5 # Overridden by --task-seconds; target run time of one task, smaller balances better
+WORKER_MEMORY_MB = 150 # Memory budget per worker process (benchmark.py peaks at ~70 MiB per generator)
+OUTPUT_LAYOUT = "flat" # Overridden by --layout; "sharded" spreads every dataset's files over hash-prefixed subfolders
+
+# Estimated ms per document, used to size and order tasks; --benchmark replaces them with measured values
+DOCUMENT_COST_MS = {"passports": 105, "invoices": 50, "resumes": 4, "pos": 11, "customs": 14, "tickets": 5}
+
+# --- DATASETS ---
+# Each setup function gets the loaded script, the master seed, the run's
+# reference time and the Faker pool path (None without --faker-pools) and
+# returns per-process state. generate(module, state, i) writes document i and
+# returns (file name, ground truth entry), the entry None for datasets
+# without ground truth.
+def output_file(module, file_name):
+    """Where to write a dataset's file under the run's --layout."""
+    return output_path(module.OUTPUT_FOLDER, layout_path(file_name, _worker_state['layout']))
+
+def make_faker(pool_path, *locale):
+    fake = Faker(*locale)
+    return PooledFaker(fake, pool_path) if pool_path else fake
+
+def setup_passports(module, master_seed, now, pool_path):
+    font_paths = passport_font_paths(module)
+    module.preload_fonts(font_paths)
+    records = "pooled" if pool_path else "faker"
+    return {"record_source": module.make_record_source(records, master_seed, module.NUMBER_OF_IMAGES, pool_path),
+            "avatar_factory": module.make_avatar_factory(0), "font_paths": font_paths,
+            "background_path": os.path.join(module.RESOURCES_FOLDER, module.BACKGROUND_IMAGE_FILE),
+            "encoder": module.make_encoder("png")}
+
+def generate_passport(module, state, i):
+    return module.generate_passport(i, state["record_source"], state["avatar_factory"],
+                                    state["font_paths"], state["background_path"], state["encoder"], _worker_state['layout'])
+
+def setup_invoices(module, master_seed, now, pool_path):
+    return {"pick_customer": module.make_sampler(None, module.CUSTOMER_COMPANIES, ["name", "address"], []),
+            "pick_product": module.make_sampler(None, module.PRODUCT_ITEMS, ["name"], ["price"]), "now": now}
+
+def generate_invoice(module, state, i):
+    invoice_data = module.generate_invoice_data(i, state["pick_customer"], state["pick_product"], now=state["now"])
+    template_choice = random.choice(list(module.INVOICE_TEMPLATES))
+    module.create_invoice_pdf(invoice_data, output_file(module, invoice_data["filename"]), template_choice)
+    return invoice_data["filename"], module.build_groundtruth_record(invoice_data)
+
+def setup_resumes(module, master_seed, now, pool_path):
+    return {"fake": make_faker(pool_path), "now": now}
+
+def generate_resume(module, state, i):
+    resume_data = module.generate_resume_data(state["fake"], now=state["now"])
+    template_choice = random.choice(module.RESUME_TEMPLATES)
+    file_name = f"{document_id('resume', i)}.pdf"
+    module.create_resume_pdf(resume_data, output_file(module, file_name), template_choice)
+    return file_name, module.build_resume_groundtruth(resume_data, template_choice)
+
+def setup_pos(module, master_seed, now, pool_path):
+    return {"fake": make_faker(pool_path, "en_US"), "now": now}
+
+def generate_po(module, state, i):
+    po_data = module.generate_po_data(i, state["fake"], state["now"])
+    template_choice = random.choice(list(module.PO_TEMPLATES))
+    file_name = f"PO_{po_data['po_number']}.pdf"
+    module.create_po_pdf(po_data, output_file(module, file_name), template_choice)
+    return file_name, po_data
+
+def setup_customs(module, master_seed, now, pool_path):
+    return {"now": now}
+
+def generate_customs_form(module, state, i):
+    form_data = module.generate_form_data(i, state["now"])
+    template_name = random.choice(list(module.FORM_TEMPLATES))
+    file_name = f"{document_id('Customs_Form_EN', i)}.pdf"
+    module.create_form_pdf(form_data, output_file(module, file_name), template_name)
+    form_data['template_used'] = template_name
+    return file_name, form_data
+
+def setup_tickets(module, master_seed, now, pool_path):
+    return {"now": now}
+
+def generate_ticket_file(module, state, i):
+    # Ticket IDs run on across files exactly as in the sequential script
+    file_name = f"it_support_tickets_{i:03d}.csv"
+    module.write_ticket_file(output_file(module, file_name), (i - 1) * module.LINES_PER_FILE + 1, now=state["now"])
+    return file_name, None
+
+# name -> script, its document count constant, first index, setup, generate, font family to check,
+# and ensure_ascii for groundtruth.json (None: the dataset has no ground truth)
+DATASETS = {
+    "passports": ("01_passport_images.py", "NUMBER_OF_IMAGES", 0, setup_passports, generate_passport, None, True),
+    "invoices": ("02_invoices.py", "NUMBER_OF_INVOICES", 1, setup_invoices, generate_invoice, "Kanit", True),
+    "resumes": ("03_resume.py", "NUMBER_OF_RESUMES", 1, setup_resumes, generate_resume, None, True),
+    "pos": ("04_po.py", "NUMBER_OF_POS", 1, setup_pos, generate_po, "Sarabun", False),
+    "customs": ("05_custom.py", "NUMBER_OF_FORMS", 1, setup_customs, generate_customs_form, "Kanit", False),
+    "tickets": ("06_tickets.py", "NUMBER_OF_FILES", 1, setup_tickets, generate_ticket_file, None, None),
+}
+
+def document_seed(master_seed, dataset, index):
+    digest = hashlib.sha256(f"{master_seed}:{dataset}:{index}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+def load_dataset(name, master_seed):
+    """Imports a dataset's script seeded, so data pools drawn at import are the same in every process."""
+    random.seed(master_seed)
+    Faker.seed(master_seed)
+    return load_script(DATASETS[name][0])
+
+# --- WORKERS ---
+_worker_state = {} # per process: 'master_seed', 'now', 'pool_path', 'layout' and dataset name -> (module, state)
+
+def init_worker(master_seed, now, pool_path=None, layout=OUTPUT_LAYOUT):
+    _worker_state['master_seed'] = master_seed
+    _worker_state['now'] = now
+    _worker_state['pool_path'] = pool_path
+    _worker_state['layout'] = layout
+
+def get_dataset(name):
+    if name not in _worker_state:
+        module = load_dataset(name, _worker_state['master_seed'])
+        _worker_state[name] = (module, DATASETS[name][3](module, _worker_state['master_seed'], _worker_state['now'], _worker_state['pool_path']))
+    return _worker_state[name]
+
+def run_task(task):
+    """Writes documents [start, end) of one dataset; returns (name, start, end, entries, seconds)."""
+    name, start, end = task
+    began = time.perf_counter()
+    module, state = get_dataset(name)
+    generate = DATASETS[name][4]
+    entries = []
+    for i in range(start, end):
+        seed = document_seed(_worker_state['master_seed'], name, i)
+        random.seed(seed)
+        Faker.seed(seed)
+        entries.append(generate(module, state, i))
+    return name, start, end, entries, time.perf_counter() - began
+
+# --- SCHEDULING ---
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo, or None where there is no such file."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+def default_workers():
+    """One worker per usable core, fewer if free memory cannot hold them all."""
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    memory = available_memory_mb()
+    if memory is not None:
+        cores = min(cores, memory // WORKER_MEMORY_MB)
+    return max(1, cores)
+
+def load_costs(benchmark_path):
+    """Document costs in ms, measured ones from a benchmark.py results file taking precedence."""
+    costs = dict(DOCUMENT_COST_MS)
+    if benchmark_path:
+        with open(benchmark_path) as f:
+            for name, result in json.load(f)["generators"].items():
+                costs[name] = 1000 / result["docs_per_sec"]
+    return costs
+
+def build_tasks(counts, costs, task_seconds):
+    """Splits each dataset into index ranges of ~task_seconds, costliest work first."""
+    tasks = []
+    for name, (first, count) in counts.items():
+        size = max(1, round(task_seconds * 1000 / costs[name]))
+        for start in range(first, first + count, size):
+            end = min(start + size, first + count)
+            tasks.append(((name, start, end), (end - start) * costs[name]))
+    tasks.sort(key=lambda task: task[1], reverse=True)
+    return [task for task, _cost in tasks]
+
+def write_groundtruth(folder, shards, ensure_ascii):
+    """Merges the shards of one dataset in index order.
+
+    Every document is named from its index (output_layout.py), so no two
+    tasks write the same file or ground truth key and the merge never has
+    to pick between entries.
+    """
+    groundtruth = {}
+    for start in sorted(shards):
+        groundtruth.update(shards[start])
+    path = os.path.join(folder, "groundtruth.json")
+    with open(path, "w", encoding='utf-8') as f:
+        json.dump(groundtruth, f, indent=4, ensure_ascii=ensure_ascii)
+    return path, len(groundtruth)
+
+# --- MAIN SCRIPT ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate all datasets in parallel on one shared process pool.")
+    parser.add_argument("--workers", type=int, default=NUMBER_OF_WORKERS, help="worker processes (0 = available cores, limited by free memory)")
+    parser.add_argument("--seed", type=int, help="master seed for reproducible output")
+    parser.add_argument("--only", nargs="+", choices=list(DATASETS), default=list(DATASETS), help="datasets to generate")
+    parser.add_argument("--count", type=int, help="documents per dataset instead of each script's own count")
+    parser.add_argument("--task-seconds", type=float, default=TASK_SECONDS, help="target run time of one task")
+    parser.add_argument("--benchmark", help="benchmark.py results file to take per-document costs from")
+    parser.add_argument("--layout", choices=OUTPUT_LAYOUTS, default=OUTPUT_LAYOUT, help="flat output folders, or two levels of hash-prefixed subfolders for large runs")
+    parser.add_argument("--faker-pools", action="store_true", help="draw Faker values from the pre-generated pool (faker_pools.py); with --seed, the pool seeded with it")
+    args = parser.parse_args()
+
+    master_seed = args.seed if args.seed is not None else random.SystemRandom().randrange(2**32)
+    workers = args.workers or default_workers()
+    # Midnight, as 04_po.py uses with --seed, so reruns on the same day match
+    now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    # Drawn here, before the workers start, so they all read the same pool
+    pool_path = ensure_pool(seed=args.seed) if args.faker_pools else None
+
+    counts, folders = {}, {}
+    for name in args.only:
+        script, count_name, first, _setup, _generate, font_family, _ascii = DATASETS[name]
+        if font_family and missing_font_files(font_family):
+            print(f"ERROR: {name} needs the {font_family} font files in the 'resources' folder.")
+            print(f"Missing: {', '.join(missing_font_files(font_family))}")
+            sys.exit(1)
+        module = load_dataset(name, master_seed)
+        counts[name] = (first, args.count or getattr(module, count_name))
+        folders[name] = module.OUTPUT_FOLDER
+
+    # --- START: FOLDER CLEANUP UTILITY ---
+    for folder in folders.values():
+        if os.path.exists(folder):
+            print(f"Removing existing directory: {folder}")
+            shutil.rmtree(folder)
+        os.makedirs(folder)
+    # --- END: FOLDER CLEANUP UTILITY ---
+
+    tasks = build_tasks(counts, load_costs(args.benchmark), args.task_seconds)
+    total_docs = sum(count for _first, count in counts.values())
+    print(f"Using master seed {master_seed}: {total_docs} documents from {len(counts)} datasets in {len(tasks)} tasks on {workers} worker(s)")
+
+    shards = {name: {} for name in counts}
+    busy_seconds = {name: 0.0 for name in counts}
+    done = 0
+    started = time.perf_counter()
+    with Pool(workers, initializer=init_worker, initargs=(master_seed, now, pool_path, args.layout)) as pool:
+        for name, start, end, entries, seconds in pool.imap_unordered(run_task, tasks):
+            shards[name][start] = entries
+            busy_seconds[name] += seconds
+            done += end - start
+            print(f"({done}/{total_docs}) {name} from index {start} in {seconds:.2f}s")
+    wall_seconds = time.perf_counter() - started
+
+    print()
+    for name in counts:
+        write_index(folders[name], [layout_path(file_name, args.layout) for entries in shards[name].values() for file_name, _entry in entries])
+        if DATASETS[name][6] is None:
+            print(f"{name:<10} {counts[name][1]} files in '{folders[name]}' ({busy_seconds[name]:.1f}s of work)")
+            continue
+        path, entries = write_groundtruth(folders[name], shards[name], DATASETS[name][6])
+        print(f"{name:<10} {entries} ground truth entries in '{path}' ({busy_seconds[name]:.1f}s of work)")
+
+    work_seconds = sum(busy_seconds.values())
+    print(f"\nGenerated {total_docs} documents in {wall_seconds:.1f}s wall time; "
+          f"{work_seconds:.1f}s of work over {workers} worker(s) is {work_seconds / workers:.1f}s at full use")
@@ -0,0 +1,54 @@
+"""Document names and output folder layout shared by the generators (01-06).
+
+Documents are named from their index (resume_0000042.pdf), never from drawn
+values, so two documents cannot end up with the same file. With --layout
+sharded the files go two folders deep instead of into one flat folder:
+
+    out/03_resumes/3f/a1/resume_0000042.pdf
+
+where 3f/a1 are the first hex digits of the md5 of the file name, so any
+file's place follows from its name alone and a million files spread over
+65536 folders of about 15 each. Sidecars (rasters, boxes) stay next to their
+PDF. Every run also writes INDEX_FILE, the path of each file it produced
+relative to the output folder, one per line in name order; consumers read
+it (load_index) instead of listing the folders.
+"""
+import os
+import hashlib
+import posixpath
+
+OUTPUT_LAYOUTS = ("flat", "sharded")
+INDEX_FILE = "index.txt"
+ID_DIGITS = 7 # Indexes are zero-padded to this many digits, so names sort in index order up to 10 million documents
+
+def document_id(prefix, index):
+    return f"{prefix}_{index:0{ID_DIGITS}d}"
+
+def layout_path(file_name, layout):
+    """Where a file goes, relative to the output folder."""
+    if layout == "flat":
+        return file_name
+    digest = hashlib.md5(file_name.encode("utf-8")).hexdigest()
+    return posixpath.join(digest[:2], digest[2:4], file_name)
+
+def beside(relative_path, file_name):
+    """Relative path of a sidecar file written next to `relative_path`."""
+    return posixpath.join(posixpath.dirname(relative_path), file_name)
+
+def output_path(folder, relative_path):
+    """The path to write a file to, creating its shard folders first."""
+    path = os.path.join(folder, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def write_index(folder, relative_paths):
+    path = os.path.join(folder, INDEX_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.writelines(relative_path + "\n" for relative_path in sorted(relative_paths, key=posixpath.basename))
+    os.replace(path + ".tmp", path)
+    return path
+
+def load_index(folder):
+    """{file name: path relative to the folder} from the folder's index."""
+    with open(os.path.join(folder, INDEX_FILE), encoding="utf-8") as f:
+        return {posixpath.basename(line): line for line in f.read().splitlines()}
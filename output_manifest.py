@@ -0,0 +1,106 @@
+"""Content-hash manifest for incremental regeneration (02-06, with --incremental).
+
+Each output document gets an entry in <output folder>/manifest.json with the
+hash of everything that decides its bytes -- the record, the template's
+declaration and drawing code, and the resource files it embeds -- plus the
+files it produced and its ground truth. On an --incremental rerun a document
+whose hash and files are unchanged is left in place and its ground truth is
+taken from the manifest; only the rest is drawn again.
+
+The manifest also keeps the reference date the records were dated from, so a
+rerun on a later day draws the same dates, and with them the same hashes.
+
+Hashes only match across runs drawn with the same --seed. 06's documents are
+its CSV files, hashed over their drawn rows. 01 has no manifest: it
+continues an interrupted run from its journal with --resume instead.
+"""
+import os
+import json
+import inspect
+import hashlib
+from datetime import datetime
+from functools import lru_cache
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1 # Bump to invalidate every existing manifest
+
+def hash_json(value):
+    """sha256 of a JSON-serialisable value, independent of dict ordering."""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, default=repr).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def source_hash(*parts):
+    """Hashes functions, classes and modules by their source code and any other value by its repr."""
+    digest = hashlib.sha256()
+    for part in parts:
+        text = inspect.getsource(part) if inspect.isfunction(part) or inspect.isclass(part) or inspect.ismodule(part) else repr(part)
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def file_hash(path):
+    """Content hash of a resource file; missing files hash as such, so adding one later invalidates."""
+    if not os.path.exists(path):
+        return "missing"
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def resources_hash(paths, versions=()):
+    """One hash for the resource files a generator embeds and the library versions that draw them."""
+    return hash_json({"files": {path: file_hash(path) for path in paths}, "versions": list(versions)})
+
+def read_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+def load_manifest(folder):
+    """Returns {document name: entry} from the folder's manifest, or {} when there is none usable."""
+    return read_manifest(folder).get("documents", {})
+
+def reference_date(folder, incremental):
+    """Midnight of the day records are dated back from: the manifest's on an --incremental rerun, else today."""
+    if incremental:
+        try:
+            return datetime.strptime(read_manifest(folder)["reference_date"], "%Y-%m-%d")
+        except (KeyError, TypeError, ValueError):
+            pass
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+def save_manifest(folder, documents, reference_date):
+    path = os.path.join(folder, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({"version": MANIFEST_VERSION, "reference_date": reference_date.strftime("%Y-%m-%d"), "documents": documents},
+                  f, indent=1, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+def is_current(folder, entry, document_hash):
+    """True when the manifest entry was built from the same inputs and all its files are still there."""
+    return (entry is not None and entry["hash"] == document_hash
+            and all(os.path.exists(os.path.join(folder, name)) for name in entry["files"]))
+
+def make_entry(document_hash, files, groundtruth):
+    return {"hash": document_hash, "files": files, "groundtruth": groundtruth}
+
+def remove_stale_files(folder, old_documents, new_documents):
+    """Deletes files the previous run produced that no document of this run claims."""
+    keep = {name for entry in new_documents.values() for name in entry["files"]}
+    removed = 0
+    for entry in old_documents.values():
+        for name in entry["files"]:
+            path = os.path.join(folder, name)
+            if name not in keep and os.path.exists(path):
+                os.remove(path)
+                removed += 1
+                # Shard folders (output_layout.py) go with their last file
+                parent = os.path.dirname(path)
+                while os.path.normpath(parent) != os.path.normpath(folder) and not os.listdir(parent):
+                    os.rmdir(parent)
+                    parent = os.path.dirname(parent)
+    return removed
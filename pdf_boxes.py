@@ -0,0 +1,156 @@
+"""Word and field boxes recorded as a PDF is drawn (02_invoices, 03_resume, 04_po, 05_custom).
+
+open_canvas(..., boxes=True) tees the drawing calls to a BoxCanvas, which
+follows the font state and turns every drawString, drawRightString and
+drawCentredString into a field box (the whole string) and word boxes, from
+the same font metrics reportlab lays the text out with; nothing is
+rasterized or read back. Static template content drawn into a form XObject
+is recorded once and replayed on each doForm, as the PDF does. On save the
+boxes are written to <pdf name>_boxes.json, one set of columns per page:
+
+    {"page_size": [w, h], "pages": [{"fields": {"text": [...], "box": [...], "font": [...], "size": [...]},
+                                     "words": {"text": [...], "box": [...], "field": [...]}}, ...]}
+
+Boxes are [x0, y0, x1, y1] in points from the top left of the page, the
+way 01_passport_images gives its pixel boxes; a word's "field" is the index
+of its field on the page. A box spans the font's ascent to its descent and
+the advance widths of its glyphs. Columns rather than one object per word
+keep the file small and cheap to encode.
+"""
+import os
+import re
+import json
+from functools import lru_cache
+from reportlab.pdfbase import pdfmetrics
+from text_layout import text_units
+
+BOX_DECIMALS = 2 # Box coordinates are rounded to 1/100 pt, far below a pixel at any raster DPI
+WORD_PATTERN = re.compile(r"\S+")
+
+@lru_cache(maxsize=64)
+def font_extent(font_name):
+    """(ascent, descent) of a font in font units; descent is negative."""
+    return pdfmetrics.getAscentDescent(font_name, 1000)
+
+def box_file_path(pdf_path):
+    return os.path.splitext(pdf_path)[0] + "_boxes.json"
+
+class BoxCanvas:
+    """Box recorder for the subset of reportlab's Canvas the generators draw with."""
+
+    def __init__(self, pdf_path, pagesize):
+        self.path = box_file_path(pdf_path)
+        self.page_width, self.page_height = pagesize
+        self.pages = [] # finished pages, as {"fields": {column: [...]}, "words": {column: [...]}}
+        self._forms = {} # form name -> recorded (method, args)
+        self._recording = None
+        self._new_page()
+
+    def _new_page(self):
+        self.fields = {"text": [], "box": [], "font": [], "size": []}
+        self.words = {"text": [], "box": [], "field": []}
+        self._drawn = False
+        self._states = []
+        self.font = ('Helvetica', 12) # as on a fresh reportlab page
+
+    def _record(self, method, args):
+        if self._recording is None:
+            self._drawn = True
+            return False
+        self._recording.append((method, args))
+        return True
+
+    # --- Graphics state ---
+    def setFont(self, name, size, *args, **kwargs):
+        if not self._record('setFont', (name, size)):
+            self.font = (name, size)
+
+    def saveState(self):
+        if not self._record('saveState', ()):
+            self._states.append(self.font)
+
+    def restoreState(self):
+        if not self._record('restoreState', ()):
+            self.font = self._states.pop()
+
+    def _ignore(self, *args, **kwargs):
+        # Colours, lines, rectangles and images have no boxes, but still put something on the page
+        self._record('_ignore', ())
+
+    setFillColor = setStrokeColor = setLineWidth = rect = line = drawImage = _ignore
+
+    # --- Text ---
+    def _text(self, method, x, y, text):
+        if self._record(method, (x, y, text)):
+            return
+        text = str(text)
+        name, size = self.font
+        # Widths in font units from the cached word and space widths, summed the way reportlab measures the string
+        spans, units, end = [], 0, 0
+        for match in WORD_PATTERN.finditer(text):
+            units += text_units(name, text[end:match.start()])
+            word_units = text_units(name, match.group())
+            spans.append((match.group(), units, units + word_units))
+            units += word_units
+            end = match.end()
+        if not spans:
+            return
+        scale = size / 1000
+        units += text_units(name, text[end:])
+        if method == 'drawRightString':
+            x -= units * scale
+        elif method == 'drawCentredString':
+            x -= units * scale / 2
+
+        ascent, descent = font_extent(name)
+        top = round(self.page_height - y - ascent * scale, BOX_DECIMALS)
+        bottom = round(self.page_height - y - descent * scale, BOX_DECIMALS)
+        fields, words = self.fields, self.words
+        field = len(fields["text"])
+        fields["text"].append(text)
+        fields["box"].append([round(x, BOX_DECIMALS), top, round(x + units * scale, BOX_DECIMALS), bottom])
+        fields["font"].append(name)
+        fields["size"].append(size)
+        for word, left, right in spans:
+            words["text"].append(word)
+            words["box"].append([round(x + left * scale, BOX_DECIMALS), top, round(x + right * scale, BOX_DECIMALS), bottom])
+        words["field"] += [field] * len(spans)
+
+    def drawString(self, x, y, text, *args, **kwargs):
+        self._text('drawString', x, y, text)
+
+    def drawRightString(self, x, y, text, *args, **kwargs):
+        self._text('drawRightString', x, y, text)
+
+    def drawCentredString(self, x, y, text, *args, **kwargs):
+        self._text('drawCentredString', x, y, text)
+
+    # --- Forms: recorded once, replayed from a clean state like a PDF form XObject ---
+    def beginForm(self, name, *args, **kwargs):
+        self._recording = self._forms[name] = []
+
+    def endForm(self, *args, **kwargs):
+        self._recording = None
+
+    def doForm(self, name):
+        if self._record('doForm', (name,)):
+            return
+        saved = self.font
+        self.font = ('Helvetica', 12)
+        for method, args in self._forms[name]:
+            getattr(self, method)(*args)
+        self.font = saved
+
+    # --- Pages ---
+    def showPage(self):
+        self.pages.append({"fields": self.fields, "words": self.words})
+        self._new_page()
+
+    def save(self):
+        # reportlab only adds a trailing page if something was drawn on it (or there is none yet)
+        if self._drawn or not self.pages:
+            self.showPage()
+        # json.dumps runs on the C encoder; json.dump to a file streams through the pure Python one
+        with open(self.path, "w", encoding='utf-8') as f:
+            f.write(json.dumps({"page_size": [self.page_width, self.page_height], "pages": self.pages},
+                               ensure_ascii=False, separators=(",", ":")))
@@ -0,0 +1,231 @@
+"""Page rasters drawn alongside the PDF, for the ReportLab generators (02_invoices, 04_po).
+
+open_canvas() returns a plain ReportLab canvas, or, when a raster DPI is set,
+a TeeCanvas that sends every drawing call both to that canvas and to a
+RasterCanvas painting the same page with Pillow (and, with boxes=True, to
+a pdf_boxes.BoxCanvas recording the text boxes). Each finished page is
+written straight to <pdf name>_p<page>.png, so long documents never hold
+more than one page bitmap. Only the canvas calls the generators use are
+mirrored; everything else (stringWidth, getPageNumber, hasForm, ...) is
+answered by the PDF canvas, so text wraps identically in both outputs.
+"""
+import os
+import math
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
+from pdf_resources import FONT_FAMILIES, RESOURCES_FOLDER
+from pdf_boxes import BoxCanvas
+
+RASTER_PNG_COMPRESS_LEVEL = 1 # zlib level for the page PNGs; 1 is ~40% faster to write than Pillow's 6 for ~15% more bytes
+
+RASTER_FONT_FILES = {name: os.path.join(RESOURCES_FOLDER, file_name)
+                     for family in FONT_FAMILIES.values() for name, file_name in family.items()}
+
+# Anchor for Pillow's text(): x is the left, right or middle of the baseline
+TEXT_ANCHORS = {'drawString': 'ls', 'drawRightString': 'rs', 'drawCentredString': 'ms'}
+
+@lru_cache(maxsize=64)
+def get_raster_font(name, pixel_size):
+    path = RASTER_FONT_FILES.get(name)
+    if path is None:
+        return ImageFont.load_default(pixel_size) # the PDF's built-in Helvetica has no file to load
+    # reportlab does not shape text either, so plain glyph-by-glyph layout matches the PDF
+    return ImageFont.truetype(path, pixel_size, layout_engine=ImageFont.Layout.BASIC)
+
+@lru_cache(maxsize=16)
+def get_scaled_image(reader, size):
+    """The reader's image resized for one placement, kept across pages and documents."""
+    image = reader._image
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    return image.resize(size, Image.LANCZOS)
+
+def to_rgb(color):
+    return tuple(round(channel * 255) for channel in (color.red, color.green, color.blue))
+
+class RasterCanvas:
+    """Pillow stand-in for the subset of reportlab's Canvas the generators draw with."""
+
+    def __init__(self, pdf_path, pagesize, dpi):
+        self.base_path = os.path.splitext(pdf_path)[0]
+        self.scale = dpi / 72
+        self.page_width, self.page_height = pagesize
+        self.size = (math.ceil(self.page_width * self.scale), math.ceil(self.page_height * self.scale)) # as PDF rasterizers round
+        self.pages = [] # PNG paths written so far, one per page
+        self._forms = {} # form name -> recorded (method, args, kwargs)
+        self._recording = None
+        self._new_page()
+
+    def _new_page(self):
+        self.image = Image.new('RGB', self.size, 'white')
+        self.draw = ImageDraw.Draw(self.image)
+        self._drawn = False
+        self._states = []
+        self._reset_state()
+
+    def _reset_state(self):
+        # Same defaults as a fresh reportlab page
+        self.font = ('Helvetica', 12)
+        self.fill = (0, 0, 0)
+        self.stroke = (0, 0, 0)
+        self.line_width = 1
+
+    def _point(self, x, y):
+        return x * self.scale, (self.page_height - y) * self.scale
+
+    def _record(self, method, args, kwargs):
+        if self._recording is None:
+            self._drawn = True
+            return False
+        self._recording.append((method, args, kwargs))
+        return True
+
+    # --- Graphics state ---
+    def setFont(self, name, size, *args, **kwargs):
+        if not self._record('setFont', (name, size), {}):
+            self.font = (name, size)
+
+    def setFillColor(self, color, *args, **kwargs):
+        if not self._record('setFillColor', (color,), {}):
+            self.fill = to_rgb(color)
+
+    def setStrokeColor(self, color, *args, **kwargs):
+        if not self._record('setStrokeColor', (color,), {}):
+            self.stroke = to_rgb(color)
+
+    def setLineWidth(self, width):
+        if not self._record('setLineWidth', (width,), {}):
+            self.line_width = width
+
+    def saveState(self):
+        if not self._record('saveState', (), {}):
+            self._states.append((self.font, self.fill, self.stroke, self.line_width))
+
+    def restoreState(self):
+        if not self._record('restoreState', (), {}):
+            self.font, self.fill, self.stroke, self.line_width = self._states.pop()
+
+    # --- Drawing ---
+    def _text(self, method, x, y, text):
+        if self._record(method, (x, y, text), {}):
+            return
+        name, size = self.font
+        font = get_raster_font(name, max(1, round(size * self.scale)))
+        self.draw.text(self._point(x, y), str(text), font=font, fill=self.fill, anchor=TEXT_ANCHORS[method])
+
+    def drawString(self, x, y, text, *args, **kwargs):
+        self._text('drawString', x, y, text)
+
+    def drawRightString(self, x, y, text, *args, **kwargs):
+        self._text('drawRightString', x, y, text)
+
+    def drawCentredString(self, x, y, text, *args, **kwargs):
+        self._text('drawCentredString', x, y, text)
+
+    def rect(self, x, y, width, height, stroke=1, fill=0):
+        if self._record('rect', (x, y, width, height), {'stroke': stroke, 'fill': fill}):
+            return
+        left, top = self._point(x, y + height)
+        right, bottom = self._point(x + width, y)
+        self.draw.rectangle([min(left, right), min(top, bottom), max(left, right), max(top, bottom)],
+                            fill=self.fill if fill else None,
+                            outline=self.stroke if stroke else None,
+                            width=max(1, round(self.line_width * self.scale)))
+
+    def line(self, x1, y1, x2, y2):
+        if self._record('line', (x1, y1, x2, y2), {}):
+            return
+        self.draw.line([self._point(x1, y1), self._point(x2, y2)], fill=self.stroke,
+                       width=max(1, round(self.line_width * self.scale)))
+
+    def drawImage(self, image, x, y, width=None, height=None, mask=None, preserveAspectRatio=False, anchor='c', **kwargs):
+        if self._record('drawImage', (image, x, y), {'width': width, 'height': height, 'mask': mask,
+                                                     'preserveAspectRatio': preserveAspectRatio, 'anchor': anchor}):
+            return
+        if not isinstance(image, ImageReader):
+            image = ImageReader(image)
+        image_width, image_height = image.getSize()
+        width, height = width or image_width, height or image_height
+        if preserveAspectRatio:
+            # Centre the scaled image in the box, as reportlab's default anchor 'c' does
+            fit = min(width / image_width, height / image_height)
+            x, y = x + (width - image_width * fit) / 2, y + (height - image_height * fit) / 2
+            width, height = image_width * fit, image_height * fit
+        size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+        scaled = get_scaled_image(image, size)
+        left, top = self._point(x, y + height)
+        self.image.paste(scaled, (round(left), round(top)), scaled if scaled.mode == 'RGBA' else None)
+
+    # --- Forms: recorded once, replayed from a clean state like a PDF form XObject ---
+    def beginForm(self, name, *args, **kwargs):
+        self._recording = self._forms[name] = []
+
+    def endForm(self, *args, **kwargs):
+        self._recording = None
+
+    def doForm(self, name):
+        if self._record('doForm', (name,), {}):
+            return
+        saved = (self.font, self.fill, self.stroke, self.line_width)
+        self._reset_state()
+        for method, args, kwargs in self._forms[name]:
+            getattr(self, method)(*args, **kwargs)
+        self.font, self.fill, self.stroke, self.line_width = saved
+
+    # --- Pages ---
+    def showPage(self):
+        path = f"{self.base_path}_p{len(self.pages) + 1}.png"
+        self.image.save(path, compress_level=RASTER_PNG_COMPRESS_LEVEL)
+        self.pages.append(path)
+        self._new_page()
+
+    def save(self):
+        # reportlab only adds a trailing page if something was drawn on it (or there is none yet)
+        if self._drawn or not self.pages:
+            self.showPage()
+
+class TeeCanvas:
+    """Forwards drawing calls to a reportlab canvas and its mirrors (RasterCanvas, BoxCanvas); anything else goes to the PDF."""
+    MIRRORED = {'setFont', 'setFillColor', 'setStrokeColor', 'setLineWidth', 'saveState', 'restoreState', 'drawString',
+                'drawRightString', 'drawCentredString', 'rect', 'line', 'drawImage', 'beginForm', 'endForm', 'doForm',
+                'showPage', 'save'}
+
+    def __init__(self, pdf, *mirrors):
+        self.pdf = pdf
+        self.mirrors = mirrors
+
+    def __getattr__(self, name):
+        # Only called on a first use: methods are then cached on the instance, which saves a
+        # lookup and a closure on every later drawing call. Plain attributes (_doc, ...) are
+        # read from the PDF every time, so changes to them stay visible.
+        target = getattr(self.pdf, name)
+        if not callable(target):
+            return target
+        if name in TeeCanvas.MIRRORED:
+            mirrored = [getattr(mirror, name) for mirror in self.mirrors]
+            def method(*args, **kwargs):
+                for mirror in mirrored:
+                    mirror(*args, **kwargs)
+                return target(*args, **kwargs)
+        else:
+            method = target
+        setattr(self, name, method)
+        return method
+
+def open_canvas(file_path, pagesize, raster_dpi=0, boxes=False):
+    """A reportlab canvas for `file_path`, teed to PNG page rasters when raster_dpi > 0 and to text boxes with boxes=True."""
+    pdf = canvas.Canvas(file_path, pagesize=pagesize)
+    mirrors = []
+    if raster_dpi:
+        mirrors.append(RasterCanvas(file_path, pagesize, raster_dpi))
+    if boxes:
+        mirrors.append(BoxCanvas(file_path, pagesize))
+    return TeeCanvas(pdf, *mirrors) if mirrors else pdf
+
+def raster_pages(c):
+    """PNG paths written for the canvas so far ([] without rasters)."""
+    if not isinstance(c, TeeCanvas):
+        return []
+    return next((mirror.pages for mirror in c.mirrors if isinstance(mirror, RasterCanvas)), [])
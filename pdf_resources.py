@@ -0,0 +1,259 @@
+"""Resources shared by the ReportLab generators (02_invoices, 04_po, 05_custom).
+
+Passing a file path to canvas.drawImage makes ReportLab open, decode, hash and
+re-encode the image for every new PDF, which for the 1024x1024 company logo
+costs more than everything else in an invoice put together. draw_image() keeps
+each image decoded in an ImageReader (alpha mask included) and its encoded PDF
+image stream built once per process; a new document only gets a copy of the
+stream registered, and every later draw is a reference to it. Sharing the
+stream goes through private ReportLab API (_digester, ImageReader._dataA,
+the document's idToObject and Canvas._setXObjects), written against the
+reportlab version pinned in environment.yml; where any of it is missing,
+draw_image falls back to a plain drawImage.
+
+Fonts are registered per family on first use by use_font_family(). The parsed
+TrueType metrics are saved as plain JSON to FONT_CACHE_FOLDER under the hash
+of the font file and the reportlab version, so later processes rebuild the
+fonts without parsing the TTF tables again. Loading the cache only reads
+data, never code. A cache entry whose attributes do not match what this
+reportlab's TTFont has is ignored, and the font is parsed in full.
+"""
+import os
+import copy
+import json
+import base64
+import hashlib
+from array import array
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+from fnmatch import fnmatch
+import reportlab
+from reportlab import rl_config
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace, TTEncoding, TTFNameBytes
+try:
+    from reportlab.pdfgen.canvas import _digester
+except ImportError: # private API; draw_image falls back to drawImage without it
+    _digester = None
+
+# --- IMAGE CACHE ---
+IMAGE_CACHE_SIZE = 8 # Images kept decoded per process, least recently used evicted first
+
+_IMAGE_CACHE = OrderedDict() # path -> {'reader', 'name', 'xobject', 'smask'}
+IMAGE_CACHE_STATS = {'hits': 0, 'misses': 0, 'evictions': 0, 'documents': 0}
+
+def load_image(path):
+    """Decodes an image and builds its PDF image stream, as drawImage(mask='auto') would."""
+    reader = ImageReader(path)
+    raw = reader.getRGBData() # also splits an alpha channel off into reader._dataA
+    alpha = getattr(reader, '_dataA', None)
+    name = _digester(raw + (alpha.getRGBData() if alpha else b'auto'))
+    xobject = pdfdoc.PDFImageXObject(name, reader, mask='auto')
+    xobject.name = name
+    return {'reader': reader, 'name': name, 'xobject': xobject, 'smask': xobject.__dict__.pop('_smask', None)}
+
+def get_image(path):
+    """Returns the cached entry for `path`, loading it on first use."""
+    entry = _IMAGE_CACHE.get(path)
+    if entry is not None:
+        IMAGE_CACHE_STATS['hits'] += 1
+        _IMAGE_CACHE.move_to_end(path)
+        return entry
+    IMAGE_CACHE_STATS['misses'] += 1
+    entry = _IMAGE_CACHE[path] = load_image(path)
+    if len(_IMAGE_CACHE) > IMAGE_CACHE_SIZE:
+        _IMAGE_CACHE.popitem(last=False)
+        IMAGE_CACHE_STATS['evictions'] += 1
+    return entry
+
+def get_image_reader(path):
+    """Returns the shared ImageReader for `path`."""
+    return get_image(path)['reader']
+
+def shares_image_streams(c):
+    """True when this ReportLab has the private hooks register_image relies on."""
+    return _digester is not None and hasattr(c, '_setXObjects') and hasattr(getattr(c, '_doc', None), 'idToObject')
+
+def register_image(c, entry):
+    """Adds the cached image stream to the canvas's document unless it is already there.
+
+    Mirrors the first-use branch of canvas.drawImage, but with a copy of the
+    pre-encoded XObject instead of encoding the image again.
+    """
+    doc = c._doc
+    reg_name = doc.getXObjectName(entry['name'])
+    if reg_name in doc.idToObject:
+        return
+    IMAGE_CACHE_STATS['documents'] += 1
+    xobject = copy.copy(entry['xobject'])
+    c._setXObjects(xobject)
+    doc.Reference(xobject, reg_name)
+    doc.addForm(entry['name'], xobject)
+    smask = entry['smask']
+    if smask is not None:
+        mask_name = doc.getXObjectName(smask.name)
+        if mask_name not in doc.idToObject:
+            smask = copy.copy(smask)
+            c._setXObjects(smask)
+        xobject.smask = doc.Reference(smask, mask_name)
+
+def draw_image(c, path, x, y, width, height):
+    """Drop-in for c.drawImage(path, ..., preserveAspectRatio=True, mask='auto')."""
+    if not shares_image_streams(c):
+        return c.drawImage(path, x, y, width=width, height=height, preserveAspectRatio=True, mask='auto')
+    entry = get_image(path)
+    register_image(c, entry)
+    return c.drawImage(entry['reader'], x, y, width=width, height=height, preserveAspectRatio=True, mask='auto')
+
+def format_image_cache_stats(stats=IMAGE_CACHE_STATS):
+    return (f"{stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+            f"streams shared into {stats['documents']} documents")
+
+# --- FONT REGISTRY ---
+RESOURCES_FOLDER = "./resources/"
+FONT_CACHE_FOLDER = "./out/.font_cache/" # Parsed TTF metrics, one JSON file per font file hash
+
+# Family -> registered font name -> TTF file in RESOURCES_FOLDER
+FONT_FAMILIES = {
+    "Kanit": {"Kanit": "Kanit-Regular.ttf", "Kanit-Bold": "Kanit-Bold.ttf", "Kanit-Italic": "Kanit-Italic.ttf", "Kanit-BoldItalic": "Kanit-BoldItalic.ttf"},
+    "Sarabun": {"Sarabun-Regular": "Sarabun-Regular.ttf", "Sarabun-Bold": "Sarabun-Bold.ttf"},
+}
+# Bold/italic mapping for families that have all four styles, as registerFontFamily expects
+FONT_FAMILY_STYLES = {
+    "Kanit": {"normal": "Kanit", "bold": "Kanit-Bold", "italic": "Kanit-Italic", "boldItalic": "Kanit-BoldItalic"},
+}
+
+_REGISTERED_FAMILIES = set()
+FONT_CACHE_STATS = {'parsed': 0, 'cached': 0}
+
+def missing_font_files(family):
+    """Lists the files of `family` that are not in RESOURCES_FOLDER."""
+    return [file_name for file_name in FONT_FAMILIES[family].values()
+            if not os.path.exists(os.path.join(RESOURCES_FOLDER, file_name))]
+
+def font_cache_path(data):
+    # The cached attributes are ReportLab's own, so its version is part of the key
+    key = hashlib.sha256(data + reportlab.Version.encode()).hexdigest()
+    return os.path.join(FONT_CACHE_FOLDER, f"{key}.json")
+
+def encode_metric(value):
+    """Plain JSON for a face attribute; bytes, tuples and dicts are tagged so they come back as they were.
+
+    The per-glyph tables (hundreds of ints each) go in as base64 int64 arrays,
+    which load far faster than JSON numbers.
+    """
+    if isinstance(value, TTFNameBytes):
+        return {"name": value.ustr}
+    if isinstance(value, bytes):
+        return {"bytes": value.decode('latin-1')}
+    if isinstance(value, tuple):
+        return {"tuple": [encode_metric(item) for item in value]}
+    if isinstance(value, list):
+        if len(value) > 16 and all(type(item) is int for item in value):
+            return {"ints": base64.b64encode(array('q', value).tobytes()).decode('ascii')}
+        if value and all(isinstance(item, tuple) for item in value):
+            # hmetrics: (advance, left side bearing) per glyph, stored as columns
+            return {"tuples": [encode_metric(list(column)) for column in zip(*value)]}
+        if value and all(isinstance(item, list) for item in value):
+            # glyphToChar's values: short lists, stored flat with their lengths
+            return {"lists": [encode_metric([part for item in value for part in item]), encode_metric([len(item) for item in value])]}
+        return [encode_metric(item) for item in value]
+    if isinstance(value, dict):
+        # Keys and values as two lists: most face dicts map ints to ints, which JSON keys cannot hold
+        return {"dict": [encode_metric(list(value)), encode_metric(list(value.values()))]}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError(f"no plain form for {type(value).__name__}")
+
+def decode_metric(value):
+    if isinstance(value, list):
+        return [decode_metric(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    (tag, content), = value.items()
+    if tag == "ints":
+        return array('q', base64.b64decode(content)).tolist()
+    if tag == "name":
+        return TTFNameBytes(content.encode('utf-8'))
+    if tag == "bytes":
+        return content.encode('latin-1')
+    if tag == "tuple":
+        return tuple(decode_metric(item) for item in content)
+    if tag == "tuples":
+        return list(zip(*(decode_metric(column) for column in content)))
+    if tag == "lists":
+        flat, lengths = decode_metric(content[0]), decode_metric(content[1])
+        parts, start = [], 0
+        for length in lengths:
+            parts.append(flat[start:start + length])
+            start += length
+        return parts
+    if tag == "dict":
+        keys, values = content
+        return dict(zip(decode_metric(keys), decode_metric(values)))
+    raise ValueError(f"unknown tag {tag!r}")
+
+def parse_ttfont(name, path, cache_path):
+    """Builds a TTFont the normal way and saves its metrics for the next process."""
+    FONT_CACHE_STATS['parsed'] += 1
+    font = TTFont(name, path)
+    # The raw file comes back from disk and the scale lambda from unitsPerEm
+    metrics = {key: encode_metric(value) for key, value in vars(font.face).items() if key not in ('_ttf_data', '_pdfScale')}
+    os.makedirs(FONT_CACHE_FOLDER, exist_ok=True)
+    # Pool workers parse the same fonts at once, so each writes its own temp file
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"face": metrics, "face_attributes": sorted(vars(font.face)), "font_attributes": sorted(vars(font))},
+                           separators=(",", ":")))
+    os.replace(tmp_path, cache_path)
+    return font
+
+def cached_ttfont(name, data, cached):
+    """Rebuilds a TTFont from cached metrics, or returns None if they do not fit this reportlab."""
+    face = TTFontFace.__new__(TTFontFace)
+    pdfmetrics.TypeFace.__init__(face, None)
+    face.__dict__.update({key: decode_metric(value) for key, value in cached["face"].items()})
+    face._ttf_data = data
+    scale = 1000 / face.unitsPerEm
+    face._pdfScale = (lambda x: x) if face.unitsPerEm == 1000 else (lambda x: x * scale)
+    # What TTFont.__init__ sets around the parsed face; checked against a parsed font's attributes below
+    font = TTFont.__new__(TTFont)
+    font.fontName = name
+    font.face = face
+    font.encoding = TTEncoding()
+    font.state = WeakKeyDictionary()
+    font._asciiReadable = rl_config.ttfAsciiReadable
+    font.shapable = not any(fnmatch(name, pattern) for pattern in rl_config.unShapedFontGlob)
+    if sorted(vars(face)) != cached["face_attributes"] or sorted(vars(font)) != cached["font_attributes"]:
+        return None
+    return font
+
+def load_ttfont(name, path):
+    """Builds a TTFont, from the metrics cache when this font file was parsed before."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    cache_path = font_cache_path(data)
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            font = cached_ttfont(name, data, json.load(f))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError, ZeroDivisionError):
+        font = None
+    if font is None:
+        return parse_ttfont(name, path, cache_path)
+    font.face.filename = path
+    FONT_CACHE_STATS['cached'] += 1
+    return font
+
+def use_font_family(family):
+    """Registers every font of `family` with ReportLab the first time it is asked for."""
+    if family in _REGISTERED_FAMILIES:
+        return
+    for name, file_name in FONT_FAMILIES[family].items():
+        pdfmetrics.registerFont(load_ttfont(name, os.path.join(RESOURCES_FOLDER, file_name)))
+    if family in FONT_FAMILY_STYLES:
+        pdfmetrics.registerFontFamily(family, **FONT_FAMILY_STYLES[family])
+    _REGISTERED_FAMILIES.add(family)
+
+def format_font_cache_stats(stats=FONT_CACHE_STATS):
+    return f"{stats['cached']} fonts from the metrics cache, {stats['parsed']} parsed"
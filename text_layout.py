@@ -0,0 +1,57 @@
+"""Greedy word wrapping with cached word widths (03_resume, 04_po).
+
+The wrappers used to call stringWidth on the whole candidate line for every
+word, re-measuring the line so far each time, which is quadratic in its
+length. ReportLab's width of a string is the sum of its glyph widths scaled
+by size / 1000, so here each distinct (font, word) is measured once, in font
+units, and lines are built by adding up word and space widths. Summing can
+differ from measuring the joined line in the last bits of a float, so a
+candidate that lands within BOUNDARY_MARGIN of max_width is measured whole,
+the old way; line breaks therefore come out exactly as before.
+"""
+from functools import lru_cache
+from reportlab.pdfbase import pdfmetrics
+
+WIDTH_CACHE_SIZE = 65536 # (font, word) widths kept, least recently used evicted first
+BOUNDARY_MARGIN = 1e-6 # points; closer calls are settled by measuring the candidate line itself
+
+@lru_cache(maxsize=WIDTH_CACHE_SIZE)
+def text_units(font_name, text):
+    """Width of `text` in font units (its width in points at size 1000)."""
+    return pdfmetrics.stringWidth(text, font_name, 1000)
+
+def wrap_words(words, font_name, font_size, max_width, inclusive=False, measure_first=False):
+    """Yields the lines of a greedy wrap of `words`.
+
+    A word joins the current line while `line + " " + word` is narrower than
+    max_width (or exactly as wide, with inclusive=True). Without measure_first
+    the first word starts the first line as is, and no words give no lines.
+    With measure_first the wrap starts from an empty line, so the first word
+    is tested as " " + word; if even that is too wide an empty line comes
+    first, and no words give one empty line.
+    """
+    scale = font_size / 1000
+    space = text_units(font_name, " ")
+    line, units = [], 0
+    if not measure_first:
+        if not words:
+            return
+        line, units = [words[0]], text_units(font_name, words[0])
+        words = words[1:]
+
+    for word in words:
+        word_units = text_units(font_name, word)
+        width = (units + space + word_units) * scale
+        if abs(width - max_width) <= BOUNDARY_MARGIN:
+            width = pdfmetrics.stringWidth(" ".join(line) + " " + word, font_name, font_size)
+        if width <= max_width if inclusive else width < max_width:
+            units = units + space + word_units if line else word_units
+            line.append(word)
+        else:
+            yield " ".join(line)
+            line, units = [word], word_units
+    yield " ".join(line)
+
+def format_width_cache_stats():
+    info = text_units.cache_info()
+    return f"{info.hits} hits, {info.misses} misses, {info.currsize} words cached"